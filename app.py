@@ -1,5 +1,5 @@
 import streamlit as st
-from utils import display_logo, configure_matplotlib
+from utils import display_logo
 
 st.set_page_config(
     page_title="Dashboard RATP",
@@ -7,7 +7,7 @@ st.set_page_config(
     layout="wide"
 )
 
-configure_matplotlib()
+# Pas de configuration matplotlib : redirection immédiate vers la première page
 display_logo()
 
 st.switch_page("pages/1_Analyse_par_station.py")
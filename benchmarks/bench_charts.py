@@ -0,0 +1,128 @@
+"""
+CPU serveur des graphiques : images matplotlib vs graphiques Vega-Lite rendus par le navigateur
+
+Pour chaque page, un processus neuf (AppTest) joue les memes intentions de l'utilisateur avec chaque moteur.
+En mode Vega-Lite, le filtre par reseau, le top N et le changement de graphique se font dans le navigateur :
+ces intentions ne declenchent aucun rerun. Mesure le temps CPU du processus, la phase 'graphiques'
+(instrumentation.py) et les octets des graphiques envoyes (images ou specifications).
+Usage : python benchmarks/bench_charts.py [--sizes 371 100000] [--pages 1 2 3 4]
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+from benchmarks.common import synthetic_stations
+
+ANNEE = 2030
+MOTEURS = ('matplotlib', 'vega')
+PAGES = {
+    '1': 'pages/1_Analyse_par_station.py',
+    '2': 'pages/2_Analyse_par_ligne.py',
+    '3': 'pages/3_Repartition_geographique.py',
+    '4': 'pages/4_Exploration_libre.py',
+}
+# Intentions jouees apres le premier rendu : (nom, action matplotlib, action vega ou None si cote navigateur)
+INTENTIONS = {
+    '1': [
+        ('reseau RER', lambda at: at.selectbox[0].set_value('RER'), lambda at: at.selectbox[0].set_value('RER')),
+        ('station', lambda at: at.selectbox[1].set_value(at.selectbox[1].options[-1]),
+         lambda at: at.selectbox[1].set_value(at.selectbox[1].options[-1])),
+    ],
+    '2': [
+        ('reseau RER', lambda at: at.selectbox[0].set_value('RER'), None),
+        ('reseau Metro', lambda at: at.selectbox[0].set_value('Métro'), None),
+        ('tous', lambda at: at.selectbox[0].set_value('Tous'), None),
+    ],
+    '3': [
+        ('par ville', lambda at: at.radio[0].set_value('Par ville'), lambda at: at.radio[0].set_value('Par ville')),
+        ('top 35', lambda at: at.slider[0].set_value(35), None),
+        ('top 50', lambda at: at.slider[0].set_value(50), None),
+        ('top 10', lambda at: at.slider[0].set_value(10), None),
+    ],
+    '4': [
+        ('histogramme', lambda at: at.selectbox[0].set_value('Histogramme de distribution'), None),
+        ('top 20', lambda at: at.selectbox[0].set_value('Top 20 stations'), None),
+        ('ville Paris', lambda at: at.multiselect[1].set_value(['Paris']),
+         lambda at: at.multiselect[1].set_value(['Paris'])),
+        ('histogramme Paris', lambda at: at.selectbox[0].set_value('Histogramme de distribution'), None),
+    ],
+}
+
+
+def child(page, data_dir):
+    """Joue les intentions de `page` avec le moteur de RATP_CHARTS et affiche les mesures en JSON"""
+    logging.disable(logging.CRITICAL)
+    os.chdir(RACINE)
+    import charts
+    import disk_cache
+    import instrumentation
+    import utils
+    from streamlit.testing.v1 import AppTest
+
+    utils.DATA_DIR = data_dir
+    disk_cache.CACHE_DIR = tempfile.mkdtemp(dir=data_dir)
+    vega = charts.CHART_BACKEND == 'vega'
+
+    at = AppTest.from_file(os.path.join(RACINE, PAGES[page]), default_timeout=900)
+    cpu = graphiques = 0.0
+    reruns = 0
+    erreurs = []
+    for nom, action_mpl, action_vega in [('initial', None, None), *INTENTIONS[page]]:
+        action = action_vega if vega else action_mpl
+        if nom != 'initial' and action is None:
+            continue
+        if action:
+            action(at)
+        debut = time.process_time()
+        at.run()
+        cpu += time.process_time() - debut
+        reruns += 1
+        erreurs += [f'{nom} : {e.value}' for e in at.exception]
+        historique = instrumentation.history()
+        if historique:
+            graphiques += historique[-1]['phases_ms'].get('graphiques', 0.0) / 1000
+    print(json.dumps({'reruns': reruns, 'cpu_s': round(cpu, 4), 'graphiques_s': round(graphiques, 4),
+                      'octets': charts.chart_cache().size, 'erreurs': erreurs}))
+
+
+def measure(page, data_dir, moteur):
+    sortie = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', page, data_dir],
+                            capture_output=True, text=True, check=True,
+                            env={**os.environ, 'RATP_DEBUG': '1', 'RATP_CHARTS': moteur}).stdout
+    return json.loads(sortie.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[371, 100_000])
+    parser.add_argument('--pages', nargs='+', default=list(PAGES), choices=list(PAGES))
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    print(f"{'page':>5} {'lignes':>10} {'moteur':>11} {'reruns':>7} {'CPU (s)':>8} {'graphiques (s)':>15} {'envoye (Ko)':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f'trafic-annuel-entrant-par-station-du-reseau-ferre-{ANNEE}.csv')
+        for n in args.sizes:
+            synthetic_stations(n).to_csv(path, sep=';', index=False)
+            for page in args.pages:
+                for moteur in MOTEURS:
+                    mesure = measure(page, tmp, moteur)
+                    print(f"{page:>5} {n:>10,} {moteur:>11} {mesure['reruns']:>7} {mesure['cpu_s']:>8.2f} "
+                          f"{mesure['graphiques_s']:>15.2f} {mesure['octets'] / 1024:>12,.0f}")
+                    for erreur in mesure['erreurs']:
+                        print(f"      {erreur}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""
+Demarrage a froid : parsing CSV + derivations vs relecture du cache Feather
+
+Usage : python benchmarks/bench_disk_cache.py [--sizes 1000 100000 1000000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import disk_cache
+from utils import read_stations
+from benchmarks.common import synthetic_stations, timeit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'lignes':>10} {'CSV (s)':>10} {'cle (s)':>10} {'cache (s)':>10} {'speedup':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        disk_cache.CACHE_DIR = os.path.join(tmp, 'cache')
+        for n in args.sizes:
+            path = os.path.join(tmp, f'stations-{n}.csv')
+            synthetic_stations(n).to_csv(path, sep=';', index=False)
+
+            t_csv = timeit(read_stations, path)
+            key = disk_cache.source_key(path)
+            disk_cache.cached_frames('stations', key, lambda: read_stations(path))
+
+            t_key = timeit(disk_cache.source_key, path, repeat=3)
+            t_cache = timeit(lambda: disk_cache.cached_frames('stations', key, None), repeat=3)
+            print(f"{n:>10,} {t_csv:>10.3f} {t_key:>10.4f} {t_cache:>10.4f} {t_csv / (t_key + t_cache):>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Export des donnees filtrees : fichier CSV construit d'un bloc vs export par blocs (CSV, gzip, Parquet, XLSX)
+
+Chaque export s'execute dans un processus neuf ; la memoire rapportee est le pic de RSS (VmHWM, Linux) pendant
+l'export, au-dela du jeu de donnees deja charge. Verifie que le CSV par blocs est identique a l'ancien.
+Usage : python benchmarks/bench_export.py [--rows 1000000] [--xlsx-rows 100000]
+"""
+import argparse
+import ctypes
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.common import synthetic_stations
+
+COLONNES = ['Rang', 'Réseau', 'Station', 'Trafic', 'Lignes', 'Ville', 'Arrondissement pour Paris']
+
+
+def reset_peak():
+    """
+    Remet le pic de RSS du processus au niveau courant (Linux), sinon le pic inclut le chargement.
+    La memoire liberee par le chargement est d'abord rendue au systeme pour ne pas etre comptee comme reserve.
+    """
+    ctypes.CDLL('libc.so.6').malloc_trim(0)
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+
+
+def peak_rss():
+    """Pic de RSS (octets) depuis le dernier reset_peak"""
+    with open('/proc/self/status') as f:
+        return next(int(ligne.split()[1]) * 1024 for ligne in f if ligne.startswith('VmHWM:'))
+
+
+def child(mode, path, rows):
+    """Execute un export dans un processus neuf et affiche 'duree pic_octets taille_octets empreinte'"""
+    import hashlib
+
+    import pandas as pd
+    from exports import export_file
+    from utils import apply_schema
+
+    df = apply_schema(pd.read_feather(path))
+    ordre = np.random.default_rng(0).permutation(len(df))[:rows]
+    reset_peak()
+    base = peak_rss()
+
+    debut = time.perf_counter()
+    if mode == 'ancien':
+        # Ancien comportement : copie triee de la selection, texte CSV complet puis encodage
+        donnees = df.take(ordre)[COLONNES].to_csv(index=False, sep=';').encode('utf-8')
+    else:
+        donnees = export_file(df, ordre, COLONNES, mode).getvalue()
+    duree = time.perf_counter() - debut
+    pic = peak_rss() - base
+    empreinte = hashlib.md5(donnees).hexdigest() if mode in ('ancien', 'CSV') else '-'
+    print(duree, pic, len(donnees), empreinte)
+
+
+def measure(mode, path, rows):
+    sortie = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, path, str(rows)],
+                            capture_output=True, text=True, check=True).stdout.split()
+    return float(sortie[0]), int(sortie[1]) / 1024 ** 2, int(sortie[2]) / 1024 ** 2, sortie[3]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--xlsx-rows', type=int, default=100_000, help="lignes exportees en XLSX (format lent)")
+    parser.add_argument('--child', nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], int(args.child[2]))
+        return
+
+    from exports import EXPORT_FORMATS
+    from utils import join_lignes
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'stations.feather')
+        df = synthetic_stations(args.rows)
+        df['Lignes'] = join_lignes(df)
+        df.to_feather(path)
+        del df
+
+        print(f"{'export':<22} {'lignes':>10} {'duree (s)':>10} {'pic (Mo)':>9} {'fichier (Mo)':>13}")
+        empreintes = {}
+        for mode in ['ancien', *EXPORT_FORMATS]:
+            rows = args.rows
+            if EXPORT_FORMATS.get(mode, {}).get('max_rows'):
+                rows = min(rows, args.xlsx_rows)
+            duree, pic, taille, empreintes[mode] = measure(mode, path, rows)
+            print(f"{mode:<22} {rows:>10,} {duree:>10.2f} {pic:>9.0f} {taille:>13.1f}")
+
+    assert empreintes['ancien'] == empreintes['CSV'], "le CSV par blocs differe de l'ancien export"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Filtres d'Exploration libre : chaine de copies booleennes vs FilterEngine (a froid / masques memorises)
+
+Usage : python benchmarks/bench_filters.py [--sizes 1000 100000 1000000]
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from filters import FilterEngine
+from utils import CORRESPONDANCES_COLS, apply_schema, join_lignes
+from benchmarks.common import synthetic_stations, timeit
+
+CRITERES = {
+    'reseaux': ['Métro'],
+    'villes': ['Paris', 'Antony', 'Saint Denis'],
+    'lignes': ['1', 'A'],
+    'trafic': (1_000_000, 5_000_000),
+    'recherche': 'porte'
+}
+
+
+def filter_chain(df, reseaux, villes, lignes, trafic, recherche):
+    """Chaine historique de la page (une copie par filtre)"""
+    df_filtered = df.copy()
+    df_filtered = df_filtered[df_filtered['Réseau'].isin(reseaux)]
+    df_filtered = df_filtered[df_filtered['Ville'].isin(villes)]
+    df_filtered = df_filtered[df_filtered[CORRESPONDANCES_COLS].isin(lignes).any(axis=1)]
+    df_filtered = df_filtered[(df_filtered['Trafic'] >= trafic[0]) & (df_filtered['Trafic'] <= trafic[1])]
+    return df_filtered[df_filtered['Station'].str.contains(recherche, case=False, na=False)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'lignes':>10} {'chaine (s)':>11} {'froid (s)':>11} {'memorise (s)':>13} {'speedup':>9}")
+    for n in args.sizes:
+        df = synthetic_stations(n)
+        df = apply_schema(df.assign(Lignes=join_lignes(df)))
+        engine = FilterEngine(df)
+        criteres = FilterEngine.criteria(**CRITERES)
+
+        attendu = filter_chain(df, **CRITERES)
+        assert np.array_equal(attendu.index.to_numpy(), engine.rows(criteres))
+
+        t_chain = timeit(filter_chain, df, *CRITERES.values(), repeat=3)
+        t_cold = timeit(lambda: df.take(FilterEngine(df).rows(criteres)))
+        t_warm = timeit(lambda: df.take(engine.rows(criteres)), repeat=3)
+        print(f"{n:>10,} {t_chain:>11.4f} {t_cold:>11.4f} {t_warm:>13.4f} {t_chain / t_warm:>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
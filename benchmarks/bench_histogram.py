@@ -0,0 +1,71 @@
+"""
+Histogramme de distribution d'Exploration libre : comptage des lignes filtrees vs somme des histogrammes du cube
+
+L'ancien histogramme recalcule 30 classes lineaires par reseau sur les lignes filtrees (ax.hist). Les classes
+logarithmiques fixes sont sommees depuis les esquisses du cube, ou comptees sur le masque (repli) quand les
+criteres ne s'expriment pas dans le cube. Verifie les effectifs contre np.histogram sur les lignes filtrees.
+Usage : python benchmarks/bench_histogram.py [--sizes 100000 1000000]
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from filters import FilterEngine
+from utils import apply_schema, join_lignes
+from benchmarks.common import synthetic_stations, timeit
+
+CRITERES = {
+    'tout': {},
+    'RER': {'reseaux': ['RER']},
+    'villes': {'villes': ['Paris', 'Antony', 'Saint Denis']},
+    'ligne 1': {'lignes': ['1']},
+    'ligne A a Paris': {'lignes': ['A'], 'villes': ['Paris']},
+    'lignes 1 et A': {'lignes': ['1', 'A']},
+    'recherche': {'recherche': 'porte'},
+}
+
+
+def linear_histogram(df, engine, criteres):
+    """Ancien histogramme : copie des lignes filtrees puis 30 classes lineaires par reseau"""
+    df_filtered = df.take(engine.rows(criteres))
+    for reseau in df_filtered['Réseau'].unique():
+        np.histogram(df_filtered.loc[df_filtered['Réseau'] == reseau, 'Trafic'].dropna(), bins=30)
+
+
+def check(df, engine, criteres, distribution):
+    """Effectifs par reseau identiques a np.histogram des lignes filtrees sur les memes classes"""
+    df_filtered = df.take(engine.rows(criteres))
+    for reseau, effectifs in distribution.groupby('Réseau', observed=True)['Stations']:
+        trafic = df_filtered.loc[df_filtered['Réseau'] == reseau, 'Trafic'].to_numpy(dtype='float64')
+        attendu, _ = np.histogram(trafic, bins=engine.histogram_edges)
+        assert np.array_equal(effectifs.to_numpy(), attendu[engine.histogram_range]), reseau
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'lignes':>10} {'criteres':<16} {'chemin':>7} {'stations':>9} {'lineaire (ms)':>14} "
+          f"{'classes fixes (ms)':>19} {'speedup':>8}")
+    for n in args.sizes:
+        df = synthetic_stations(n)
+        df = apply_schema(df.assign(Lignes=join_lignes(df)))
+        engine = FilterEngine(df)
+        for nom, valeurs in CRITERES.items():
+            criteres = FilterEngine.criteria(**valeurs)
+            chemin = 'cube' if engine._cube_selection(criteres) else 'repli'
+            distribution = engine.distribution(criteres)
+            check(df, engine, criteres, distribution)
+
+            t_lineaire = timeit(linear_histogram, df, engine, criteres, repeat=3)
+            t_fixes = timeit(engine.distribution, criteres, repeat=3)
+            print(f"{n:>10,} {nom:<16} {chemin:>7} {distribution['Stations'].sum():>9,} {t_lineaire * 1e3:>14.1f} "
+                  f"{t_fixes * 1e3:>19.1f} {t_lineaire / t_fixes:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
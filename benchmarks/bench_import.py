@@ -0,0 +1,76 @@
+"""
+Temps d'import a froid (python -X importtime) de app.py et de chaque page, compare a un budget
+
+Seules les instructions d'import de premier niveau de chaque script sont executees, dans un processus neuf.
+Code de sortie 1 si un budget est depasse.
+Usage : python benchmarks/bench_import.py [--repeat 3] [--top 8]
+"""
+import argparse
+import ast
+import os
+import re
+import subprocess
+import sys
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budgets (ms) sur une machine de developpement ; matplotlib seul coute ~800 ms, pandas ~600 ms
+BUDGETS_MS = {
+    'app.py': 1000,
+    'pages/1_Analyse_par_station.py': 2000,
+    'pages/2_Analyse_par_ligne.py': 2000,
+    'pages/3_Repartition_geographique.py': 2000,
+    'pages/4_Exploration_libre.py': 2000,
+}
+LIGNE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def import_statements(script):
+    """Instructions d'import de premier niveau d'un script (sans le reste de la page)"""
+    with open(os.path.join(RACINE, script), encoding='utf-8') as f:
+        arbre = ast.parse(f.read())
+    imports = [ast.unparse(noeud) for noeud in arbre.body if isinstance(noeud, (ast.Import, ast.ImportFrom))]
+    return '\n'.join([f'import sys; sys.path.insert(0, {RACINE!r})', *imports])
+
+
+def importtime(code, exclus=()):
+    """(total en ms, {paquet de premier niveau: cumul en ms}) d'un import dans un processus neuf"""
+    sortie = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=RACINE,
+                            capture_output=True, text=True, check=True).stderr
+    paquets = {}
+    for ligne in sortie.splitlines():
+        match = LIGNE.match(ligne)
+        # Indentation minimale : modules importes directement par le script
+        if match and len(match.group(3)) == 1 and match.group(4) not in exclus:
+            paquets[match.group(4)] = int(match.group(2)) / 1000
+    return sum(paquets.values()), paquets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--top', type=int, default=8, help="paquets les plus couteux affiches")
+    args = parser.parse_args()
+
+    # Modules charges par le demarrage de l'interpreteur (site, encodings...), hors script
+    _, demarrage = importtime('pass')
+    depassements = []
+    print(f"{'script':<40} {'import (ms)':>12} {'budget (ms)':>12}  statut")
+    for script, budget in BUDGETS_MS.items():
+        code = import_statements(script)
+        # Meilleur de `repeat` essais (cache disque du systeme chaud)
+        total, paquets = min((importtime(code, demarrage) for _ in range(args.repeat)), key=lambda m: m[0])
+        statut = 'ok' if total <= budget else 'DEPASSE'
+        if total > budget:
+            depassements.append(script)
+        print(f"{script:<40} {total:>12.0f} {budget:>12}  {statut}")
+        lourds = sorted(paquets.items(), key=lambda p: -p[1])[:args.top]
+        print('    ' + ', '.join(f'{nom} {ms:.0f}' for nom, ms in lourds))
+
+    if depassements:
+        print(f"\nBudget depasse : {', '.join(depassements)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
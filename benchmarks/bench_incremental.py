@@ -0,0 +1,81 @@
+"""
+Ajout de lignes en fin d'export : mise a jour incrementale des agregats vs reconstruction complete
+
+Verifie que les tableaux (stations, lignes, cubes) mis a jour sont identiques a une reconstruction.
+Usage : python benchmarks/bench_incremental.py [--sizes 10000 100000 1000000] [--append 0.01]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import disk_cache
+import utils
+from cube import _build_cubes, load_cubes
+from utils import build_ligne_tables, load_data, prepare_ligne_data, read_stations
+from benchmarks.common import synthetic_stations, timeit
+
+ANNEE = 2030
+
+
+def load_all():
+    df = load_data((ANNEE,))
+    return df, prepare_ligne_data(df), load_cubes(df)
+
+
+def rebuild(path):
+    df = read_stations(path)
+    df['Année'] = np.uint16(ANNEE)
+    return df, build_ligne_tables(df), _build_cubes(df)
+
+
+def assert_same(incremental, complet):
+    df, lignes, cubes = incremental
+    df_ref, lignes_ref, cubes_ref = complet
+    pd.testing.assert_frame_equal(df, df_ref)
+    for table, reference in zip(lignes, lignes_ref):
+        pd.testing.assert_frame_equal(table, reference)
+    for cube, reference in zip(cubes, cubes_ref):
+        pd.testing.assert_frame_equal(cube.cells, reference.cells)
+        np.testing.assert_array_equal(cube.sketch_keys, reference.sketch_keys)
+        np.testing.assert_array_equal(cube.sketch_counts, reference.sketch_counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--append', type=float, default=0.01, help="part de lignes ajoutees")
+    args = parser.parse_args()
+
+    print(f"{'lignes':>10} {'ajout':>8} {'complet (s)':>12} {'incremental (s)':>16} {'speedup':>9}  identique")
+    with tempfile.TemporaryDirectory() as tmp:
+        utils.DATA_DIR = tmp
+        disk_cache.CACHE_DIR = os.path.join(tmp, 'cache')
+        path = os.path.join(tmp, f'trafic-annuel-entrant-par-station-du-reseau-ferre-{ANNEE}.csv')
+
+        for n in args.sizes:
+            m = max(1, int(n * args.append))
+            synthetic_stations(n).to_csv(path, sep=';', index=False)
+            load_all()
+
+            ajout = synthetic_stations(m, seed=1)
+            ajout['Station'] = [f'STATION {n + i}' for i in range(m)]
+            ajout['Rang'] += n
+            ajout.to_csv(path, sep=';', index=False, header=False, mode='a')
+
+            debut = time.perf_counter()
+            incremental = load_all()
+            t_incremental = time.perf_counter() - debut
+
+            t_complet = timeit(rebuild, path)
+            assert_same(incremental, rebuild(path))
+            print(f"{n:>10,} {m:>8,} {t_complet:>12.3f} {t_incremental:>16.3f} {t_complet / t_incremental:>8.1f}x  oui")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""
+Empreinte memoire par ligne du tableau des stations : types bruts vs SCHEMA_STATIONS
+
+Usage : python benchmarks/bench_memory.py [--sizes 1000 100000 1000000]
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import apply_schema, join_lignes, memory_per_row
+from benchmarks.common import synthetic_stations
+
+CSV_2021 = 'data/trafic-annuel-entrant-par-station-du-reseau-ferre-2021.csv'
+
+
+def compare(label, brut):
+    brut = brut.assign(Lignes=join_lignes(brut).astype(object))
+    type_ = apply_schema(brut)
+    avant, apres = memory_per_row(brut), memory_per_row(type_)
+    print(f"{label:>12} {len(brut):>10,} {avant:>12.1f} {apres:>12.1f} {avant / apres:>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'jeu':>12} {'lignes':>10} {'brut (o/l)':>12} {'type (o/l)':>12} {'gain':>8}")
+    racine = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    compare('2021', pd.read_csv(os.path.join(racine, CSV_2021), sep=';'))
+    for n in args.sizes:
+        compare('synthetique', synthetic_stations(n))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+Rendu headless (AppTest) de chaque page du dashboard sur des jeux synthetiques de taille croissante
+
+Pour chaque page et chaque taille, un processus neuf (cache disque vide) enchaine des etats de widgets
+representatifs et mesure le temps de chaque rerun, le temps par phase et les succes/echecs des caches
+(instrumentation.py) et le pic memoire (RSS). Les resultats sont ecrits en JSON ; --baseline compare
+a un fichier precedent. Une page arretee par une exception, ou un etat de widgets impossible a jouer,
+fait echouer l'execution (code de sortie 1) : ses temps ne sont pas ceux d'un rendu complet.
+Usage : python benchmarks/bench_pages.py [--sizes 371 10000 100000 1000000] [--pages 1 2 3 4]
+                                         [--output bench_pages.json] [--baseline ancien.json]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+from benchmarks.common import synthetic_stations
+
+ANNEE = 2030
+PAGES = {
+    '1': 'pages/1_Analyse_par_station.py',
+    '2': 'pages/2_Analyse_par_ligne.py',
+    '3': 'pages/3_Repartition_geographique.py',
+    '4': 'pages/4_Exploration_libre.py',
+}
+# Etats de widgets joues dans l'ordre apres le premier rendu : (nom, action sur l'AppTest)
+ETATS = {
+    '1': [
+        ('reseau RER', lambda at: at.selectbox[0].set_value('RER')),
+        ('recherche', lambda at: at.text_input[0].set_value('porte')),
+        ('station', lambda at: at.selectbox[1].set_value(at.selectbox[1].options[-1])),
+        ('reseau Metro', lambda at: at.selectbox[0].set_value('Métro')),
+    ],
+    '2': [
+        ('reseau RER', lambda at: at.selectbox[0].set_value('RER')),
+        ('reseau Metro', lambda at: at.selectbox[0].set_value('Métro')),
+        ('tous', lambda at: at.selectbox[0].set_value('Tous')),
+    ],
+    '3': [
+        ('par ville', lambda at: at.radio[0].set_value('Par ville')),
+        ('top 35', lambda at: at.slider[0].set_value(35)),
+        ('par reseau', lambda at: at.radio[0].set_value('Par réseau/zone')),
+    ],
+    '4': [
+        ('ville Paris', lambda at: at.multiselect[1].set_value(['Paris'])),
+        ('lignes 1 et A', lambda at: at.multiselect[2].set_value(['1', 'A'])),
+        ('recherche', lambda at: at.text_input[0].set_value('de')),
+        ('histogramme', lambda at: at.selectbox[0].set_value('Histogramme de distribution')),
+        ('reseau RER', lambda at: at.multiselect[0].set_value(['RER'])),
+    ],
+}
+PHASES = ('chargement', 'agregation', 'filtrage', 'graphiques')
+
+
+def child(page, data_dir):
+    """Joue les etats de `page` dans ce processus et affiche les mesures en JSON"""
+    logging.disable(logging.CRITICAL)
+    os.chdir(RACINE)
+    import disk_cache
+    import instrumentation
+    import utils
+    from streamlit.testing.v1 import AppTest
+
+    utils.DATA_DIR = data_dir
+    disk_cache.CACHE_DIR = tempfile.mkdtemp(dir=data_dir)
+
+    reruns, harnais = [], []
+    at = AppTest.from_file(os.path.join(RACINE, PAGES[page]), default_timeout=900)
+    for etat, action in [('initial', None), *ETATS[page]]:
+        # Widget absent dans cet etat (ex. selection vide) : echec note, les etats suivants sont joues
+        try:
+            if action:
+                action(at)
+        except Exception as e:
+            harnais.append({'etat': etat, 'erreur': f'{type(e).__name__}: {e}'})
+            continue
+        avant = len(instrumentation.history())
+        debut = time.perf_counter()
+        at.run()
+        duree = time.perf_counter() - debut
+        erreurs = [e.value for e in at.exception]
+        # Pas d'enregistrement si la page s'est arretee sur une exception avant debug_panel()
+        historique = instrumentation.history()
+        mesures = historique[-1] if len(historique) > avant else {}
+        phases = {nom: round(ms / 1000, 4) for nom, ms in mesures.get('phases_ms', {}).items()}
+        reruns.append({'etat': etat, 'duree_s': round(duree, 4), 'phases_s': phases,
+                       'caches': mesures.get('caches', {}), 'erreurs': erreurs})
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(json.dumps({'reruns': reruns, 'erreurs_harnais': harnais, 'pic_rss_mo': round(pic / 1024 ** 2, 1)}))
+
+
+def measure(page, data_dir):
+    # Phases mesurees par l'instrumentation des pages (active a l'import, d'ou la variable d'environnement)
+    sortie = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', page, data_dir],
+                            capture_output=True, text=True, check=True,
+                            env={**os.environ, 'RATP_DEBUG': '1'}).stdout
+    return json.loads(sortie.strip().splitlines()[-1])
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', '-C', RACINE, 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    import pandas as pd
+    import streamlit as st
+    return {'commit': commit, 'python': platform.python_version(), 'pandas': pd.__version__,
+            'streamlit': st.__version__, 'coeurs': os.cpu_count(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def compare(resultats, baseline):
+    """Ratio du temps total de rerun par page et par taille par rapport a un fichier precedent"""
+    def totaux(res):
+        return {(r['page'], r['lignes']): sum(x['duree_s'] for x in r['reruns']) for r in res['resultats']}
+
+    anciens = totaux(baseline)
+    print(f"\nComparaison avec {baseline['environnement'].get('commit')}")
+    print(f"{'page':>5} {'lignes':>10} {'avant (s)':>10} {'apres (s)':>10} {'ratio':>7}")
+    for (page, lignes), total in totaux(resultats).items():
+        if (page, lignes) in anciens:
+            avant = anciens[(page, lignes)]
+            page = os.path.basename(page).split('_')[0]
+            print(f"{page:>5} {lignes:>10,} {avant:>10.2f} {total:>10.2f} {total / avant:>6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[371, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--pages', nargs='+', default=list(PAGES), choices=list(PAGES))
+    parser.add_argument('--output', default='bench_pages.json')
+    parser.add_argument('--baseline', help="JSON d'une execution precedente a comparer")
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    resultats = {'environnement': environment(), 'resultats': []}
+    echecs = []
+    print(f"{'page':>5} {'lignes':>10} {'1er rendu (s)':>14} {'rerun moy (s)':>14} "
+          + ''.join(f"{nom:>11} " for nom in PHASES) + f"{'pic (Mo)':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f'trafic-annuel-entrant-par-station-du-reseau-ferre-{ANNEE}.csv')
+        for n in args.sizes:
+            synthetic_stations(n).to_csv(path, sep=';', index=False)
+            for page in args.pages:
+                mesure = measure(page, tmp)
+                resultats['resultats'].append({'page': PAGES[page], 'lignes': n, **mesure})
+                reruns = mesure['reruns']
+                suivants = [r['duree_s'] for r in reruns[1:]] or [0.0]
+                phases = [sum(r['phases_s'].get(nom, 0.0) for r in reruns) for nom in PHASES]
+                print(f"{page:>5} {n:>10,} {reruns[0]['duree_s']:>14.2f} {sum(suivants) / len(suivants):>14.2f} "
+                      + ''.join(f"{t:>11.2f} " for t in phases) + f"{mesure['pic_rss_mo']:>9.0f}")
+                for r in reruns:
+                    if r['erreurs']:
+                        print(f"      {r['etat']} : {r['erreurs']}")
+                        echecs.append(f"page {page}, {n:,} lignes, {r['etat']} : {r['erreurs']}")
+                for h in mesure['erreurs_harnais']:
+                    print(f"      {h['etat']} (etat non joue) : {h['erreur']}")
+                    echecs.append(f"page {page}, {n:,} lignes, {h['etat']} (etat non joue) : {h['erreur']}")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(resultats, f, ensure_ascii=False, indent=2)
+    print(f"\nResultats ecrits dans {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            compare(resultats, json.load(f))
+
+    if echecs:
+        sys.exit(f"\n{len(echecs)} rendu(s) en echec, temps non comparables :\n" + '\n'.join(echecs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Tables par ligne et cubes : construction serie vs pool de 1/4/16 processus par partition
+
+Verifie que les resultats fusionnes sont identiques a la construction en serie.
+Usage : python benchmarks/bench_parallel.py [--sizes 1000000 5000000] [--workers 1 4 16] [--by hash]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cube import _build_cubes
+from parallel import parallel_cubes, parallel_ligne_tables, process_pool
+from utils import apply_schema, build_ligne_tables, join_lignes
+from benchmarks.common import synthetic_stations, timeit
+
+ANNEES = 8
+
+
+def dataset(n):
+    """Jeu type load_data : partitions annuelles contigues"""
+    df = synthetic_stations(n)
+    df['Lignes'] = join_lignes(df)
+    df = apply_schema(df)
+    df['Année'] = np.repeat(np.arange(2024 - ANNEES, 2024, dtype='uint16'), -(-n // ANNEES))[:n]
+    return df
+
+
+def assert_same(serie, parallele):
+    (stats, df_lignes), cubes = serie
+    (stats_p, df_lignes_p), cubes_p = parallele
+    pd.testing.assert_frame_equal(stats, stats_p)
+    pd.testing.assert_frame_equal(df_lignes, df_lignes_p)
+    for cube, cube_p in zip(cubes, cubes_p):
+        pd.testing.assert_frame_equal(cube.cells, cube_p.cells)
+        np.testing.assert_array_equal(cube.sketch_keys, cube_p.sketch_keys)
+        np.testing.assert_array_equal(cube.sketch_counts, cube_p.sketch_counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000_000, 5_000_000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--by', default='hash', choices=['hash', 'Année', 'Réseau'])
+    args = parser.parse_args()
+
+    print(f"coeurs disponibles : {os.cpu_count()}, partition : {args.by}")
+    print(f"{'lignes':>10} {'processus':>10} {'serie (s)':>10} {'pool (s)':>10} {'speedup':>9}")
+    for n in args.sizes:
+        df = dataset(n)
+        serie = (build_ligne_tables(df), _build_cubes(df))
+        t_serie = timeit(lambda: (build_ligne_tables(df), _build_cubes(df)))
+
+        for workers in args.workers:
+            def pool():
+                return parallel_ligne_tables(df, workers, args.by), parallel_cubes(df, workers, args.by)
+
+            list(process_pool(workers).map(time.sleep, [1] * workers))  # demarrage des processus hors mesure
+            assert_same(serie, pool())
+            t_pool = timeit(pool)
+            print(f"{n:>10,} {workers:>10} {t_serie:>10.2f} {t_pool:>10.2f} {t_serie / t_pool:>8.1f}x")
+
+            process_pool(workers).shutdown()
+            process_pool.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark de prepare_ligne_data : boucle iterrows historique vs pipeline vectorise
+
+Usage : python benchmarks/bench_prepare_ligne_data.py [--sizes 1000 100000 1000000]
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import CORRESPONDANCES_COLS, build_ligne_tables
+from benchmarks.common import synthetic_stations, timeit
+
+
+def prepare_ligne_data_iterrows(df):
+    """Implementation historique (iterrows + liste de dicts), conservee comme reference"""
+    rows = []
+    for idx, row in df.iterrows():
+        for col in CORRESPONDANCES_COLS:
+            if pd.notna(row[col]) and str(row[col]).strip() != '':
+                ligne = str(row[col]).strip()
+                try:
+                    ligne = str(int(float(ligne)))
+                except (ValueError, TypeError):
+                    pass
+                rows.append({
+                    'Ligne': ligne,
+                    'Station': row['Station'],
+                    'Réseau': row['Réseau'],
+                    'Trafic': row['Trafic']
+                })
+
+    df_lignes = pd.DataFrame(rows)
+    stats_lignes = df_lignes.groupby('Ligne').agg({
+        'Trafic': 'sum',
+        'Station': 'nunique',
+        'Réseau': lambda x: x.mode()[0] if len(x.mode()) > 0 else x.iloc[0]
+    }).reset_index()
+    stats_lignes.columns = ['Ligne', 'Trafic_total', 'Nb_stations', 'Réseau']
+    stats_lignes['Trafic_moyen_station'] = stats_lignes['Trafic_total'] / stats_lignes['Nb_stations']
+    stats_lignes['Part_trafic_pct'] = (stats_lignes['Trafic_total'] / stats_lignes['Trafic_total'].sum()) * 100
+    return stats_lignes, df_lignes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'lignes':>10} {'iterrows (s)':>14} {'vectorise (s)':>14} {'speedup':>9}")
+    for n in args.sizes:
+        df = synthetic_stations(n)
+        stats_ref, lignes_ref = prepare_ligne_data_iterrows(df)
+        stats_vec, lignes_vec = build_ligne_tables(df)
+        pd.testing.assert_frame_equal(stats_vec, stats_ref)
+        pd.testing.assert_frame_equal(lignes_vec, lignes_ref)
+
+        t_ref = timeit(prepare_ligne_data_iterrows, df)
+        t_vec = timeit(build_ligne_tables, df, repeat=3)
+        print(f"{n:>10,} {t_ref:>14.3f} {t_vec:>14.4f} {t_ref / t_vec:>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Quantiles par filtre : tri exact (pandas) vs fusion des esquisses du cube, erreur relative mesuree
+
+Usage : python benchmarks/bench_quantiles.py [--sizes 100000 1000000 10000000] [--errors 0.01 0.001]
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cube import AggregateCube, DIMENSIONS_STATIONS, _with_zone
+from benchmarks.common import synthetic_stations, timeit
+
+QUANTILES = [0.1, 0.5, 0.9, 0.99]
+FILTRES = [{}, {'Réseau': 'RER'}, {'Zone': 'Banlieue'}, {'Réseau': 'Métro', 'Zone': 'Paris'}]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--errors', type=float, nargs='+', default=[0.01, 0.001])
+    args = parser.parse_args()
+
+    print(f"{'lignes':>11} {'erreur cible':>12} {'exact (ms)':>11} {'esquisse (ms)':>14} {'erreur max':>11}")
+    for n in args.sizes:
+        df = _with_zone(synthetic_stations(n).drop(columns=['Station']))
+        for erreur in args.errors:
+            cube = AggregateCube(df, DIMENSIONS_STATIONS, relative_error=erreur)
+
+            def exact():
+                for filters in FILTRES:
+                    masque = np.ones(len(df), dtype=bool)
+                    for dim, valeur in filters.items():
+                        masque &= (df[dim] == valeur).to_numpy()
+                    df.loc[masque, 'Trafic'].quantile(QUANTILES)
+
+            def esquisse():
+                for filters in FILTRES:
+                    for q in QUANTILES:
+                        cube.quantile(q, filters)
+
+            ecart = 0.0
+            for filters in FILTRES:
+                masque = np.ones(len(df), dtype=bool)
+                for dim, valeur in filters.items():
+                    masque &= (df[dim] == valeur).to_numpy()
+                reference = df.loc[masque, 'Trafic'].quantile(QUANTILES)
+                for q in QUANTILES:
+                    ecart = max(ecart, abs(cube.quantile(q, filters) / reference[q] - 1))
+            assert ecart <= erreur, f"Erreur {ecart:.4%} > {erreur:.4%}"
+
+            t_exact, t_esquisse = timeit(exact, repeat=3), timeit(esquisse, repeat=3)
+            print(f"{n:>11,} {erreur:>12.2%} {t_exact * 1e3:>11.1f} {t_esquisse * 1e3:>14.1f} {ecart:>11.4%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Recherche de station : str.contains sur toutes les lignes vs StationSearchIndex
+
+Usage : python benchmarks/bench_search.py [--stations 50000]
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from indexes import StationSearchIndex
+from benchmarks.common import timeit
+
+MOTS = ['Gare', 'Porte', 'Saint', 'Église', 'Château', 'Hôtel de Ville', 'Marché', 'Pont', 'Lycée',
+        'République', 'Général', 'Vélodrome', 'Forêt', 'Bel-Air', 'Mairie', 'Parc', 'Étoile', 'Opéra']
+REQUETES = ['gare', 'republique', 'chateau', 'hotel de v', 'etoile 12', 'velodrom', 'chatteau pnt']
+
+
+def station_names(n, seed=0):
+    rng = np.random.default_rng(seed)
+    a, b = rng.choice(MOTS, size=n), rng.choice(MOTS, size=n)
+    return pd.Series([f'{x} {y} {i}'.upper() for i, (x, y) in enumerate(zip(a, b))], name='Station')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--stations', type=int, default=50_000)
+    args = parser.parse_args()
+
+    df = station_names(args.stations).to_frame()
+    index = StationSearchIndex(df)
+    print(f"{args.stations:,} stations, construction de l'index : {timeit(StationSearchIndex, df):.2f} s")
+    print(f"{'requete':>14} {'contains (ms)':>14} {'index (ms)':>11} {'resultats':>10}")
+    for requete in REQUETES:
+        t_scan = timeit(lambda: df['Station'].str.contains(requete, case=False, na=False), repeat=5)
+        t_index = timeit(lambda: index.search(requete), repeat=5)
+        print(f"{requete:>14} {t_scan * 1e3:>14.2f} {t_index * 1e3:>11.3f} {len(index.search(requete)):>10}")
+
+
+if __name__ == '__main__':
+    main()
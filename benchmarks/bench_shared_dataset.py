@@ -0,0 +1,76 @@
+"""
+Memoire (RSS) de 1/10/100 sessions : jeu de donnees partage (cache_resource) vs copie par session (cache_data)
+
+Chaque session garde une reference au DataFrame renvoye par le chargement, comme une page ouverte.
+Usage : python benchmarks/bench_shared_dataset.py [--rows 200000] [--sessions 1 10 100]
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.common import synthetic_stations
+
+ANNEE = 2030
+
+
+def rss():
+    """Memoire residente actuelle (octets)"""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def child(mode, sessions, tmp):
+    """Ouvre `sessions` sessions dans un processus neuf et affiche 'rss_avant rss_apres'"""
+    logging.disable(logging.CRITICAL)
+    import disk_cache
+    import streamlit as st
+    import utils
+
+    utils.DATA_DIR = tmp
+    disk_cache.CACHE_DIR = os.path.join(tmp, 'cache')
+    if mode == 'partage':
+        charger = utils.load_data
+    else:
+        # Ancien comportement : st.cache_data renvoie une copie desserialisee a chaque appel
+        charger = st.cache_data(utils.build_dataset)
+
+    avant = rss()
+    ouvertes = [charger((ANNEE,)) for _ in range(sessions)]
+    print(avant, rss(), len(ouvertes))
+
+
+def measure(mode, sessions, tmp):
+    sortie = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, str(sessions), tmp],
+                            capture_output=True, text=True, check=True).stdout.split()
+    return (int(sortie[1]) - int(sortie[0])) / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--child', nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], int(args.child[1]), args.child[2])
+        return
+
+    print(f"{'sessions':>9} {'copie (Mo)':>11} {'partage (Mo)':>13} {'gain':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f'trafic-annuel-entrant-par-station-du-reseau-ferre-{ANNEE}.csv')
+        synthetic_stations(args.rows).to_csv(path, sep=';', index=False)
+        # Cache disque prechauffe : seules les copies en memoire sont mesurees
+        measure('partage', 1, tmp)
+        for sessions in args.sessions:
+            copie = measure('copie', sessions, tmp)
+            partage = measure('partage', sessions, tmp)
+            print(f"{sessions:>9} {copie:>11.0f} {partage:>13.0f} {copie / max(partage, 1):>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Pic memoire (RSS) d'un export de releves journaliers : lecture complete vs ingestion par blocs
+
+Usage : python benchmarks/bench_streaming.py [--sizes 1000000 5000000 20000000] [--stations 2000]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.common import synthetic_stations
+
+BLOC_ECRITURE = 500_000
+
+
+def write_daily_export(path, n, stations):
+    """Ecrit `n` releves (une ligne par station et par jour) sans tout garder en memoire"""
+    base = synthetic_stations(stations)
+    base['Trafic'] = base['Trafic'] // 365
+    jours = max(1, n // stations)
+    par_bloc = max(1, BLOC_ECRITURE // stations)
+    with open(path, 'w', encoding='utf-8') as f:
+        for debut in range(0, jours, par_bloc):
+            bloc = base.iloc[list(range(stations)) * min(par_bloc, jours - debut)]
+            bloc.to_csv(f, sep=';', index=False, header=debut == 0)
+    return jours * stations
+
+
+def child(mode, path):
+    """Execute une ingestion dans un processus neuf et affiche 'duree pic_rss_octets'"""
+    import pandas as pd
+    from streaming import StationAccumulator, stream_stations
+    from utils import TYPES_TEXTE
+
+    debut = time.perf_counter()
+    if mode == 'complet':
+        # Memes agregats, a partir du fichier lu d'un seul bloc
+        accumulateur = StationAccumulator()
+        accumulateur.add(pd.read_csv(path, sep=';', dtype=TYPES_TEXTE))
+    else:
+        accumulateur = stream_stations(path)
+    accumulateur.lignes()
+    accumulateur.villes()
+    duree = time.perf_counter() - debut
+    print(duree, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+
+def measure(mode, path):
+    sortie = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, path],
+                            capture_output=True, text=True, check=True).stdout.split()
+    return float(sortie[0]), int(sortie[1]) / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000_000, 5_000_000, 20_000_000])
+    parser.add_argument('--stations', type=int, default=2_000)
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    print(f"{'releves':>12} {'CSV (Mo)':>9} {'complet (s)':>12} {'pic (Mo)':>9} {'blocs (s)':>10} {'pic (Mo)':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            path = os.path.join(tmp, f'releves-{n}.csv')
+            n = write_daily_export(path, n, args.stations)
+            taille = os.path.getsize(path) / 1024 ** 2
+            t_full, rss_full = measure('complet', path)
+            t_stream, rss_stream = measure('blocs', path)
+            print(f"{n:>12,} {taille:>9.0f} {t_full:>12.2f} {rss_full:>9.0f} {t_stream:>10.2f} {rss_stream:>9.0f}")
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Tableau de resultats d'Exploration libre : tri + envoi de toute la selection vs page triee cote serveur
+
+Mesure le tri et la serialisation Arrow (ce que st.dataframe envoie au navigateur) par rerun,
+pour des selections de taille croissante. Verifie que la page correspond au debut du tri complet.
+Usage : python benchmarks/bench_table.py [--rows 1000000] [--fractions 0.001 0.1 1] [--page 100]
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from streamlit.dataframe_util import convert_pandas_df_to_arrow_bytes
+
+from indexes import SortIndex
+from utils import apply_schema, join_lignes
+from benchmarks.common import synthetic_stations, timeit
+
+COLONNES = ['Rang', 'Réseau', 'Station', 'Trafic', 'Lignes', 'Ville', 'Arrondissement pour Paris']
+
+
+def complet(df, mask):
+    """Ancien comportement : selection copiee, triee puis envoyee en entier"""
+    df_display = df[mask][COLONNES].sort_values('Trafic', ascending=False)
+    return df_display, len(convert_pandas_df_to_arrow_bytes(df_display))
+
+
+def pagine(df, index, mask, taille):
+    """Ordre pre-calcule restreint au masque, seule la premiere page est materialisee"""
+    ordre = index.rows(mask, 'Trafic', ascending=False)
+    page = df.take(ordre[:taille])[COLONNES]
+    page = page.apply(lambda s: s.cat.remove_unused_categories() if isinstance(s.dtype, pd.CategoricalDtype) else s)
+    return page, len(convert_pandas_df_to_arrow_bytes(page))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--fractions', type=float, nargs='+', default=[0.001, 0.1, 1.0])
+    parser.add_argument('--page', type=int, default=100)
+    args = parser.parse_args()
+
+    df = synthetic_stations(args.rows)
+    df['Lignes'] = join_lignes(df)
+    df = apply_schema(df)
+    index = SortIndex(df)
+    print(f"Ordre de tri initial (une fois par version) : {timeit(index.order, 'Trafic', False):.3f} s")
+
+    rng = np.random.default_rng(0)
+    print(f"{'selection':>10} {'complet (s)':>12} {'envoye (Ko)':>12} {'page (s)':>10} {'envoye (Ko)':>12} {'speedup':>8}")
+    for fraction in args.fractions:
+        mask = rng.random(len(df)) < fraction
+        reference, octets_complet = complet(df, mask)
+        page, octets_page = pagine(df, index, mask, args.page)
+        attendu = reference.head(args.page).reset_index(drop=True)
+        assert attendu.astype(str).equals(page.reset_index(drop=True).astype(str))
+
+        t_complet = timeit(complet, df, mask, repeat=3)
+        t_page = timeit(pagine, df, index, mask, args.page, repeat=3)
+        print(f"{mask.sum():>10,} {t_complet:>12.3f} {octets_complet / 1024:>12,.0f} "
+              f"{t_page:>10.4f} {octets_page / 1024:>12,.0f} {t_complet / t_page:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Top N sous filtre : nlargest sur la selection copiee vs parcours de l'ordre decroissant pre-calcule (TopK)
+
+Le masque garde une fraction aleatoire des stations ; verifie que TopK rend les memes lignes que nlargest
+et que la somme 'Autres' par reseau lue dans les sommes prefixes est celle du tri.
+Usage : python benchmarks/bench_topk.py [--sizes 100000 1000000] [--k 20]
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from indexes import TopK
+from benchmarks.common import synthetic_stations, timeit
+
+FRACTIONS = [1.0, 0.5, 0.05, 0.001]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--k', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'lignes':>11} {'construction (s)':>17} {'selection':>10} {'nlargest (ms)':>14} {'TopK (ms)':>10} "
+          f"{'speedup':>8}")
+    for n in args.sizes:
+        df = synthetic_stations(n)
+        t_construction = timeit(lambda: TopK(df, by='Réseau'))
+        top = TopK(df, by='Réseau')
+
+        for reseau in df['Réseau'].unique():
+            trie = df.loc[df['Réseau'] == reseau, 'Trafic'].sort_values(ascending=False)
+            assert np.isclose(top.rest(args.k, reseau), trie.iloc[args.k:].sum()), reseau
+
+        rng = np.random.default_rng(0)
+        for fraction in FRACTIONS:
+            mask = rng.random(n) < fraction
+            attendu = df.take(np.flatnonzero(mask)).nlargest(args.k, 'Trafic')
+            assert top.head(args.k, mask=mask).index.equals(attendu.index)
+
+            t_nlargest = timeit(lambda: df.take(np.flatnonzero(mask)).nlargest(args.k, 'Trafic'), repeat=3)
+            t_topk = timeit(lambda: top.head(args.k, mask=mask), repeat=3)
+            print(f"{n:>11,} {t_construction:>17.2f} {fraction:>10.1%} {t_nlargest * 1e3:>14.1f} "
+                  f"{t_topk * 1e3:>10.2f} {t_nlargest / t_topk:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
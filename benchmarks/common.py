@@ -0,0 +1,21 @@
+"""
+Outils partages par les benchmarks : jeu synthetique et chronometrage
+"""
+import time
+
+from benchmarks.synthetic import ANNEE_REFERENCE, generate_stations
+
+
+def synthetic_stations(n, seed=0, year=ANNEE_REFERENCE):
+    """Jeu de stations synthetique au schema et aux distributions du CSV RATP (voir synthetic.py)"""
+    return generate_stations(n, year, seed)
+
+
+def timeit(func, *args, repeat=1):
+    """Meilleur temps (s) sur `repeat` executions"""
+    meilleur = float('inf')
+    for _ in range(repeat):
+        debut = time.perf_counter()
+        func(*args)
+        meilleur = min(meilleur, time.perf_counter() - debut)
+    return meilleur
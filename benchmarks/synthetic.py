@@ -0,0 +1,158 @@
+"""
+Generateur d'exports synthetiques au schema et aux distributions du CSV RATP 2021
+
+Deterministe pour une graine donnee : les memes stations (reseau, lignes, ville) sont reprises
+d'une annee a l'autre, seul le trafic varie.
+Usage : python benchmarks/synthetic.py --rows 1000000 [--years 2019 2020 2021] [--seed 0] --output /tmp/donnees
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import CORRESPONDANCES_COLS
+
+ANNEE_REFERENCE = 2021
+FICHIER = 'trafic-annuel-entrant-par-station-du-reseau-ferre-{annee}.csv'
+
+# Proportions de l'export 2021 (371 stations)
+PART_RER = 66 / 371
+PART_PARIS = {'Métro': 245 / 305, 'RER': 11 / 66}
+# Nombre de stations par nombre de correspondances (1 a 5) de chaque reseau dans l'export 2021
+NB_CORRESPONDANCES = {'Métro': [245, 43, 12, 2, 3], 'RER': [65, 1, 0, 0, 0]}
+# Stations sans correspondance renseignee (absentes de l'export 2021, possibles dans d'autres annees)
+PART_SANS_CORRESPONDANCE = 0.01
+# Trafic log-normal (mediane ~2,3 millions), queue plus lourde pour le RER ; les poles de correspondance sont plus charges
+TRAFIC_LOG_MEDIANE = {'Métro': 14.64, 'RER': 14.67}
+TRAFIC_LOG_ECART = {'Métro': 0.72, 'RER': 0.95}
+BONUS_CORRESPONDANCE = 0.35
+# Evolution annuelle moyenne du trafic et dispersion par station d'une annee a l'autre
+CROISSANCE_ANNUELLE = 0.03
+DISPERSION_ANNUELLE = 0.05
+
+# Lignes dans l'ordre des colonnes Correspondance_* et leur frequence dans l'export 2021
+LIGNES_METRO = {'1': 25, '2': 26, '3': 25, '3bis': 4, '4': 27, '5': 22, '6': 28, '7': 38, '7bis': 8,
+                '8': 38, '9': 38, '10': 23, '11': 13, '12': 29, '13': 32, '14': 13}
+LIGNES_RER = {'A': 36, 'B': 32}
+# Stations parisiennes par arrondissement (1 a 20) dans l'export 2021
+ARRONDISSEMENTS = [8, 4, 6, 6, 7, 9, 11, 15, 14, 11, 16, 21, 18, 14, 19, 20, 17, 13, 15, 11]
+VILLES_BANLIEUE = [
+    'Antony', 'Boulogne Billancourt', 'Saint Denis', 'Créteil', 'Maisons -Alfort', 'Nanterre', 'Montreuil',
+    'Levallois-Perret', 'Palaiseau', 'Vincennes', 'Issy-les-Moulineaux', 'Ivry-sur-Seine', 'Montrouge',
+    'Clichy', 'Saint-Ouen', 'Bagnolet', 'Pantin', 'Aubervilliers', 'Villejuif', 'Gentilly', 'Le Kremlin-Bicêtre',
+    'Malakoff', 'Châtillon', 'Vanves', 'Neuilly-sur-Seine', 'Puteaux', 'Courbevoie', 'Asnières-sur-Seine',
+    'Gennevilliers', 'Bobigny', 'Noisy-le-Grand', 'Rueil-Malmaison', 'Saint-Germain-en-Laye', 'Orsay', 'Sceaux',
+    'Bourg-la-Reine', 'Cachan', 'Arcueil', 'Gif-sur-Yvette', 'Bures-sur-Yvette', 'Fontenay-sous-Bois',
+    'Nogent-sur-Marne', 'Joinville-le-Pont', 'Saint-Maur-des-Fossés', 'Champigny-sur-Marne', 'Torcy',
+    'Chessy', 'Marne-la-Vallée', 'Boissy-Saint-Léger', 'Sucy-en-Brie', 'Le Vésinet', 'Chatou', 'Massy',
+    'Mitry-Mory', 'Aulnay-sous-Bois', 'Sevran', 'Le Blanc-Mesnil', 'La Courneuve', 'Drancy', 'Stains',
+]
+PREFIXES = ['', 'PORTE DE ', 'GARE DE ', 'PLACE ', 'PONT DE ', 'SAINT-', 'MAIRIE DE ', 'LES ', 'LA ', 'LE ',
+            'AVENUE ', 'BOULEVARD ', 'PARC DE ', 'CHATEAU DE ', 'CROIX DE ', 'QUAI DE ']
+NOMS = ['NATION', 'REPUBLIQUE', 'BASTILLE', 'CONCORDE', 'OPERA', 'MONTPARNASSE', 'ETOILE', 'TROCADERO',
+        'VINCENNES', 'CHARENTON', 'CLICHY', 'ITALIE', 'ORLEANS', 'VERSAILLES', 'BERCY', 'AUSTERLITZ', 'GLACIERE',
+        'DENIS', 'LAZARE', 'MICHEL', 'GERMAIN', 'AMBROISE', 'MANDE', 'VICTOR HUGO', 'ALEXANDRE DUMAS',
+        'PHILIPPE AUGUSTE', 'BELLEVILLE', 'MENILMONTANT', 'PIGALLE', 'ABBESSES', 'JAURES', 'STALINGRAD',
+        'VOLTAIRE', 'CHAMPS-ELYSEES', 'INVALIDES', 'SEVRES', 'VAUGIRARD', 'PASSY', 'AUTEUIL', 'LILAS',
+        'PANTIN', 'CHOISY', 'IVRY', 'MONTREUIL', 'BAGNOLET', 'CRETEIL', 'LA DEFENSE', 'NANTERRE', 'BOBIGNY',
+        'MAIRIE', 'LUXEMBOURG', 'DENFERT', 'CITE', 'HALLES', 'CHATELET', 'LOUVRE', 'PALAIS ROYAL', 'TUILERIES']
+
+
+def _station_names(n, rng):
+    """Noms uniques facon RATP (majuscules sans accents), suffixes numerotes au-dela des combinaisons"""
+    combinaisons = np.array([f'{p}{nom}' for p in PREFIXES for nom in NOMS], dtype=object)
+    rng.shuffle(combinaisons)
+    ids = np.arange(n)
+    noms = combinaisons[ids % len(combinaisons)]
+    tour = ids // len(combinaisons)
+    return np.where(tour == 0, noms, noms + ' ' + (tour + 1).astype(str))
+
+
+def _correspondances(reseaux_rer, rng):
+    """Lignes distinctes de chaque station (0 a 5 colonnes, dans l'ordre des lignes), NaN au-dela"""
+    n = len(reseaux_rer)
+    lignes = np.array([*LIGNES_METRO, *LIGNES_RER], dtype=object)
+    poids = np.array([*LIGNES_METRO.values(), *LIGNES_RER.values()], dtype='float64')
+    metro = np.arange(len(lignes)) < len(LIGNES_METRO)
+
+    nb = np.zeros(n, dtype='int64')
+    for reseau, masque in (('Métro', ~reseaux_rer), ('RER', reseaux_rer)):
+        effectifs = np.array(NB_CORRESPONDANCES[reseau], dtype='float64')
+        nb[masque] = rng.choice(np.arange(1, 6), size=masque.sum(), p=effectifs / effectifs.sum())
+    nb[rng.random(n) < PART_SANS_CORRESPONDANCE] = 0
+
+    resultat = np.full((n, len(CORRESPONDANCES_COLS)), np.nan, dtype=object)
+    for debut in range(0, n, 250_000):
+        fin = min(n, debut + 250_000)
+        rer = reseaux_rer[debut:fin, None]
+        # Tirage sans remise pondere (cles de Gumbel), lignes du reseau de la station seulement
+        cles = np.log(poids)[None, :] - np.log(-np.log(rng.random((fin - debut, len(lignes)))))
+        cles[np.where(rer, metro[None, :], ~metro[None, :])] = -np.inf
+        rangs = np.argsort(-cles, axis=1)[:, :len(CORRESPONDANCES_COLS)]
+        rangs = np.where(np.arange(len(CORRESPONDANCES_COLS))[None, :] < nb[debut:fin, None], rangs, len(lignes))
+        rangs.sort(axis=1)
+        choisies = np.append(lignes, np.nan)[rangs]
+        resultat[debut:fin] = choisies
+    return resultat, nb
+
+
+def generate_stations(n, year=ANNEE_REFERENCE, seed=0):
+    """Export synthetique de `n` stations pour l'annee `year`, au schema du CSV RATP"""
+    rng = np.random.default_rng([seed])
+    rer = rng.random(n) < PART_RER
+    reseaux = np.where(rer, 'RER', 'Métro')
+    correspondances, nb = _correspondances(rer, rng)
+
+    paris = rng.random(n) < np.where(rer, PART_PARIS['RER'], PART_PARIS['Métro'])
+    arrondissements = rng.choice(np.arange(1, 21), size=n, p=np.array(ARRONDISSEMENTS) / sum(ARRONDISSEMENTS))
+    # Villes de banlieue tres inegalement desservies (loi de Zipf)
+    rangs_villes = 1 / np.arange(1, len(VILLES_BANLIEUE) + 1)
+    villes = rng.choice(VILLES_BANLIEUE, size=n, p=rangs_villes / rangs_villes.sum())
+
+    moyenne = (np.where(rer, TRAFIC_LOG_MEDIANE['RER'], TRAFIC_LOG_MEDIANE['Métro'])
+               + BONUS_CORRESPONDANCE * np.maximum(nb - 1, 0))
+    ecart = np.where(rer, TRAFIC_LOG_ECART['RER'], TRAFIC_LOG_ECART['Métro'])
+    log_trafic = rng.normal(moyenne, ecart)
+    noms = _station_names(n, rng)
+    ordre = rng.permutation(n)
+
+    # Seul le trafic depend de l'annee (memes stations d'un export a l'autre)
+    rng_annee = np.random.default_rng([seed, year])
+    log_trafic = log_trafic + (year - ANNEE_REFERENCE) * CROISSANCE_ANNUELLE + rng_annee.normal(0, DISPERSION_ANNUELLE, n)
+    trafic = np.maximum(np.exp(log_trafic), 1).astype('int64')
+
+    df = pd.DataFrame({'Rang': 0, 'Réseau': reseaux, 'Station': noms, 'Trafic': trafic})
+    for k, col in enumerate(CORRESPONDANCES_COLS):
+        df[col] = correspondances[:, k]
+    df['Ville'] = np.where(paris, 'Paris', villes)
+    df['Arrondissement pour Paris'] = pd.Series(arrondissements, dtype='Int64').where(paris)
+    # Rang dans le reseau, lignes dans un ordre quelconque comme dans l'export
+    df['Rang'] = df.groupby('Réseau')['Trafic'].rank(method='first', ascending=False).astype('int64')
+    return df.iloc[ordre].reset_index(drop=True)
+
+
+def write_export(path, n, year=ANNEE_REFERENCE, seed=0):
+    """Ecrit l'export synthetique comme le CSV d'origine (separateur ';', UTF-8 avec BOM)"""
+    generate_stations(n, year, seed).to_csv(path, sep=';', index=False, encoding='utf-8-sig')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, required=True)
+    parser.add_argument('--years', type=int, nargs='+', default=[ANNEE_REFERENCE])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', required=True, help="dossier de sortie (DATA_DIR d'un essai)")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    for annee in args.years:
+        path = os.path.join(args.output, FICHIER.format(annee=annee))
+        write_export(path, args.rows, annee, args.seed)
+        print(f"{path} : {args.rows:,} stations")
+
+
+if __name__ == '__main__':
+    main()
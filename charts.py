@@ -0,0 +1,132 @@
+"""
+Rendu des graphiques matplotlib avec cache LRU des images (PNG/SVG) partage entre sessions,
+ou specifications Vega-Lite rendues par le navigateur (graphiques interactifs)
+"""
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+from instrumentation import cache_hit, cache_miss, span
+from utils import configure_matplotlib
+
+# Memes options que st.pyplot
+SAVEFIG_OPTIONS = {'bbox_inches': 'tight', 'dpi': 200}
+
+CHART_CACHE_MAX_BYTES = 64 * 1024 * 1024
+CHART_CACHE_MAX_ENTRIES = 512
+
+# Moteur par defaut : 'matplotlib' (images rendues par le serveur) ou 'vega' (graphiques rendus par le navigateur)
+CHART_BACKEND = os.environ.get('RATP_CHARTS', 'matplotlib')
+
+class ChartCache:
+    """Cache LRU d'images rendues, borne en nombre d'entrees et en octets"""
+
+    def __init__(self, max_bytes=CHART_CACHE_MAX_BYTES, max_entries=CHART_CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, key, payload):
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= len(self._entries.pop(key))
+            self._entries[key] = payload
+            self.size += len(payload)
+            while self.size > self.max_bytes or len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def __len__(self):
+        return len(self._entries)
+
+@st.cache_resource
+def chart_cache():
+    """Cache d'images commun a toutes les sessions du serveur"""
+    return ChartCache()
+
+def _freeze(value):
+    """Rend une valeur de parametre hachable (listes -> tuples, dicts -> tuples tries)"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+def render_chart(kind, params, draw, version, fmt='png'):
+    """Octets de l'image du graphique `kind` ; draw() n'est appele qu'en cas d'absence du cache"""
+    cache = chart_cache()
+    key = (kind, _freeze(params), version, fmt)
+    payload = cache.get(key)
+    if payload is not None:
+        cache_hit('graphiques')
+        return payload
+    cache_miss('graphiques')
+    with span(f'graphique:{kind}', 'graphiques'):
+        import matplotlib.pyplot as plt  # charge au premier graphique matplotlib, avant draw()
+        # Style RATP applique au premier trace seulement : le mode Vega-Lite ne charge pas matplotlib
+        configure_matplotlib()
+        fig = draw()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=fmt, **SAVEFIG_OPTIONS)
+        plt.close(fig)
+        payload = buffer.getvalue()
+    cache.put(key, payload)
+    return payload
+
+def show_chart(kind, params, draw, version, fmt='png'):
+    """Affiche un graphique matplotlib via le cache d'images"""
+    payload = render_chart(kind, params, draw, version, fmt)
+    st.image(payload.decode('utf-8') if fmt == 'svg' else payload, width='stretch')
+
+def _keep_chart_backend():
+    st.session_state['chart_backend'] = 'vega' if st.session_state['_graphiques_interactifs'] else 'matplotlib'
+
+def chart_backend():
+    """Interrupteur 'Graphiques interactifs' de la sidebar ('matplotlib' ou 'vega'), conserve d'une page a l'autre"""
+    if 'chart_backend' not in st.session_state:
+        st.session_state['chart_backend'] = 'vega' if CHART_BACKEND == 'vega' else 'matplotlib'
+    # L'etat d'un widget disparait avec la page : il est recopie depuis une cle permanente a chaque rerun
+    st.session_state['_graphiques_interactifs'] = st.session_state['chart_backend'] == 'vega'
+    with st.sidebar:
+        st.toggle("Graphiques interactifs", key='_graphiques_interactifs', on_change=_keep_chart_backend,
+                  help="Filtres, tri et infobulles appliqués par le navigateur, sans rechargement")
+    return st.session_state['chart_backend']
+
+def show_vega_chart(kind, params, build, version):
+    """
+    Affiche un graphique Vega-Lite via le cache : build() (graphique Altair, donnees agregees comprises)
+    n'est appele qu'en cas d'absence du cache, la specification est gardee en JSON.
+    """
+    cache = chart_cache()
+    key = (kind, _freeze(params), version, 'vega')
+    payload = cache.get(key)
+    if payload is not None:
+        cache_hit('graphiques')
+    else:
+        cache_miss('graphiques')
+        with span(f'graphique:{kind}', 'graphiques'):
+            payload = json.dumps(build().to_dict()).encode('utf-8')
+        cache.put(key, payload)
+    st.vega_lite_chart(spec=json.loads(payload), width='stretch')
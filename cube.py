@@ -0,0 +1,145 @@
+"""
+Cube d'agregats pre-calcule du trafic RATP (somme, effectif, moyenne, esquisses de quantiles)
+"""
+import numpy as np
+import pandas as pd
+
+from instrumentation import timed
+from sketches import QUANTILE_RELATIVE_ERROR, LogBins
+from utils import dataset_resource, explode_lignes
+
+DIMENSIONS_STATIONS = ['Année', 'Réseau', 'Ville', 'Zone', 'Arrondissement pour Paris']
+DIMENSIONS_LIGNES = DIMENSIONS_STATIONS + ['Ligne']
+# Classes larges de l'histogramme de distribution (regroupement des classes des esquisses)
+HISTOGRAM_BINS_PER_DECADE = 8
+
+class AggregateCube:
+    """
+    Agregats par cellule (combinaison des dimensions) et esquisses de quantiles fusionnables.
+    Les quantiles sont estimes a `relative_error` pres ; aucune valeur brute n'est conservee,
+    la memoire depend du nombre de cellules et de classes occupees, pas du nombre de lignes.
+    Les esquisses sont creuses : une entree par classe occupee de chaque cellule.
+    """
+
+    def __init__(self, df, dimensions, mesure='Trafic', relative_error=QUANTILE_RELATIVE_ERROR):
+        self.dimensions = [d for d in dimensions if d in df.columns]
+        self.bins = LogBins(relative_error)
+        groupes = df.groupby(self.dimensions, observed=True, dropna=False, sort=True)
+
+        self.cells = groupes[mesure].agg(Trafic_total='sum', Nb_stations='count').reset_index()
+        self.cells['Trafic_total'] = self.cells['Trafic_total'].astype('int64')
+
+        cellule = groupes.ngroup().to_numpy()
+        valeurs = df[mesure].to_numpy(dtype='float64', na_value=np.nan)
+
+        # Esquisses creuses : seules les classes occupees de chaque cellule sont stockees
+        self._set_sketches(cellule * len(self.bins) + self.bins.bin(np.nan_to_num(valeurs)))
+
+    def _set_sketches(self, cles, effectifs=None):
+        """Cles (cellule * nb_classes + classe) distinctes triees et effectifs cumules"""
+        self.sketch_keys, inverse = np.unique(cles, return_inverse=True)
+        self.sketch_counts = np.bincount(inverse, weights=effectifs, minlength=len(self.sketch_keys)).astype('int64')
+
+    def merge(self, *others):
+        """Cube fusionne avec `others` (memes dimensions) : sommes et esquisses additionnees par cellule"""
+        cubes = [self, *others]
+        if any(cube.bins != self.bins for cube in others):
+            raise ValueError("Cubes de precisions differentes")
+        cells = pd.concat([cube.cells for cube in cubes], ignore_index=True)
+        groupes = cells.groupby(self.dimensions, observed=True, dropna=False, sort=True)
+
+        merged = AggregateCube.__new__(AggregateCube)
+        merged.dimensions = self.dimensions
+        merged.bins = self.bins
+        merged.cells = groupes[['Trafic_total', 'Nb_stations']].sum().reset_index()
+        for dim in self.dimensions:
+            merged.cells[dim] = merged.cells[dim].astype(cubes[-1].cells[dim].dtype)
+
+        # Cellule fusionnee de chaque cellule d'origine (cubes mis bout a bout)
+        cellules = groupes.ngroup().to_numpy()
+        decalages = np.cumsum([0] + [len(cube.cells) for cube in cubes[:-1]])
+        nb_classes = len(self.bins)
+
+        merged._set_sketches(
+            np.concatenate([cellules[decalage + cube.sketch_keys // nb_classes] * nb_classes + cube.sketch_keys % nb_classes
+                            for decalage, cube in zip(decalages, cubes)]),
+            np.concatenate([cube.sketch_counts for cube in cubes])
+        )
+        return merged
+
+    def mask(self, filters=None):
+        """Masque des cellules retenues par {dimension: valeur ou liste de valeurs}"""
+        mask = np.ones(len(self.cells), dtype=bool)
+        for dim, valeurs in (filters or {}).items():
+            if not isinstance(valeurs, (list, tuple, set)):
+                valeurs = [valeurs]
+            mask &= self.cells[dim].isin(valeurs).to_numpy()
+        return mask
+
+    def rollup(self, by, filters=None):
+        """Agregats (total, effectif, moyenne) par `by` sur les cellules filtrees"""
+        cells = self.cells[self.mask(filters)]
+        stats = cells.groupby(by, observed=True, sort=True)[['Trafic_total', 'Nb_stations']].sum().reset_index()
+        stats['Trafic_moyen'] = stats['Trafic_total'] / stats['Nb_stations']
+        return stats
+
+    def histogram(self, filters=None):
+        """Esquisse fusionnee des cellules filtrees (effectifs par classe de self.bins)"""
+        nb_classes = len(self.bins)
+        retenues = self.mask(filters)[self.sketch_keys // nb_classes]
+        return np.bincount(self.sketch_keys[retenues] % nb_classes, weights=self.sketch_counts[retenues],
+                           minlength=nb_classes).astype('int64')
+
+    def distribution(self, filters=None, per_decade=HISTOGRAM_BINS_PER_DECADE):
+        """Histogramme du trafic des cellules filtrees sur des classes logarithmiques larges fixes : (bornes, effectifs)"""
+        return self.bins.coarsen(self.histogram(filters), per_decade)
+
+    def count(self, filters=None):
+        """Nombre de valeurs renseignees des cellules filtrees"""
+        return int(self.cells.loc[self.mask(filters), 'Nb_stations'].sum())
+
+    def quantile(self, q, filters=None):
+        """Quantile du trafic sur les cellules filtrees, par fusion des esquisses"""
+        return self.bins.quantile(self.histogram(filters), q)
+
+    def summary(self, filters=None):
+        """Total, effectif, moyenne et mediane (estimee) sur les cellules filtrees"""
+        total = int(self.cells.loc[self.mask(filters), 'Trafic_total'].sum())
+        count = self.count(filters)
+        return {
+            'Trafic_total': total,
+            'Nb_stations': count,
+            'Trafic_moyen': total / count if count else np.nan,
+            'Trafic_median': self.quantile(0.5, filters)
+        }
+
+def _with_zone(df):
+    return df.assign(Zone=np.where(df['Ville'] == 'Paris', 'Paris', 'Banlieue'))
+
+def build_station_cube(df):
+    """Cube Annee x Reseau x Ville x Zone x Arrondissement, au grain station"""
+    return AggregateCube(_with_zone(df), DIMENSIONS_STATIONS)
+
+def build_ligne_cube(df):
+    """Cube des memes dimensions x Ligne, au grain (station, ligne)"""
+    extra = [d for d in DIMENSIONS_STATIONS if d in df.columns and d != 'Réseau']
+    return AggregateCube(explode_lignes(_with_zone(df), extra=extra), DIMENSIONS_LIGNES)
+
+def _build_cubes(df):
+    return build_station_cube(df), build_ligne_cube(df)
+
+@timed('build_cubes', 'agregation')
+def build_cubes(df):
+    """Cubes (stations, lignes), construits par partition dans le pool de processus si active"""
+    from parallel import parallel_cubes, use_parallel
+    return parallel_cubes(df) if use_parallel(df) else _build_cubes(df)
+
+@timed('update_cubes', 'agregation')
+def update_cubes(previous, df, base_rows):
+    """Cubes de df a partir de ceux (`previous`) de ses `base_rows` premieres lignes : seules les stations ajoutees sont agregees"""
+    ajout = _build_cubes(df.iloc[base_rows:])
+    return tuple(cube.merge(delta) for cube, delta in zip(previous, ajout))
+
+def load_cubes(df):
+    """Cubes (stations, lignes) du jeu de donnees, construits une fois par version de la source"""
+    return dataset_resource('cubes', df, build_cubes, update_cubes)
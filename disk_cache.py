@@ -0,0 +1,214 @@
+"""
+Cache disque colonnaire (Arrow/Feather) des tableaux prepares du dashboard RATP
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from instrumentation import cache_hit, cache_miss
+
+CACHE_DIR = os.path.join('data', '.cache')
+
+# A incrementer des que les derivations de load_data / prepare_ligne_data changent
+CACHE_VERSION = 2
+# Versions gardees par entree : les entrees 'lignes' et 'partage' dependent de la selection d'annees,
+# plusieurs selections (sessions differentes) doivent coexister sans s'effacer mutuellement
+CACHE_MAX_VERSIONS = 4
+# Cle d'une version : empreintes de sources ('v<CACHE_VERSION>-...', jointes par '+') ou empreinte d'un tableau (entier)
+_VERSION_FILE = r'(?P<key>v\d+-[0-9a-f]+(?:\+v\d+-[0-9a-f]+)*|\d+)-\d+\.feather'
+
+# Fichiers en cours de lecture dans ce processus (ex. par les processus du pool), jamais supprimes
+_pinned = Counter()
+_pinned_lock = threading.Lock()
+
+def _manifest_path():
+    return os.path.join(CACHE_DIR, 'sources.json')
+
+def _read_manifest():
+    try:
+        with open(_manifest_path(), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_atomic(path, write):
+    """Ecrit via un fichier temporaire puis os.replace (sur entre replicas concurrents)"""
+    tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def _write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+def content_hash(path, prefix=None, chunk_size=1 << 20):
+    """
+    Empreinte SHA-256 du contenu d'un fichier.
+    Avec `prefix`, retourne aussi l'empreinte des `prefix` premiers octets (None s'ils ne finissent pas une ligne).
+    """
+    h = hashlib.sha256()
+    prefix_digest = None
+    with open(path, 'rb') as f:
+        if prefix:
+            lu = 0
+            dernier = b''
+            while lu < prefix:
+                chunk = f.read(min(chunk_size, prefix - lu))
+                if not chunk:
+                    break
+                h.update(chunk)
+                lu += len(chunk)
+                dernier = chunk[-1:]
+            if lu == prefix and dernier == b'\n':
+                prefix_digest = h.copy().hexdigest()
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    if prefix is None:
+        return h.hexdigest()
+    return h.hexdigest(), prefix_digest
+
+def _key(digest):
+    return f'v{CACHE_VERSION}-{digest[:16]}'
+
+def source_key(path):
+    """
+    Cle de cache d'un fichier source : hash du contenu, recalcule seulement si taille/mtime changent.
+    Si le nouveau contenu prolonge l'ancien (lignes ajoutees), l'ancienne version est notee comme base.
+    """
+    stat = os.stat(path)
+    signature = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    manifest = _read_manifest()
+    entry = manifest.get(os.path.abspath(path))
+
+    if entry and all(entry.get(k) == v for k, v in signature.items()):
+        digest = entry['sha256']
+    else:
+        nouvelle = dict(signature)
+        if entry and 0 < entry['size'] < stat.st_size:
+            digest, prefix_digest = content_hash(path, prefix=entry['size'])
+            if prefix_digest == entry['sha256']:
+                nouvelle['base'] = {'sha256': entry['sha256'], 'size': entry['size']}
+        else:
+            digest = content_hash(path)
+        nouvelle['sha256'] = digest
+        manifest[os.path.abspath(path)] = nouvelle
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            _write_atomic(_manifest_path(), lambda tmp: _write_json(tmp, manifest))
+        except OSError:
+            pass
+
+    return _key(digest)
+
+def source_base(path):
+    """Version precedente dont le contenu actuel de `path` est un prolongement : (cle, taille) ou None"""
+    entry = _read_manifest().get(os.path.abspath(path)) or {}
+    base = entry.get('base')
+    if base is None or 'sha256' not in base or entry.get('size') != os.path.getsize(path):
+        return None
+    # Cle derivee a la lecture : une base enregistree avant un changement de CACHE_VERSION n'est pas reprise
+    return _key(base['sha256']), base['size']
+
+def _frame_paths(name, key, count):
+    return [os.path.join(CACHE_DIR, f'{name}-{key}-{i}.feather') for i in range(count)]
+
+@contextmanager
+def pinned(paths):
+    """Protege `paths` de l'eviction pendant qu'ils sont lus"""
+    with _pinned_lock:
+        _pinned.update(paths)
+    try:
+        yield
+    finally:
+        with _pinned_lock:
+            _pinned.subtract(paths)
+            for path in [p for p, n in _pinned.items() if n <= 0]:
+                del _pinned[path]
+
+def _drop_stale(name, key):
+    """
+    Supprime les versions d'une entree les moins recemment utilisees (date de modification, rafraichie
+    a chaque lecture) au-dela de CACHE_MAX_VERSIONS ; la version `key` et les fichiers epingles sont gardes.
+    """
+    motif = re.compile(re.escape(f'{name}-') + _VERSION_FILE)
+    versions = {}
+    for fichier in os.listdir(CACHE_DIR):
+        match = motif.fullmatch(fichier)
+        if match and match.group('key') != key:
+            path = os.path.join(CACHE_DIR, fichier)
+            try:
+                recente = os.path.getmtime(path)
+            except OSError:
+                continue
+            fichiers, date = versions.get(match.group('key'), ([], 0.0))
+            versions[match.group('key')] = (fichiers + [path], max(date, recente))
+
+    anciennes = sorted(versions.values(), key=lambda version: version[1], reverse=True)[CACHE_MAX_VERSIONS - 1:]
+    with _pinned_lock:
+        for fichiers, _ in anciennes:
+            if any(_pinned[path] for path in fichiers):
+                continue
+            for path in fichiers:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+def load_frames(name, key, count=1):
+    """DataFrames `name` pour la cle `key` depuis le cache disque, ou None s'ils sont absents"""
+    paths = _frame_paths(name, key, count)
+    if not all(os.path.exists(p) for p in paths):
+        cache_miss(f'disque:{name}')
+        return None
+    try:
+        import pyarrow.feather as feather  # differe : pyarrow n'est charge qu'a la premiere lecture
+        frames = [feather.read_table(p).to_pandas() for p in paths]
+    except (OSError, ValueError):
+        cache_miss(f'disque:{name}')
+        return None
+    # Version marquee comme recemment utilisee (eviction des moins recentes)
+    for p in paths:
+        try:
+            os.utime(p)
+        except OSError:
+            pass
+    cache_hit(f'disque:{name}')
+    return frames[0] if count == 1 else tuple(frames)
+
+def store_frames(name, key, result, count=1):
+    """
+    Enregistre `result` (un DataFrame, ou un tuple de `count` DataFrames) et supprime les versions
+    les moins recemment utilisees au-dela de CACHE_MAX_VERSIONS.
+    Retourne les chemins des fichiers (None si l'ecriture a echoue).
+    """
+    frames = [result] if count == 1 else list(result)
+    paths = _frame_paths(name, key, count)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        for frame, path in zip(frames, paths):
+            if not os.path.exists(path):
+                _write_atomic(path, lambda tmp: frame.to_feather(tmp, compression='uncompressed'))
+        _drop_stale(name, key)
+    except OSError:
+        return None
+    return paths
+
+def cached_frames(name, key, build, count=1):
+    """
+    Retourne les DataFrames `name` pour la cle `key` depuis le cache disque,
+    ou les construit avec build() (un DataFrame, ou un tuple de `count` DataFrames) et les enregistre.
+    """
+    result = load_frames(name, key, count)
+    if result is None:
+        result = build()
+        store_frames(name, key, result, count)
+    return result
@@ -0,0 +1,82 @@
+"""
+Exports des donnees filtrees (CSV, CSV gzip, Parquet, XLSX), generes a la demande et ecrits par blocs
+"""
+import gzip
+import io
+
+# Lignes materialisees a la fois : la memoire de l'export ne depend pas de la taille de la selection
+EXPORT_CHUNK_ROWS = 50_000
+# Limite d'une feuille Excel (1 048 576 lignes, en-tete compris)
+XLSX_MAX_ROWS = 1_048_575
+
+def iter_chunks(df, rows, columns, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Blocs de `chunk_rows` lignes (positions `rows`, dans cet ordre) reduits aux colonnes `columns`"""
+    for debut in range(0, len(rows), chunk_rows):
+        yield df.take(rows[debut:debut + chunk_rows])[columns]
+
+def _write_csv(out, chunks, compress=False):
+    flux = gzip.GzipFile(fileobj=out, mode='wb', mtime=0) if compress else out
+    texte = io.TextIOWrapper(flux, encoding='utf-8', newline='')
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(texte, sep=';', index=False, header=i == 0)
+    texte.flush()
+    texte.detach()
+    if compress:
+        flux.close()
+
+def _write_parquet(out, chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(out, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+def _write_xlsx(out, chunks):
+    from openpyxl import Workbook
+
+    # Mode ecriture seule : les lignes sont ecrites au fil de l'eau, sans garder les cellules en memoire
+    classeur = Workbook(write_only=True)
+    feuille = classeur.create_sheet('Stations')
+    for i, chunk in enumerate(chunks):
+        if i == 0:
+            feuille.append(list(chunk.columns))
+        valeurs = chunk.astype(object).where(chunk.notna(), None)
+        for ligne in valeurs.itertuples(index=False, name=None):
+            feuille.append(ligne)
+    classeur.save(out)
+
+# Format -> extension, type MIME, fonction d'ecriture et nombre maximal de lignes
+EXPORT_FORMATS = {
+    'CSV': {'extension': 'csv', 'mime': 'text/csv', 'write': _write_csv, 'max_rows': None},
+    'CSV compressé (gzip)': {'extension': 'csv.gz', 'mime': 'application/gzip',
+                              'write': lambda out, chunks: _write_csv(out, chunks, compress=True), 'max_rows': None},
+    'Parquet': {'extension': 'parquet', 'mime': 'application/vnd.apache.parquet',
+                'write': _write_parquet, 'max_rows': None},
+    'Excel (XLSX)': {'extension': 'xlsx', 'mime': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                     'write': _write_xlsx, 'max_rows': XLSX_MAX_ROWS},
+}
+
+def export_formats(nb_rows):
+    """Formats disponibles pour une selection de `nb_rows` lignes"""
+    return [nom for nom, fmt in EXPORT_FORMATS.items() if fmt['max_rows'] is None or nb_rows <= fmt['max_rows']]
+
+def export_file(df, rows, columns, format_name, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Fichier d'export (BytesIO positionne au debut) des lignes `rows` de df, dans cet ordre.
+    Ecrit bloc par bloc : seul le fichier produit (compresse pour gzip et Parquet) reste en memoire.
+    """
+    fmt = EXPORT_FORMATS[format_name]
+    if fmt['max_rows'] is not None and len(rows) > fmt['max_rows']:
+        raise ValueError(f"{len(rows):,} lignes : au-dela de la limite du format {format_name} ({fmt['max_rows']:,})")
+    out = io.BytesIO()
+    fmt['write'](out, iter_chunks(df, rows, columns, chunk_rows))
+    out.seek(0)
+    return out
@@ -0,0 +1,214 @@
+"""
+Moteur de filtres composables du tableau des stations (Exploration libre)
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from cube import HISTOGRAM_BINS_PER_DECADE, load_cubes
+from instrumentation import timed
+from indexes import LineIndex, StationSearchIndex
+from sketches import EXACT_QUANTILE_MAX_COUNT, exact_quantile
+from utils import dataset_resource
+
+FILTER_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+class FilterEngine:
+    """
+    Compile des criteres (reseau, ville, ligne, plage de trafic, recherche) en un masque unique.
+    Chaque critere est evalue sur un index dedie et son masque est memorise par signature.
+    La recherche est insensible aux accents et se rabat sur des correspondances approchees.
+    """
+
+    def __init__(self, df):
+        self.size = len(df)
+
+        # Appartenance : codes de categorie + table de correspondance
+        self.categories = {}
+        for col in ['Réseau', 'Ville']:
+            categorical = pd.Categorical(df[col])
+            self.categories[col] = (categorical.categories, categorical.codes)
+
+        # Plage de trafic : valeurs triees + permutation
+        self.trafic = trafic = df['Trafic'].to_numpy(dtype='float64', na_value=np.nan)
+        self.trafic_order = np.argsort(trafic, kind='stable')
+        self.trafic_sorted = trafic[self.trafic_order]
+
+        # Index partages avec les autres pages (une instance par version du jeu de donnees)
+        self.line_index = dataset_resource('lignes', df, LineIndex)
+        self.search_index = dataset_resource('recherche', df, StationSearchIndex)
+        self.cube, self.line_cube = load_cubes(df)
+
+        # Histogramme de distribution : classe large de chaque station (repli hors cube)
+        # et etendue des classes occupees du jeu complet (axe commun a tous les filtres)
+        bins = self.cube.bins
+        self.histogram_edges, effectifs = self.cube.distribution()
+        largeur = bins.coarse_width(HISTOGRAM_BINS_PER_DECADE)
+        self.trafic_classes = (bins.bin(np.nan_to_num(trafic)) // largeur).astype('int16')
+        occupees = np.flatnonzero(effectifs[1:]) + 1  # classe [0, ...) exclue (echelle logarithmique)
+        self.histogram_range = slice(occupees[0], occupees[-1] + 1) if len(occupees) else slice(1, 1)
+
+        # Lignes comptant chaque station une fois dans le cube des lignes (histogrammes exacts par ligne)
+        nb_classes = len(self.line_cube.bins)
+        par_cellule = np.bincount(self.line_cube.sketch_keys // nb_classes, weights=self.line_cube.sketch_counts,
+                                  minlength=len(self.line_cube.cells))
+        par_ligne = pd.Series(par_cellule).groupby(self.line_cube.cells['Ligne'].to_numpy(dtype=object)).sum()
+        self.cube_lines = {ligne for ligne, total in par_ligne.items()
+                           if total == len(self.line_index.postings.get(ligne, ()))}
+
+        self._masks = OrderedDict()
+        self._masks_bytes = 0
+        self._lock = threading.Lock()
+
+    def _empty(self):
+        return np.zeros(self.size, dtype=bool)
+
+    def _isin(self, col, values):
+        categories, codes = self.categories[col]
+        lut = np.zeros(len(categories) + 1, dtype=bool)  # code -1 (manquant) -> derniere case
+        positions = categories.get_indexer(list(values))
+        lut[positions[positions >= 0]] = True
+        return lut[codes]
+
+    def _range(self, low, high):
+        mask = self._empty()
+        debut = np.searchsorted(self.trafic_sorted, low, side='left')
+        fin = np.searchsorted(self.trafic_sorted, high, side='right')
+        mask[self.trafic_order[debut:fin]] = True
+        return mask
+
+    def _lignes(self, lignes):
+        mask = self._empty()
+        mask[self.line_index.rows(lignes)] = True
+        return mask
+
+    def _search(self, texte):
+        ids, _ = self.search_index.match_ids(texte)
+        return self.search_index.row_mask(ids)
+
+    def _compile(self, criterion):
+        kind, args = criterion
+        if kind == 'isin':
+            col, values = args
+            return self._isin(col, values)
+        if kind == 'range':
+            return self._range(*args)
+        if kind == 'lignes':
+            return self._lignes(args)
+        if kind == 'search':
+            return self._search(args)
+        raise ValueError(f"Critere inconnu : {kind}")
+
+    def _mask(self, criterion):
+        with self._lock:
+            mask = self._masks.get(criterion)
+            if mask is not None:
+                self._masks.move_to_end(criterion)
+                return mask
+
+        mask = self._compile(criterion)
+        with self._lock:
+            self._masks[criterion] = mask
+            self._masks_bytes += mask.nbytes
+            while self._masks_bytes > FILTER_CACHE_MAX_BYTES and len(self._masks) > 1:
+                _, evicted = self._masks.popitem(last=False)
+                self._masks_bytes -= evicted.nbytes
+        return mask
+
+    @staticmethod
+    def criteria(reseaux=None, villes=None, lignes=None, trafic=None, recherche=None):
+        """Signature hachable des criteres actifs (les criteres vides sont ignores)"""
+        criteres = []
+        if reseaux:
+            criteres.append(('isin', ('Réseau', tuple(sorted(reseaux)))))
+        if villes:
+            criteres.append(('isin', ('Ville', tuple(sorted(villes)))))
+        if lignes:
+            criteres.append(('lignes', tuple(sorted(lignes))))
+        if trafic is not None:
+            criteres.append(('range', tuple(trafic)))
+        if recherche:
+            criteres.append(('search', recherche))
+        return tuple(criteres)
+
+    @timed('filtres.mask', 'filtrage')
+    def mask(self, criteres):
+        """Masque combine (ET logique) des criteres"""
+        mask = np.ones(self.size, dtype=bool)
+        for criterion in criteres:
+            mask &= self._mask(criterion)
+        return mask
+
+    def rows(self, criteres):
+        """Positions des stations retenues, dans l'ordre du tableau"""
+        return np.flatnonzero(self.mask(criteres))
+
+    def _cube_filters(self, criteres):
+        """Criteres exprimes en filtres du cube (reseau, ville), ou None si un critere n'y correspond pas"""
+        filters = {}
+        for kind, args in criteres:
+            if kind == 'isin':
+                col, values = args
+                filters[col] = list(values)
+            elif kind == 'range' and args[0] <= self.trafic_sorted[0] and args[1] >= np.nanmax(self.trafic_sorted):
+                continue  # plage couvrant tout le trafic : sans effet
+            else:
+                return None
+        return filters
+
+    @timed('filtres.quantile', 'filtrage')
+    def quantile(self, criteres, q=0.5):
+        """
+        Quantile du trafic des stations retenues : esquisses du cube au-dela de EXACT_QUANTILE_MAX_COUNT stations
+        si les criteres s'y expriment, sinon exact sur le masque
+        """
+        filters = self._cube_filters(criteres)
+        if filters is not None and self.size and self.cube.count(filters) > EXACT_QUANTILE_MAX_COUNT:
+            return self.cube.quantile(q, filters)
+        return exact_quantile(self.trafic[self.rows(criteres)], q)
+
+    def _cube_selection(self, criteres):
+        """(cube, filtres) equivalents aux criteres : cube des stations, ou des lignes pour une seule ligne ; sinon None"""
+        lignes = [args for kind, args in criteres if kind == 'lignes']
+        filters = self._cube_filters([(kind, args) for kind, args in criteres if kind != 'lignes'])
+        if filters is None:
+            return None
+        if not lignes:
+            return self.cube, filters
+        if len(lignes[0]) == 1 and lignes[0][0] in self.cube_lines:
+            return self.line_cube, {**filters, 'Ligne': list(lignes[0])}
+        return None
+
+    @timed('filtres.distribution', 'filtrage')
+    def distribution(self, criteres):
+        """
+        Histogramme du trafic des stations retenues, par reseau, sur les classes logarithmiques fixes :
+        somme des esquisses pre-calculees du cube si possible, sinon comptage des stations du masque.
+        DataFrame (Réseau, Début, Fin, Stations) sur l'etendue du jeu complet.
+        """
+        reseaux, _ = self.categories['Réseau']
+        selection = self._cube_selection(criteres)
+        if selection is not None and self.size:
+            cube, filters = selection
+            retenus = filters.get('Réseau', reseaux)
+            effectifs = np.array([cube.distribution({**filters, 'Réseau': reseau})[1] if reseau in retenus
+                                  else np.zeros(len(self.histogram_edges) - 1, dtype='int64') for reseau in reseaux])
+        else:
+            mask = self.mask(criteres)
+            _, codes = self.categories['Réseau']
+            nb_classes = len(self.histogram_edges) - 1
+            mask &= codes >= 0
+            effectifs = np.bincount(codes[mask].astype('int64') * nb_classes + self.trafic_classes[mask],
+                                    minlength=len(reseaux) * nb_classes).reshape(len(reseaux), nb_classes)
+
+        etendue = self.histogram_range
+        morceaux = [pd.DataFrame({'Réseau': reseau, 'Début': self.histogram_edges[etendue],
+                                  'Fin': self.histogram_edges[etendue.start + 1:etendue.stop + 1],
+                                  'Stations': ligne[etendue]})
+                    for reseau, ligne in zip(reseaux, effectifs) if ligne[etendue].any()]
+        if not morceaux:
+            return pd.DataFrame({'Réseau': pd.Series(dtype=object), 'Début': pd.Series(dtype='float64'),
+                                 'Fin': pd.Series(dtype='float64'), 'Stations': pd.Series(dtype='int64')})
+        return pd.concat(morceaux, ignore_index=True)
@@ -0,0 +1,311 @@
+"""
+Index pre-calcules sur le tableau des stations, construits une fois par version du jeu de donnees
+"""
+import bisect
+import re
+import threading
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from utils import factorize_correspondances
+
+TOUS = 'Tous'
+
+class StationRanking:
+    """Classements par reseau (et tous reseaux) : rang, percentile, moyenne et mediane en O(1)"""
+
+    def __init__(self, df):
+        trafic = df['Trafic'].to_numpy(dtype='float64', na_value=np.nan)
+        stations = df['Station'].to_numpy(dtype=object)
+        reseaux = df['Réseau'].to_numpy(dtype=object)
+
+        self.scopes = {}
+        for scope in [TOUS] + sorted(df['Réseau'].dropna().unique().tolist()):
+            rows = np.arange(len(df)) if scope == TOUS else np.flatnonzero(reseaux == scope)
+
+            # Trafic decroissant, ex aequo departages par ordre d'apparition
+            ordre = rows[np.lexsort((rows, -np.nan_to_num(trafic[rows], nan=-1)))]
+            rangs = np.zeros(len(df), dtype='int64')
+            rangs[ordre] = np.arange(1, len(ordre) + 1)
+
+            # Nom de station -> premiere ligne du reseau portant ce nom
+            noms = pd.Series(rows, index=stations[rows])
+            lookup = noms[~noms.index.duplicated()].to_dict()
+
+            self.scopes[scope] = {
+                'rangs': rangs,
+                'lookup': lookup,
+                'stations': sorted(lookup),
+                'total': len(rows),
+                'moyenne': np.nanmean(trafic[rows]) if len(rows) else np.nan,
+                'mediane': np.nanmedian(trafic[rows]) if len(rows) else np.nan
+            }
+
+    @property
+    def reseaux(self):
+        """Choix de reseau : 'Tous' puis les reseaux tries"""
+        return list(self.scopes)
+
+    def stations(self, scope):
+        """Noms de stations tries du reseau"""
+        return self.scopes[scope]['stations']
+
+    def has_station(self, scope, station):
+        return station in self.scopes[scope]['lookup']
+
+    def resolve(self, scope, station):
+        """Ligne, rang, percentile et statistiques du reseau pour une station"""
+        index = self.scopes[scope]
+        row = index['lookup'][station]
+        rang = int(index['rangs'][row])
+        total = index['total']
+        return {
+            'row': row,
+            'rang': rang,
+            'total': total,
+            'percentile': 100 * (total - rang) / (total - 1) if total > 1 else 100.0,
+            'moyenne': index['moyenne'],
+            'mediane': index['mediane']
+        }
+
+class LineIndex:
+    """Index inverse : code de ligne normalise -> positions triees des stations desservies"""
+
+    def __init__(self, df):
+        codes, lignes_uniques = factorize_correspondances(df)
+        presents = codes >= 0
+        paires = pd.DataFrame({
+            'Ligne': lignes_uniques[codes[presents]],
+            'row': np.nonzero(presents)[0]
+        }).drop_duplicates().sort_values(['Ligne', 'row'])
+
+        lignes, debuts = np.unique(paires['Ligne'].to_numpy(dtype=str), return_index=True)
+        self.postings = dict(zip(lignes.tolist(), np.split(paires['row'].to_numpy(), debuts[1:])))
+
+    @property
+    def lignes(self):
+        """Codes de ligne tries"""
+        return list(self.postings)
+
+    def rows(self, lignes, mode='any'):
+        """Positions des stations desservies par au moins une ('any') ou toutes ('all') les lignes"""
+        listes = [self.postings.get(ligne, np.empty(0, dtype='int64')) for ligne in lignes]
+        if not listes:
+            return np.empty(0, dtype='int64')
+        if mode == 'all':
+            resultat = listes[0]
+            for liste in listes[1:]:
+                resultat = np.intersect1d(resultat, liste, assume_unique=True)
+            return resultat
+        return np.unique(np.concatenate(listes))
+
+class SortIndex:
+    """
+    Ordres de tri du tableau (positions) par colonne et par sens, calcules a la premiere demande :
+    trier une selection revient a parcourir l'ordre complet en gardant les lignes du masque.
+    Valeurs manquantes en fin, ex aequo departages par ordre d'apparition.
+    """
+
+    def __init__(self, df):
+        self.columns = {col: df[col] for col in df.columns}
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    def order(self, column, ascending=True):
+        """Positions de toutes les lignes triees selon `column`"""
+        key = (column, ascending)
+        with self._lock:
+            order = self._orders.get(key)
+        if order is None:
+            # Rang de chaque valeur parmi les valeurs distinctes triees (-1 si manquante)
+            codes, uniques = pd.factorize(self.columns[column], sort=True)
+            if ascending:
+                cles = np.where(codes < 0, len(uniques), codes)
+            else:
+                cles = np.where(codes < 0, 1, -codes)
+            dtype = 'int32' if len(codes) < 2 ** 31 else 'int64'
+            order = np.lexsort((np.arange(len(codes)), cles)).astype(dtype)
+            with self._lock:
+                self._orders[key] = order
+        return order
+
+    def rows(self, mask, column, ascending=True):
+        """Positions des lignes du masque, dans l'ordre de tri (sans trier la selection)"""
+        order = self.order(column, ascending)
+        return order[mask[order]]
+
+class TopK:
+    """
+    Top K d'un tableau par valeur decroissante de `column`, pour tout le tableau, un groupe (`by`) ou un masque :
+    l'ordre decroissant est calcule une fois, un top K sous filtre le parcourt par blocs jusqu'a K lignes retenues
+    et la somme hors top K ('Autres') se lit dans les sommes prefixes.
+    Valeurs manquantes exclues, ex aequo departages par ordre d'apparition (comme nlargest).
+    """
+
+    def __init__(self, table, column='Trafic', by=None):
+        self.table = table
+        valeurs = table[column].to_numpy(dtype='float64', na_value=np.nan)
+        presents = np.flatnonzero(~np.isnan(valeurs))
+        ordre = presents[np.argsort(-valeurs[presents], kind='stable')]
+
+        # Ordre et sommes prefixes du tableau ('Tous') et de chaque groupe
+        self.orders = {TOUS: (ordre, np.concatenate([[0.0], np.cumsum(valeurs[ordre])]))}
+        if by is not None:
+            codes, groupes = pd.factorize(table[by])
+            codes = codes[ordre]
+            for code, groupe in enumerate(groupes.tolist()):
+                sous_ordre = ordre[codes == code]
+                self.orders[groupe] = (sous_ordre, np.concatenate([[0.0], np.cumsum(valeurs[sous_ordre])]))
+
+    def _order(self, group):
+        return self.orders.get(group, (np.empty(0, dtype='int64'), np.zeros(1)))
+
+    def count(self, group=TOUS):
+        """Nombre de lignes classees (valeur presente) du tableau ou du groupe"""
+        return len(self._order(group)[0])
+
+    def rows(self, k=None, group=TOUS, mask=None):
+        """Positions des `k` premieres lignes (toutes si None) du groupe, restreintes au masque"""
+        ordre, _ = self._order(group)
+        k = len(ordre) if k is None else k
+        if mask is None:
+            return ordre[:k]
+
+        # Parcours par blocs croissants, arrete des que K lignes du masque sont trouvees
+        retenues, trouvees, debut, bloc = [], 0, 0, max(4 * k, 1024)
+        while debut < len(ordre) and trouvees < k:
+            morceau = ordre[debut:debut + bloc]
+            morceau = morceau[mask[morceau]]
+            retenues.append(morceau)
+            trouvees += len(morceau)
+            debut += bloc
+            bloc *= 2
+        return np.concatenate(retenues)[:k] if retenues else ordre[:0]
+
+    def head(self, k=None, group=TOUS, mask=None):
+        """Lignes du tableau correspondant a rows(), dans l'ordre decroissant"""
+        return self.table.take(self.rows(k, group, mask))
+
+    def rest(self, k, group=TOUS):
+        """Somme des valeurs classees apres les `k` premieres du groupe ('Autres')"""
+        _, prefixes = self._order(group)
+        return prefixes[-1] - prefixes[min(k, len(prefixes) - 1)]
+
+def fold(texte):
+    """Normalise un nom pour la recherche : minuscules, sans accents ni ponctuation"""
+    texte = unicodedata.normalize('NFKD', str(texte))
+    texte = ''.join(c for c in texte if not unicodedata.combining(c)).lower()
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', texte).split())
+
+def _trigrams(texte):
+    texte = f' {texte} '
+    return {texte[i:i + 3] for i in range(len(texte) - 2)}
+
+class StationSearchIndex:
+    """
+    Recherche de stations insensible aux accents, par paliers : prefixe du nom (exact en tete),
+    prefixe d'un mot, sous-chaine, puis correspondances approchees (similarite de trigrammes).
+    """
+
+    MIN_SIMILARITY = 0.4
+
+    def __init__(self, df):
+        self.row_codes, noms = pd.factorize(df['Station'])
+        self.names = np.asarray(noms, dtype=object)
+        self.folded = [fold(nom) for nom in self.names]
+
+        # Prefixes : noms normalises tries, et mots (hors premier) tries
+        ordre = sorted(range(len(self.folded)), key=self.folded.__getitem__)
+        self.sorted_names = [self.folded[i] for i in ordre]
+        self.sorted_name_ids = np.array(ordre, dtype='int64')
+        mots = sorted((mot, i) for i, nom in enumerate(self.folded) for mot in nom.split()[1:])
+        self.words = [mot for mot, _ in mots]
+        self.word_ids = np.array([i for _, i in mots], dtype='int64')
+
+        # Trigrammes : listes triees d'identifiants de noms
+        postings = {}
+        for i, nom in enumerate(self.folded):
+            for trigramme in _trigrams(nom):
+                postings.setdefault(trigramme, []).append(i)
+        self.trigrams = {t: np.array(ids, dtype='int64') for t, ids in postings.items()}
+        self.trigram_counts = np.array([len(_trigrams(nom)) for nom in self.folded], dtype='int64')
+
+    @staticmethod
+    def _prefix_range(cles, ids, requete):
+        debut = bisect.bisect_left(cles, requete)
+        fin = bisect.bisect_left(cles, requete + '\uffff')
+        return ids[debut:fin]
+
+    def _substring_candidates(self, requete):
+        """Noms contenant tous les trigrammes internes de la requete (a verifier)"""
+        listes = sorted((self.trigrams.get(t) for t in _trigrams(requete) if t.strip() == t),
+                        key=lambda ids: -1 if ids is None else len(ids))
+        if not listes or listes[0] is None:
+            return np.empty(0, dtype='int64')
+        candidats = listes[0]
+        for ids in listes[1:]:
+            candidats = np.intersect1d(candidats, ids, assume_unique=True)
+        return candidats
+
+    def _substring_ids(self, requete):
+        # Requete sans trigramme interne : parcours de tous les noms
+        candidats = range(len(self.folded)) if len(requete) < 3 else self._substring_candidates(requete).tolist()
+        return np.array([i for i in candidats if requete in self.folded[i]], dtype='int64')
+
+    def _fuzzy(self, requete):
+        trigrammes = [self.trigrams[t] for t in _trigrams(requete) if t in self.trigrams]
+        if not trigrammes:
+            return np.empty(0, dtype='int64'), np.empty(0)
+        communs = np.bincount(np.concatenate(trigrammes), minlength=len(self.names))
+        ids = np.flatnonzero(communs)
+        similarite = 2 * communs[ids] / (len(_trigrams(requete)) + self.trigram_counts[ids])
+        garder = similarite >= self.MIN_SIMILARITY
+        ordre = np.argsort(-similarite[garder], kind='stable')
+        return ids[garder][ordre], similarite[garder][ordre]
+
+    def search(self, requete, limit=20, keep=None):
+        """
+        Noms de stations classes par pertinence (ordre alphabetique dans chaque palier).
+        keep(nom) restreint les resultats (ex. stations d'un reseau) avant la limite.
+        """
+        requete = fold(requete)
+        if not requete:
+            return []
+
+        resultats, vus = [], set()
+
+        def ajouter(ids):
+            for i in ids:
+                if len(resultats) >= limit:
+                    return
+                if i not in vus:
+                    vus.add(i)
+                    if keep is None or keep(self.names[i]):
+                        resultats.append(i)
+
+        ajouter(self._prefix_range(self.sorted_names, self.sorted_name_ids, requete).tolist())
+        ajouter(self._prefix_range(self.words, self.word_ids, requete).tolist())
+        if len(resultats) < limit:
+            ajouter(self._substring_ids(requete).tolist())
+        if len(resultats) < limit:
+            ajouter(self._fuzzy(requete)[0].tolist())
+
+        return [self.names[i] for i in resultats]
+
+    def match_ids(self, requete):
+        """Identifiants des noms contenant la requete ; a defaut, correspondances approchees (approx=True)"""
+        requete = fold(requete)
+        if not requete:
+            return np.arange(len(self.names)), False
+        ids = self._substring_ids(requete)
+        if len(ids):
+            return ids, False
+        return self._fuzzy(requete)[0], True
+
+    def row_mask(self, ids):
+        """Masque des lignes du tableau dont la station fait partie de `ids`"""
+        lut = np.zeros(len(self.names) + 1, dtype=bool)
+        lut[ids] = True
+        return lut[self.row_codes]
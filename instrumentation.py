@@ -0,0 +1,160 @@
+"""
+Instrumentation des chemins critiques : durees par rerun (spans) et succes/echecs des caches
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager, nullcontext
+
+# Desactive par defaut (decorateurs sans effet) : RATP_DEBUG=1 active les mesures et le panneau de la sidebar
+INSTRUMENTATION_ENABLED = os.environ.get('RATP_DEBUG') == '1'
+# Export JSON Lines optionnel : un enregistrement par rerun
+METRICS_FILE = os.environ.get('RATP_METRICS_FILE')
+HISTORY_SIZE = 100
+
+PHASES = ('chargement', 'agregation', 'filtrage', 'graphiques')
+
+logger = logging.getLogger('ratp.metrics')
+_local = threading.local()
+_history = deque(maxlen=HISTORY_SIZE)
+_history_lock = threading.Lock()
+_NULL = nullcontext()
+
+class RerunRecorder:
+    """Spans et compteurs de cache d'un rerun (un par thread de script)"""
+
+    def __init__(self, page):
+        self.page = page
+        self.debut = time.time()
+        self._start = time.perf_counter()
+        self.spans = defaultdict(lambda: [0, 0.0, 0.0])  # nom -> [appels, total, max]
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self._stack = []
+
+    @contextmanager
+    def span(self, name, phase):
+        # Seuls les spans les plus externes d'une phase comptent dans son total
+        externe = phase not in self._stack
+        self._stack.append(phase)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duree = time.perf_counter() - start
+            self._stack.pop()
+            stats = self.spans[name]
+            stats[0] += 1
+            stats[1] += duree
+            stats[2] = max(stats[2], duree)
+            if externe:
+                self.phases[phase] = self.phases.get(phase, 0.0) + duree
+
+    def record(self):
+        """Enregistrement structure (JSON) du rerun"""
+        return {
+            'page': self.page,
+            'debut': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.debut)),
+            'duree_ms': round((time.perf_counter() - self._start) * 1000, 2),
+            'phases_ms': {phase: round(d * 1000, 2) for phase, d in self.phases.items()},
+            'spans': [{'nom': nom, 'appels': n, 'total_ms': round(total * 1000, 2), 'max_ms': round(maxi * 1000, 2)}
+                      for nom, (n, total, maxi) in sorted(self.spans.items(), key=lambda s: -s[1][1])],
+            'caches': {nom: {'succes': self.hits[nom], 'echecs': self.misses[nom]}
+                       for nom in sorted(set(self.hits) | set(self.misses))},
+        }
+
+def _recorder():
+    return getattr(_local, 'recorder', None)
+
+def start_rerun(page):
+    """Debut d'un rerun de `page` (appele en tete de page)"""
+    if INSTRUMENTATION_ENABLED:
+        _local.recorder = RerunRecorder(page)
+
+def span(name, phase):
+    """Contexte chronometre `name` rattache a une phase (chargement, agregation, filtrage, graphiques)"""
+    recorder = _recorder() if INSTRUMENTATION_ENABLED else None
+    return _NULL if recorder is None else recorder.span(name, phase)
+
+def timed(name, phase):
+    """Decorateur chronometre ; retourne la fonction telle quelle si l'instrumentation est desactivee"""
+    def decorator(func):
+        if not INSTRUMENTATION_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, phase):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def cache_hit(name):
+    recorder = _recorder() if INSTRUMENTATION_ENABLED else None
+    if recorder is not None:
+        recorder.hits[name] += 1
+
+def cache_miss(name):
+    recorder = _recorder() if INSTRUMENTATION_ENABLED else None
+    if recorder is not None:
+        recorder.misses[name] += 1
+
+@contextmanager
+def _probe(recorder, name):
+    echecs = recorder.misses[name]
+    yield
+    if recorder.misses[name] == echecs:
+        recorder.hits[name] += 1
+
+def cache_probe(name):
+    """Appel d'une fonction en cache : succes sauf si cache_miss(name) est appele pendant le bloc (calcul)"""
+    recorder = _recorder() if INSTRUMENTATION_ENABLED else None
+    return _NULL if recorder is None else _probe(recorder, name)
+
+def finish_rerun():
+    """Termine le rerun courant : historique, log structure et fichier de metriques ; None si desactive"""
+    recorder = _recorder() if INSTRUMENTATION_ENABLED else None
+    if recorder is None:
+        return None
+    _local.recorder = None
+    record = recorder.record()
+    with _history_lock:
+        _history.append(record)
+    ligne = json.dumps(record, ensure_ascii=False)
+    logger.info(ligne)
+    if METRICS_FILE:
+        try:
+            with _history_lock, open(METRICS_FILE, 'a', encoding='utf-8') as f:
+                f.write(ligne + '\n')
+        except OSError:
+            pass
+    return record
+
+def history():
+    """Derniers enregistrements de reruns (tous sessions confondues)"""
+    with _history_lock:
+        return list(_history)
+
+def debug_panel():
+    """Termine le rerun et affiche ses mesures dans la sidebar (appele en fin de page)"""
+    record = finish_rerun()
+    if record is None:
+        return
+    import pandas as pd
+    import streamlit as st
+
+    with st.sidebar.expander(f"Instrumentation : {record['duree_ms']:,.0f} ms", expanded=False):
+        st.caption("Phases (ms)")
+        st.dataframe(pd.Series(record['phases_ms'], name='ms'), width='stretch')
+        st.caption("Spans")
+        st.dataframe(pd.DataFrame(record['spans']), width='stretch', hide_index=True)
+        if record['caches']:
+            st.caption("Caches")
+            st.dataframe(pd.DataFrame(record['caches']).T, width='stretch')
+        st.download_button("Exporter (JSON Lines)", '\n'.join(json.dumps(r, ensure_ascii=False) for r in history()),
+                           file_name='metriques.jsonl', mime='application/json')
@@ -1,12 +1,15 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
 import sys
 import os
 
 # Ajouter le répertoire parent au path pour importer utils
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import load_data, display_logo, COLORS_RATP, configure_matplotlib
+from utils import load_data, select_years, dataset_resource, display_logo, COLORS_RATP, dataset_version
+from indexes import StationRanking, StationSearchIndex
+from charts import show_chart, show_vega_chart, chart_backend
+from vega_charts import comparison_chart
+from instrumentation import start_rerun, debug_panel
 
 # Configuration
 st.set_page_config(
@@ -15,14 +18,19 @@ st.set_page_config(
     layout="wide"
 )
 
-# Configuration matplotlib
-configure_matplotlib()
+# Mesures du rerun (actives avec RATP_DEBUG=1)
+start_rerun('Analyse par station')
 
 # Logo
 display_logo()
 
 # Chargement des données
-df = load_data()
+df = load_data(select_years(multiple=False))
+ranking = dataset_resource('ranking', df, StationRanking)
+search_index = dataset_resource('recherche', df, StationSearchIndex)
+
+# Moteur des graphiques : images matplotlib ou Vega-Lite interactif
+graphiques = chart_backend()
 
 # Titre
 st.title("Analyse par station")
@@ -34,21 +42,26 @@ with col1:
     st.subheader("Filtres")
     
     # Filtre réseau
-    reseaux = ['Tous'] + sorted(df['Réseau'].unique().tolist())
-    reseau_choisi = st.selectbox("Réseau", reseaux)
-    
-    # Filtrer les stations selon le réseau
-    if reseau_choisi == 'Tous':
-        df_filtre = df.copy()
-    else:
-        df_filtre = df[df['Réseau'] == reseau_choisi].copy()
+    reseau_choisi = st.selectbox("Réseau", ranking.reseaux)
+    
+    # Recherche rapide (insensible aux accents, tolérante aux fautes de frappe)
+    recherche = st.text_input("Rechercher une station")
+    stations = ranking.stations(reseau_choisi)
+    if recherche:
+        # Filtre réseau appliqué dans la recherche, avant la limite de résultats
+        resultats = search_index.search(recherche, limit=50,
+                                        keep=lambda nom: ranking.has_station(reseau_choisi, nom))
+        if resultats:
+            stations = resultats
+        else:
+            st.caption("Aucune station ne correspond à la recherche.")
     
-    # Sélection de la station
-    stations = sorted(df_filtre['Station'].unique().tolist())
+    # Sélection de la station (liste triée pré-calculée par réseau)
     station_choisie = st.selectbox("Station", stations, key='station_select')
     
-    # Récupérer les infos de la station
-    station_data = df_filtre[df_filtre['Station'] == station_choisie].iloc[0]
+    # Récupérer les infos de la station et son classement
+    position = ranking.resolve(reseau_choisi, station_choisie)
+    station_data = df.iloc[position['row']]
 
 with col2:
     st.subheader("Fiche station")
@@ -76,35 +89,31 @@ with col2:
     
     with info_col5:
         arr = station_data['Arrondissement pour Paris']
-        if arr and str(arr).strip():
+        if pd.notna(arr):
             st.markdown(f"**Arrondissement :** {arr}")
         else:
             st.markdown(f"**Arrondissement :** -")
 
 st.markdown("---")
 
-# Calcul des statistiques du réseau
+# Statistiques et classement du réseau (index pré-calculé)
 if reseau_choisi == 'Tous':
     reseau_label = "tous réseaux"
-    df_stats = df.copy()
 else:
     reseau_label = f"réseau {reseau_choisi}"
-    df_stats = df[df['Réseau'] == reseau_choisi].copy()
-
-trafic_moyen = df_stats['Trafic'].mean()
-trafic_median = df_stats['Trafic'].median()
 
-# Classement dans le réseau
-df_stats_sorted = df_stats.sort_values('Trafic', ascending=False).reset_index(drop=True)
-rang_reseau = df_stats_sorted[df_stats_sorted['Station'] == station_choisie].index[0] + 1
-total_stations_reseau = len(df_stats)
+trafic_moyen = position['moyenne']
+trafic_median = position['mediane']
+rang_reseau = position['rang']
+total_stations_reseau = position['total']
 
 st.subheader(f"Comparaison avec le {reseau_label}")
 
 comp_col1, comp_col2 = st.columns([1, 1])
 
 with comp_col1:
-    st.info(f"**Classement dans le {reseau_label} :** #{rang_reseau} sur {total_stations_reseau}")
+    st.info(f"**Classement dans le {reseau_label} :** #{rang_reseau} sur {total_stations_reseau} "
+            f"(percentile {position['percentile']:.0f})")
     
     # Comparaison avec moyenne et médiane
     delta_moyen = ((station_data['Trafic'] - trafic_moyen) / trafic_moyen) * 100
@@ -115,26 +124,40 @@ with comp_col1:
 
 with comp_col2:
     # Graphique de comparaison
-    fig, ax = plt.subplots(figsize=(10, 6))
-    
-    categories = ['Station\nsélectionnée', 'Moyenne\nréseau', 'Médiane\nréseau']
-    values = [station_data['Trafic'], trafic_moyen, trafic_median]
-    colors = [COLORS_RATP['bleu'], COLORS_RATP['vert'], COLORS_RATP['jaune']]
-    
-    bars = ax.bar(categories, values, color=colors, alpha=0.85, edgecolor=COLORS_RATP['noir'], linewidth=1.5)
-    
-    # Ajouter les valeurs sur les barres
-    for i, (bar, value) in enumerate(zip(bars, values)):
-        height = bar.get_height()
-        ax.text(bar.get_x() + bar.get_width()/2., height,
-               f'{value:,.0f}',
-               ha='center', va='bottom', fontsize=11, fontweight='bold', color=COLORS_RATP['noir'])
-    
-    ax.set_ylabel('Trafic annuel', fontsize=12, fontweight='bold')
-    ax.set_title(f'Comparaison du trafic - {station_choisie}', fontsize=14, fontweight='bold', pad=20, color=COLORS_RATP['bleu'])
-    ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{int(x):,}'))
-    ax.grid(axis='y', alpha=0.3, linestyle='--', color=COLORS_RATP['noir'])
-    
-    plt.tight_layout()
-    st.pyplot(fig)
-    plt.close()
+    def draw():
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots(figsize=(10, 6))
+    
+        categories = ['Station\nsélectionnée', 'Moyenne\nréseau', 'Médiane\nréseau']
+        values = [station_data['Trafic'], trafic_moyen, trafic_median]
+        colors = [COLORS_RATP['bleu'], COLORS_RATP['vert'], COLORS_RATP['jaune']]
+    
+        bars = ax.bar(categories, values, color=colors, alpha=0.85, edgecolor=COLORS_RATP['noir'], linewidth=1.5)
+    
+        # Ajouter les valeurs sur les barres
+        for i, (bar, value) in enumerate(zip(bars, values)):
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width()/2., height,
+                   f'{value:,.0f}',
+                   ha='center', va='bottom', fontsize=11, fontweight='bold', color=COLORS_RATP['noir'])
+    
+        ax.set_ylabel('Trafic annuel', fontsize=12, fontweight='bold')
+        ax.set_title(f'Comparaison du trafic - {station_choisie}', fontsize=14, fontweight='bold', pad=20, color=COLORS_RATP['bleu'])
+        ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{int(x):,}'))
+        ax.grid(axis='y', alpha=0.3, linestyle='--', color=COLORS_RATP['noir'])
+    
+        plt.tight_layout()
+        return fig
+    
+    if graphiques == 'vega':
+        show_vega_chart('comparaison_station', {'reseau': reseau_choisi, 'station': station_choisie}, lambda: comparison_chart(
+            ['Station sélectionnée', 'Moyenne réseau', 'Médiane réseau'],
+            [station_data['Trafic'], trafic_moyen, trafic_median],
+            [COLORS_RATP['bleu'], COLORS_RATP['vert'], COLORS_RATP['jaune']],
+            f'Comparaison du trafic - {station_choisie}'
+        ), dataset_version(df))
+    else:
+        show_chart('comparaison_station', {'reseau': reseau_choisi, 'station': station_choisie}, draw, dataset_version(df))
+
+# Panneau de mesures (RATP_DEBUG=1)
+debug_panel()
@@ -1,13 +1,15 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
 import sys
 import os
 
 # Ajouter le répertoire parent au path pour importer utils
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import load_data, prepare_ligne_data, display_logo, COLORS_RATP, configure_matplotlib
+from utils import load_data, select_years, prepare_ligne_data, dataset_resource, display_logo, COLORS_RATP, dataset_version
+from indexes import TopK
+from charts import show_chart, show_vega_chart, chart_backend
+from vega_charts import COULEURS_RESEAUX, lines_bar_chart, lines_pie_chart
+from instrumentation import start_rerun, debug_panel
 
 # Configuration
 st.set_page_config(
@@ -16,16 +18,24 @@ st.set_page_config(
     layout="wide"
 )
 
-# Configuration matplotlib
-configure_matplotlib()
+# Mesures du rerun (actives avec RATP_DEBUG=1)
+start_rerun('Analyse par ligne')
 
 # Logo
 display_logo()
 
 # Chargement des données
-df = load_data()
+df = load_data(select_years())
 stats_lignes, df_lignes = prepare_ligne_data(df)
 
+# Classements des lignes (trafic total, trafic moyen/station) calculés une fois, pour tous les réseaux et par réseau
+top_lignes = dataset_resource('top_lignes', df, lambda _: TopK(stats_lignes, 'Trafic_total', by='Réseau'))
+top_lignes_moyen = dataset_resource('top_lignes_moyen', df,
+                                    lambda _: TopK(stats_lignes, 'Trafic_moyen_station', by='Réseau'))
+
+# Moteur des graphiques : images matplotlib ou Vega-Lite interactif (réseau modifiable dans le graphique)
+graphiques = chart_backend()
+
 # Titre
 st.title("Analyse par ligne")
 st.markdown("Comparez les performances des différentes lignes du réseau ferré RATP.")
@@ -34,15 +44,15 @@ st.markdown("Comparez les performances des différentes lignes du réseau ferré
 col_f1, col_f2 = st.columns([1, 3])
 
 with col_f1:
-    reseau_filter = st.selectbox("Filtrer par réseau", ['Tous', 'Métro', 'RER'])
-
-if reseau_filter != 'Tous':
-    stats_lignes_filtered = stats_lignes[stats_lignes['Réseau'] == reseau_filter].copy()
-else:
-    stats_lignes_filtered = stats_lignes.copy()
+    if graphiques == 'vega':
+        # Réseau choisi sous chaque graphique (paramètre Vega-Lite) : aucun rerun ni nouveau graphique au changement
+        reseau_filter = 'Tous'
+        st.caption("Réseau sélectionnable sous chaque graphique")
+    else:
+        reseau_filter = st.selectbox("Filtrer par réseau", ['Tous', 'Métro', 'RER'])
 
-# Trier par trafic total
-stats_lignes_filtered = stats_lignes_filtered.sort_values('Trafic_total', ascending=False)
+# Lignes du réseau triées par trafic total (ordre pré-calculé)
+stats_lignes_filtered = top_lignes.head(group=reseau_filter)
 
 # Tableau récapitulatif
 st.subheader("Tableau récapitulatif par ligne")
@@ -55,7 +65,7 @@ df_display['Part_trafic_pct'] = df_display['Part_trafic_pct'].apply(lambda x: f"
 
 df_display.columns = ['Ligne', 'Trafic total', 'Nb stations', 'Réseau', 'Trafic moyen/station', 'Part du trafic (%)']
 
-st.dataframe(df_display, use_container_width=True, hide_index=True)
+st.dataframe(df_display, width='stretch', hide_index=True)
 
 st.markdown("---")
 
@@ -65,60 +75,79 @@ graph_col1, graph_col2 = st.columns(2)
 with graph_col1:
     st.subheader("Trafic total par ligne")
 
-    fig, ax = plt.subplots(figsize=(12, 6))
-    
-    data_plot = stats_lignes_filtered.head(15).copy()
-    
-    # Créer le graphique avec couleurs par réseau (couleurs RATP)
-    colors = data_plot['Réseau'].map({'Métro': COLORS_RATP['bleu'], 'RER': COLORS_RATP['vert']})
-    bars = ax.bar(data_plot['Ligne'], data_plot['Trafic_total'], color=colors, alpha=0.85, 
-                 edgecolor=COLORS_RATP['noir'], linewidth=1.2)
-    
-    ax.set_xlabel('Ligne', fontsize=12, fontweight='bold')
-    ax.set_ylabel('Trafic total', fontsize=12, fontweight='bold')
-    ax.set_title(f'Top 15 des lignes - Trafic total ({reseau_filter})', fontsize=14, fontweight='bold', 
-                pad=20, color=COLORS_RATP['bleu'])
-    ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{int(x/1e6):.1f}M' if x >= 1e6 else f'{int(x/1e3):.0f}K'))
-    ax.grid(axis='y', alpha=0.3, linestyle='--', color=COLORS_RATP['noir'])
-    plt.xticks(rotation=45, ha='right')
-    
-    # Légende avec couleurs RATP
-    metro_patch = mpatches.Patch(color=COLORS_RATP['bleu'], label='Métro', alpha=0.85)
-    rer_patch = mpatches.Patch(color=COLORS_RATP['vert'], label='RER', alpha=0.85)
-    ax.legend(handles=[metro_patch, rer_patch], loc='upper right')
-    
-    plt.tight_layout()
-    st.pyplot(fig)
-    plt.close()
+    def draw():
+        import matplotlib.pyplot as plt
+        import matplotlib.patches as mpatches
+        fig, ax = plt.subplots(figsize=(12, 6))
+    
+        data_plot = top_lignes.head(15, reseau_filter)
+    
+        # Créer le graphique avec couleurs par réseau (couleurs RATP)
+        colors = data_plot['Réseau'].map({'Métro': COLORS_RATP['bleu'], 'RER': COLORS_RATP['vert']})
+        bars = ax.bar(data_plot['Ligne'], data_plot['Trafic_total'], color=colors, alpha=0.85, 
+                     edgecolor=COLORS_RATP['noir'], linewidth=1.2)
+    
+        ax.set_xlabel('Ligne', fontsize=12, fontweight='bold')
+        ax.set_ylabel('Trafic total', fontsize=12, fontweight='bold')
+        ax.set_title(f'Top 15 des lignes - Trafic total ({reseau_filter})', fontsize=14, fontweight='bold', 
+                    pad=20, color=COLORS_RATP['bleu'])
+        ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{int(x/1e6):.1f}M' if x >= 1e6 else f'{int(x/1e3):.0f}K'))
+        ax.grid(axis='y', alpha=0.3, linestyle='--', color=COLORS_RATP['noir'])
+        plt.xticks(rotation=45, ha='right')
+    
+        # Légende avec couleurs RATP
+        metro_patch = mpatches.Patch(color=COLORS_RATP['bleu'], label='Métro', alpha=0.85)
+        rer_patch = mpatches.Patch(color=COLORS_RATP['vert'], label='RER', alpha=0.85)
+        ax.legend(handles=[metro_patch, rer_patch], loc='upper right')
+    
+        plt.tight_layout()
+        return fig
+    
+    if graphiques == 'vega':
+        show_vega_chart('lignes_trafic_total', {}, lambda: lines_bar_chart(
+            stats_lignes, 'Trafic_total', 'Trafic total', COULEURS_RESEAUX
+        ), dataset_version(df))
+    else:
+        show_chart('lignes_trafic_total', {'reseau': reseau_filter}, draw, dataset_version(df))
 
 with graph_col2:
     st.subheader("Trafic moyen par station")
     
-    fig, ax = plt.subplots(figsize=(12, 6))
-    
-    data_plot = stats_lignes_filtered.head(15).copy()
-    
-    # Créer le graphique avec couleurs par réseau (couleurs RATP)
-    colors = data_plot['Réseau'].map({'Métro': COLORS_RATP['jaune'], 'RER': COLORS_RATP['rouge']})
-    bars = ax.bar(data_plot['Ligne'], data_plot['Trafic_moyen_station'], color=colors, alpha=0.85, 
-                 edgecolor=COLORS_RATP['noir'], linewidth=1.2)
-    
-    ax.set_xlabel('Ligne', fontsize=12, fontweight='bold')
-    ax.set_ylabel('Trafic moyen/station', fontsize=12, fontweight='bold')
-    ax.set_title(f'Top 15 des lignes - Trafic moyen/station ({reseau_filter})', fontsize=14, fontweight='bold', 
-                pad=20, color=COLORS_RATP['bleu'])
-    ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{int(x/1e6):.1f}M' if x >= 1e6 else f'{int(x/1e3):.0f}K'))
-    ax.grid(axis='y', alpha=0.3, linestyle='--', color=COLORS_RATP['noir'])
-    plt.xticks(rotation=45, ha='right')
-    
-    # Légende avec couleurs RATP
-    metro_patch = mpatches.Patch(color=COLORS_RATP['jaune'], label='Métro', alpha=0.85)
-    rer_patch = mpatches.Patch(color=COLORS_RATP['rouge'], label='RER', alpha=0.85)
-    ax.legend(handles=[metro_patch, rer_patch], loc='upper right')
-    
-    plt.tight_layout()
-    st.pyplot(fig)
-    plt.close()
+    def draw():
+        import matplotlib.pyplot as plt
+        import matplotlib.patches as mpatches
+        fig, ax = plt.subplots(figsize=(12, 6))
+    
+        data_plot = top_lignes.head(15, reseau_filter)
+    
+        # Créer le graphique avec couleurs par réseau (couleurs RATP)
+        colors = data_plot['Réseau'].map({'Métro': COLORS_RATP['jaune'], 'RER': COLORS_RATP['rouge']})
+        bars = ax.bar(data_plot['Ligne'], data_plot['Trafic_moyen_station'], color=colors, alpha=0.85, 
+                     edgecolor=COLORS_RATP['noir'], linewidth=1.2)
+    
+        ax.set_xlabel('Ligne', fontsize=12, fontweight='bold')
+        ax.set_ylabel('Trafic moyen/station', fontsize=12, fontweight='bold')
+        ax.set_title(f'Top 15 des lignes - Trafic moyen/station ({reseau_filter})', fontsize=14, fontweight='bold', 
+                    pad=20, color=COLORS_RATP['bleu'])
+        ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{int(x/1e6):.1f}M' if x >= 1e6 else f'{int(x/1e3):.0f}K'))
+        ax.grid(axis='y', alpha=0.3, linestyle='--', color=COLORS_RATP['noir'])
+        plt.xticks(rotation=45, ha='right')
+    
+        # Légende avec couleurs RATP
+        metro_patch = mpatches.Patch(color=COLORS_RATP['jaune'], label='Métro', alpha=0.85)
+        rer_patch = mpatches.Patch(color=COLORS_RATP['rouge'], label='RER', alpha=0.85)
+        ax.legend(handles=[metro_patch, rer_patch], loc='upper right')
+    
+        plt.tight_layout()
+        return fig
+    
+    if graphiques == 'vega':
+        show_vega_chart('lignes_trafic_moyen', {}, lambda: lines_bar_chart(
+            stats_lignes, 'Trafic_moyen_station', 'Trafic moyen/station',
+            {'Métro': COLORS_RATP['jaune'], 'RER': COLORS_RATP['rouge']}
+        ), dataset_version(df))
+    else:
+        show_chart('lignes_trafic_moyen', {'reseau': reseau_filter}, draw, dataset_version(df))
 
 st.markdown("---")
 
@@ -128,12 +157,12 @@ st.subheader("Répartition du trafic par ligne")
 pie_col1, pie_col2 = st.columns([2, 1])
 
 with pie_col1:
-    # Prendre top 10 + "Autres"
+    # Prendre top 10 + "Autres" (somme du reste lue dans les sommes préfixes)
     top_n = 10
-    stats_top = stats_lignes_filtered.head(top_n).copy()
+    stats_top = top_lignes.head(top_n, reseau_filter)
     
-    if len(stats_lignes_filtered) > top_n:
-        autres_trafic = stats_lignes_filtered.iloc[top_n:]['Trafic_total'].sum()
+    if top_lignes.count(reseau_filter) > top_n:
+        autres_trafic = top_lignes.rest(top_n, reseau_filter)
         autres_row = pd.DataFrame([{
             'Ligne': 'Autres',
             'Trafic_total': autres_trafic,
@@ -143,38 +172,51 @@ with pie_col1:
     else:
         stats_for_pie = stats_top
     
-    fig, ax = plt.subplots(figsize=(10, 8))
+    def draw():
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots(figsize=(10, 8))
+    
+        # Couleurs personnalisées RATP
+        color_map = {'Métro': COLORS_RATP['bleu'], 'RER': COLORS_RATP['vert'], 'Mixte': '#95A5A6'}
+        colors = [color_map.get(r, '#95A5A6') for r in stats_for_pie['Réseau']]
     
-    # Couleurs personnalisées RATP
-    color_map = {'Métro': COLORS_RATP['bleu'], 'RER': COLORS_RATP['vert'], 'Mixte': '#95A5A6'}
-    colors = [color_map.get(r, '#95A5A6') for r in stats_for_pie['Réseau']]
+        wedges, texts, autotexts = ax.pie(
+            stats_for_pie['Trafic_total'], 
+            labels=stats_for_pie['Ligne'],
+            autopct='%1.1f%%',
+            startangle=90,
+            colors=colors,
+            textprops={'fontsize': 10, 'weight': 'bold', 'color': COLORS_RATP['noir']},
+            wedgeprops={'edgecolor': 'white', 'linewidth': 2}
+        )
     
-    wedges, texts, autotexts = ax.pie(
-        stats_for_pie['Trafic_total'], 
-        labels=stats_for_pie['Ligne'],
-        autopct='%1.1f%%',
-        startangle=90,
-        colors=colors,
-        textprops={'fontsize': 10, 'weight': 'bold', 'color': COLORS_RATP['noir']},
-        wedgeprops={'edgecolor': 'white', 'linewidth': 2}
-    )
+        ax.set_title(f'Part du trafic total par ligne (Top {top_n})', fontsize=14, fontweight='bold', 
+                    pad=20, color=COLORS_RATP['bleu'])
     
-    ax.set_title(f'Part du trafic total par ligne (Top {top_n})', fontsize=14, fontweight='bold', 
-                pad=20, color=COLORS_RATP['bleu'])
+        plt.tight_layout()
+        return fig
     
-    plt.tight_layout()
-    st.pyplot(fig)
-    plt.close()
+    if graphiques == 'vega':
+        show_vega_chart('lignes_camembert', {'top_n': top_n},
+                        lambda: lines_pie_chart(stats_lignes, top=top_n), dataset_version(df))
+    elif len(stats_for_pie) > 0:
+        show_chart('lignes_camembert', {'reseau': reseau_filter, 'top_n': top_n}, draw, dataset_version(df))
 
 with pie_col2:
     st.markdown("### Insights")
     
-    ligne_max = stats_lignes_filtered.iloc[0]
-    st.success(f"**Ligne la plus fréquentée :** {ligne_max['Ligne']}\n\n"
-              f"Trafic : {ligne_max['Trafic_total']:,.0f}")
-    
-    ligne_avg = stats_lignes_filtered.iloc[0]
-    st.info(f"**Meilleur trafic moyen/station :** {stats_lignes_filtered.sort_values('Trafic_moyen_station', ascending=False).iloc[0]['Ligne']}")
+    # Aucune ligne renseignée pour ce réseau : pas de classement à afficher
+    if len(stats_lignes_filtered) == 0:
+        st.warning(f"Aucune ligne renseignée pour le réseau {reseau_filter}.")
+    else:
+        ligne_max = stats_lignes_filtered.iloc[0]
+        st.success(f"**Ligne la plus fréquentée :** {ligne_max['Ligne']}\n\n"
+                  f"Trafic : {ligne_max['Trafic_total']:,.0f}")
+        
+        st.info(f"**Meilleur trafic moyen/station :** {top_lignes_moyen.head(1, reseau_filter).iloc[0]['Ligne']}")
     
     total_lignes = len(stats_lignes_filtered)
     st.metric("Nombre de lignes", total_lignes)
+
+# Panneau de mesures (RATP_DEBUG=1)
+debug_panel()
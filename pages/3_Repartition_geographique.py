@@ -1,13 +1,15 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import sys
 import os
 
 # Ajouter le répertoire parent au path pour importer utils
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import load_data, display_logo, COLORS_RATP, configure_matplotlib
+from utils import load_data, select_years, dataset_resource, display_logo, COLORS_RATP, dataset_version
+from charts import show_chart, show_vega_chart, chart_backend
+from vega_charts import arrondissements_chart, cities_chart, reseaux_pie_chart, zones_pie_chart
+from instrumentation import start_rerun, debug_panel
+from cube import load_cubes
+from indexes import TopK
 
 # Configuration
 st.set_page_config(
@@ -16,14 +18,18 @@ st.set_page_config(
     layout="wide"
 )
 
-# Configuration matplotlib
-configure_matplotlib()
+# Mesures du rerun (actives avec RATP_DEBUG=1)
+start_rerun('Répartition géographique')
 
 # Logo
 display_logo()
 
 # Chargement des données
-df = load_data()
+df = load_data(select_years())
+cube_stations, _ = load_cubes(df)
+
+# Moteur des graphiques : images matplotlib ou Vega-Lite interactif
+graphiques = chart_backend()
 
 # Titre
 st.title("Répartition géographique")
@@ -41,43 +47,50 @@ st.markdown("---")
 if mode == "Par arrondissement (Paris)":
     st.subheader("Trafic par arrondissement parisien")
 
-    # Filtrer Paris uniquement
-    df_paris = df[df['Ville'] == 'Paris'].copy()
-    df_paris = df_paris[df_paris['Arrondissement pour Paris'] != ''].copy()
-    
-    # Agréger par arrondissement et trier par numéro
-    arr_stats = df_paris.groupby('Arrondissement pour Paris')['Trafic'].sum().reset_index()
-    arr_stats.columns = ['Arrondissement', 'Trafic_total']
-    arr_stats = arr_stats.sort_values('Arrondissement')
+    def build_arrondissements(df):
+        # Agréger par arrondissement (Paris uniquement), trié par numéro, et classer par trafic
+        arr_stats = load_cubes(df)[0].rollup(['Arrondissement pour Paris'], {'Ville': 'Paris'})
+        arr_stats = arr_stats.rename(columns={'Arrondissement pour Paris': 'Arrondissement'})[['Arrondissement', 'Trafic_total']]
+        return TopK(arr_stats, 'Trafic_total')
+
+    # Agrégat et classement calculés une fois par version des données
+    top_arrondissements = dataset_resource('top_arrondissements', df, build_arrondissements)
+    arr_stats = top_arrondissements.table
     
     col1, col2 = st.columns([2, 1])
     
     with col1:
-        fig, ax = plt.subplots(figsize=(12, 6))
-        
-        # Palette de bleus pour les arrondissements (couleurs RATP)
-        n_arr = len(arr_stats)
-        colors_arr = sns.light_palette(COLORS_RATP['bleu'], n_colors=n_arr, reverse=True)
-        
-        bars = ax.bar(arr_stats['Arrondissement'], arr_stats['Trafic_total'], 
-                     color=colors_arr, alpha=0.85, edgecolor=COLORS_RATP['noir'], linewidth=1.2)
-        
-        ax.set_xlabel('Arrondissement', fontsize=12, fontweight='bold')
-        ax.set_ylabel('Trafic total', fontsize=12, fontweight='bold')
-        ax.set_title('Trafic total par arrondissement de Paris', fontsize=14, fontweight='bold', 
-                    pad=20, color=COLORS_RATP['bleu'])
-        ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{int(x/1e6):.1f}M' if x >= 1e6 else f'{int(x/1e3):.0f}K'))
-        ax.grid(axis='y', alpha=0.3, linestyle='--', color=COLORS_RATP['noir'])
-        plt.xticks(rotation=45, ha='right')
-        
-        plt.tight_layout()
-        st.pyplot(fig)
-        plt.close()
+        def draw():
+            import matplotlib.pyplot as plt
+            fig, ax = plt.subplots(figsize=(12, 6))
+        
+            # Palette de bleus pour les arrondissements (couleurs RATP), seaborn chargé seulement au tracé
+            import seaborn as sns
+            n_arr = len(arr_stats)
+            colors_arr = sns.light_palette(COLORS_RATP['bleu'], n_colors=n_arr, reverse=True)
+        
+            bars = ax.bar(arr_stats['Arrondissement'], arr_stats['Trafic_total'], 
+                         color=colors_arr, alpha=0.85, edgecolor=COLORS_RATP['noir'], linewidth=1.2)
+        
+            ax.set_xlabel('Arrondissement', fontsize=12, fontweight='bold')
+            ax.set_ylabel('Trafic total', fontsize=12, fontweight='bold')
+            ax.set_title('Trafic total par arrondissement de Paris', fontsize=14, fontweight='bold', 
+                        pad=20, color=COLORS_RATP['bleu'])
+            ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{int(x/1e6):.1f}M' if x >= 1e6 else f'{int(x/1e3):.0f}K'))
+            ax.grid(axis='y', alpha=0.3, linestyle='--', color=COLORS_RATP['noir'])
+            plt.xticks(rotation=45, ha='right')
+        
+            plt.tight_layout()
+            return fig
+        
+        if graphiques == 'vega':
+            show_vega_chart('geo_arrondissements', {}, lambda: arrondissements_chart(arr_stats), dataset_version(df))
+        else:
+            show_chart('geo_arrondissements', {}, draw, dataset_version(df))
     
     with col2:
         st.markdown("### Top 5 arrondissements")
-        arr_stats_sorted = arr_stats.sort_values('Trafic_total', ascending=False)
-        for idx, row in arr_stats_sorted.head(5).iterrows():
+        for idx, row in top_arrondissements.head(5).iterrows():
             st.markdown(f"**{row['Arrondissement']}** : {row['Trafic_total']:,.0f}")
         
         st.markdown("---")
@@ -87,45 +100,55 @@ if mode == "Par arrondissement (Paris)":
 elif mode == "Par ville":
     st.subheader("Trafic par ville")
     
-    ville_stats = df.groupby('Ville')['Trafic'].sum().reset_index()
-    ville_stats.columns = ['Ville', 'Trafic_total']
-    ville_stats = ville_stats.sort_values('Trafic_total', ascending=False)
+    # Classement des villes calculé une fois par version des données
+    top_villes = dataset_resource('top_villes', df, lambda df: TopK(
+        load_cubes(df)[0].rollup(['Ville'])[['Ville', 'Trafic_total']], 'Trafic_total'
+    ))
+    top_villes_df = top_villes.head()
     
-    # Top 20
-    top_n_villes = st.slider("Nombre de villes à afficher", 10, 50, 20)
-    ville_stats_top = ville_stats.head(top_n_villes)
+    # Top 20 (curseur intégré au graphique en mode interactif : toutes les villes sont envoyées une fois)
+    if graphiques != 'vega':
+        top_n_villes = st.slider("Nombre de villes à afficher", 10, 50, 20)
+        ville_stats_top = top_villes.head(top_n_villes)
     
     col1, col2 = st.columns([2, 1])
     
     with col1:
-        fig, ax = plt.subplots(figsize=(12, 10))
-        
-        # Palette de verts pour les villes (couleurs RATP)
-        n_villes = len(ville_stats_top)
-        colors_villes = sns.light_palette(COLORS_RATP['vert'], n_colors=n_villes, reverse=True)
-        
-        bars = ax.barh(ville_stats_top['Ville'], ville_stats_top['Trafic_total'],
-                      color=colors_villes, alpha=0.85, edgecolor=COLORS_RATP['noir'], linewidth=1.2)
-        
-        ax.set_xlabel('Trafic total', fontsize=12, fontweight='bold')
-        ax.set_ylabel('Ville', fontsize=12, fontweight='bold')
-        ax.set_title(f'Top {top_n_villes} des villes par trafic', fontsize=14, fontweight='bold', 
-                    pad=20, color=COLORS_RATP['bleu'])
-        ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{int(x/1e6):.1f}M' if x >= 1e6 else f'{int(x/1e3):.0f}K'))
-        ax.grid(axis='x', alpha=0.3, linestyle='--', color=COLORS_RATP['noir'])
-        ax.invert_yaxis()  # Pour avoir la plus haute valeur en haut
-        
-        plt.tight_layout()
-        st.pyplot(fig)
-        plt.close()
+        def draw():
+            import matplotlib.pyplot as plt
+            fig, ax = plt.subplots(figsize=(12, 10))
+        
+            # Palette de verts pour les villes (couleurs RATP), seaborn chargé seulement au tracé
+            import seaborn as sns
+            n_villes = len(ville_stats_top)
+            colors_villes = sns.light_palette(COLORS_RATP['vert'], n_colors=n_villes, reverse=True)
+        
+            bars = ax.barh(ville_stats_top['Ville'], ville_stats_top['Trafic_total'],
+                          color=colors_villes, alpha=0.85, edgecolor=COLORS_RATP['noir'], linewidth=1.2)
+        
+            ax.set_xlabel('Trafic total', fontsize=12, fontweight='bold')
+            ax.set_ylabel('Ville', fontsize=12, fontweight='bold')
+            ax.set_title(f'Top {top_n_villes} des villes par trafic', fontsize=14, fontweight='bold', 
+                        pad=20, color=COLORS_RATP['bleu'])
+            ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{int(x/1e6):.1f}M' if x >= 1e6 else f'{int(x/1e3):.0f}K'))
+            ax.grid(axis='x', alpha=0.3, linestyle='--', color=COLORS_RATP['noir'])
+            ax.invert_yaxis()  # Pour avoir la plus haute valeur en haut
+        
+            plt.tight_layout()
+            return fig
+        
+        if graphiques == 'vega':
+            show_vega_chart('geo_villes', {}, lambda: cities_chart(top_villes_df), dataset_version(df))
+        else:
+            show_chart('geo_villes', {'top_n': top_n_villes}, draw, dataset_version(df))
     
     with col2:
         st.markdown("### Top 5 villes")
-        for idx, row in ville_stats.head(5).iterrows():
+        for idx, row in top_villes.head(5).iterrows():
             st.markdown(f"**{row['Ville']}** : {row['Trafic_total']:,.0f}")
         
         st.markdown("---")
-        st.metric("Nombre total de villes", len(ville_stats))
+        st.metric("Nombre total de villes", len(top_villes_df))
 
 else:  # Par réseau/zone
     st.subheader("Répartition par réseau et zone")
@@ -134,67 +157,77 @@ else:  # Par réseau/zone
     
     with col1:
         # Par réseau
-        reseau_stats = df.groupby('Réseau')['Trafic'].sum().reset_index()
-        reseau_stats.columns = ['Réseau', 'Trafic_total']
-        
-        fig, ax = plt.subplots(figsize=(8, 8))
-        
-        # Couleurs RATP pour réseau
-        colors_reseau = [COLORS_RATP['bleu'] if r == 'Métro' else COLORS_RATP['vert'] for r in reseau_stats['Réseau']]
-        
-        wedges, texts, autotexts = ax.pie(
-            reseau_stats['Trafic_total'],
-            labels=reseau_stats['Réseau'],
-            autopct=lambda pct: f'{pct:.1f}%\n({int(pct/100*reseau_stats["Trafic_total"].sum()):,})',
-            startangle=90,
-            colors=colors_reseau,
-            textprops={'fontsize': 11, 'weight': 'bold', 'color': 'white'},
-            wedgeprops={'edgecolor': 'white', 'linewidth': 3}
-        )
-        
-        ax.set_title('Répartition du trafic par réseau', fontsize=14, fontweight='bold', 
-                    pad=20, color=COLORS_RATP['bleu'])
-        
-        plt.tight_layout()
-        st.pyplot(fig)
-        plt.close()
+        reseau_stats = cube_stations.rollup(['Réseau'])[['Réseau', 'Trafic_total']]
+        
+        def draw():
+            import matplotlib.pyplot as plt
+            fig, ax = plt.subplots(figsize=(8, 8))
+        
+            # Couleurs RATP pour réseau
+            colors_reseau = [COLORS_RATP['bleu'] if r == 'Métro' else COLORS_RATP['vert'] for r in reseau_stats['Réseau']]
+        
+            wedges, texts, autotexts = ax.pie(
+                reseau_stats['Trafic_total'],
+                labels=reseau_stats['Réseau'],
+                autopct=lambda pct: f'{pct:.1f}%\n({int(pct/100*reseau_stats["Trafic_total"].sum()):,})',
+                startangle=90,
+                colors=colors_reseau,
+                textprops={'fontsize': 11, 'weight': 'bold', 'color': 'white'},
+                wedgeprops={'edgecolor': 'white', 'linewidth': 3}
+            )
+        
+            ax.set_title('Répartition du trafic par réseau', fontsize=14, fontweight='bold', 
+                        pad=20, color=COLORS_RATP['bleu'])
+        
+            plt.tight_layout()
+            return fig
+        
+        if graphiques == 'vega':
+            show_vega_chart('geo_reseaux', {}, lambda: reseaux_pie_chart(reseau_stats), dataset_version(df))
+        else:
+            show_chart('geo_reseaux', {}, draw, dataset_version(df))
     
     with col2:
         # Par zone (Paris vs Banlieue)
-        df_copy = df.copy()
-        df_copy['Zone'] = df_copy['Ville'].apply(lambda x: 'Paris' if x == 'Paris' else 'Banlieue')
-        zone_stats = df_copy.groupby('Zone')['Trafic'].sum().reset_index()
-        zone_stats.columns = ['Zone', 'Trafic_total']
-        
-        fig, ax = plt.subplots(figsize=(8, 8))
-        
-        # Couleurs RATP pour zones
-        colors_zone = [COLORS_RATP['jaune'] if z == 'Paris' else COLORS_RATP['rouge'] for z in zone_stats['Zone']]
-        
-        wedges, texts, autotexts = ax.pie(
-            zone_stats['Trafic_total'],
-            labels=zone_stats['Zone'],
-            autopct=lambda pct: f'{pct:.1f}%\n({int(pct/100*zone_stats["Trafic_total"].sum()):,})',
-            startangle=90,
-            colors=colors_zone,
-            textprops={'fontsize': 11, 'weight': 'bold', 'color': 'white'},
-            wedgeprops={'edgecolor': 'white', 'linewidth': 3}
-        )
-        
-        ax.set_title('Répartition du trafic Paris vs Banlieue', fontsize=14, fontweight='bold', 
-                    pad=20, color=COLORS_RATP['bleu'])
-        
-        plt.tight_layout()
-        st.pyplot(fig)
-        plt.close()
+        zone_stats = cube_stations.rollup(['Zone'])[['Zone', 'Trafic_total']]
+        
+        def draw():
+            import matplotlib.pyplot as plt
+            fig, ax = plt.subplots(figsize=(8, 8))
+        
+            # Couleurs RATP pour zones
+            colors_zone = [COLORS_RATP['jaune'] if z == 'Paris' else COLORS_RATP['rouge'] for z in zone_stats['Zone']]
+        
+            wedges, texts, autotexts = ax.pie(
+                zone_stats['Trafic_total'],
+                labels=zone_stats['Zone'],
+                autopct=lambda pct: f'{pct:.1f}%\n({int(pct/100*zone_stats["Trafic_total"].sum()):,})',
+                startangle=90,
+                colors=colors_zone,
+                textprops={'fontsize': 11, 'weight': 'bold', 'color': 'white'},
+                wedgeprops={'edgecolor': 'white', 'linewidth': 3}
+            )
+        
+            ax.set_title('Répartition du trafic Paris vs Banlieue', fontsize=14, fontweight='bold', 
+                        pad=20, color=COLORS_RATP['bleu'])
+        
+            plt.tight_layout()
+            return fig
+        
+        if graphiques == 'vega':
+            show_vega_chart('geo_zones', {}, lambda: zones_pie_chart(zone_stats), dataset_version(df))
+        else:
+            show_chart('geo_zones', {}, draw, dataset_version(df))
     
     st.markdown("---")
     
     # Tableau croisé
     st.subheader("Tableau croisé Réseau × Zone")
     
-    df_copy['Zone'] = df_copy['Ville'].apply(lambda x: 'Paris' if x == 'Paris' else 'Banlieue')
-    cross_stats = df_copy.groupby(['Réseau', 'Zone'])['Trafic'].sum().reset_index()
-    pivot_table = cross_stats.pivot(index='Réseau', columns='Zone', values='Trafic').fillna(0)
+    cross_stats = cube_stations.rollup(['Réseau', 'Zone'])
+    pivot_table = cross_stats.pivot(index='Réseau', columns='Zone', values='Trafic_total').fillna(0)
     
-    st.dataframe(pivot_table.style.format("{:,.0f}"), use_container_width=True)
+    st.dataframe(pivot_table.style.format("{:,.0f}"), width='stretch')
+
+# Panneau de mesures (RATP_DEBUG=1)
+debug_panel()
@@ -1,13 +1,25 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
 import sys
 import os
 
 # Ajouter le répertoire parent au path pour importer utils
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import load_data, display_logo, COLORS_RATP, configure_matplotlib
+from utils import load_data, select_years, dataset_resource, display_logo, COLORS_RATP, dataset_version
+from filters import FilterEngine
+from cube import HISTOGRAM_BINS_PER_DECADE
+from indexes import SortIndex, TopK
+from exports import EXPORT_FORMATS, export_file, export_formats
+from charts import show_chart, show_vega_chart, chart_backend
+from vega_charts import histogram_chart, top_stations_chart
+from instrumentation import start_rerun, debug_panel
+
+# Tailles de page du tableau de résultats
+TAILLES_PAGE = [25, 50, 100, 500]
+
+# Classes de l'histogramme : fixes, donc comparables d'un filtre à l'autre
+LEGENDE_HISTOGRAMME = (f"Classes logarithmiques fixes ({HISTOGRAM_BINS_PER_DECADE} par décade), "
+                       "identiques quels que soient les filtres.")
 
 # Configuration
 st.set_page_config(
@@ -16,14 +28,19 @@ st.set_page_config(
     layout="wide"
 )
 
-# Configuration matplotlib
-configure_matplotlib()
+# Mesures du rerun (actives avec RATP_DEBUG=1)
+start_rerun('Exploration libre')
 
 # Logo
 display_logo()
 
 # Chargement des données
-df = load_data()
+df = load_data(select_years())
+filter_engine = dataset_resource('filtres', df, FilterEngine)
+top_trafic = dataset_resource('top_trafic', df, TopK)
+
+# Moteur des graphiques : images matplotlib ou Vega-Lite interactif
+graphiques = chart_backend()
 
 # Titre
 st.title("Exploration libre des données")
@@ -48,19 +65,10 @@ with st.sidebar:
         default=None
     )
     
-    # Filtre par ligne
-    toutes_lignes = []
-    correspondances_cols = ['Correspondance_1', 'Correspondance_2', 'Correspondance_3', 
-                           'Correspondance_4', 'Correspondance_5']
-    for col in correspondances_cols:
-        lignes = df[col].dropna().unique().tolist()
-        toutes_lignes.extend([str(l).strip() for l in lignes if str(l).strip() != ''])
-    
-    toutes_lignes = sorted(list(set(toutes_lignes)))
-    
+    # Filtre par ligne (codes normalisés de l'index inverse)
     lignes_selected = st.multiselect(
         "Ligne(s)",
-        options=toutes_lignes,
+        options=filter_engine.line_index.lignes,
         default=None
     )
     
@@ -76,29 +84,18 @@ with st.sidebar:
     # Recherche textuelle
     search_station = st.text_input("Rechercher une station")
 
-# Appliquer les filtres
-df_filtered = df.copy()
-
-if reseaux_selected:
-    df_filtered = df_filtered[df_filtered['Réseau'].isin(reseaux_selected)]
-
-if villes_selected:
-    df_filtered = df_filtered[df_filtered['Ville'].isin(villes_selected)]
-
-if lignes_selected:
-    # Filtrer les stations qui ont au moins une des lignes sélectionnées
-    mask = df_filtered[correspondances_cols].isin(lignes_selected).any(axis=1)
-    df_filtered = df_filtered[mask]
-
-df_filtered = df_filtered[
-    (df_filtered['Trafic'] >= trafic_min) & 
-    (df_filtered['Trafic'] <= trafic_max)
-]
+# Compilation des filtres en un masque unique (masques mémorisés par critère)
+criteres = FilterEngine.criteria(
+    reseaux=reseaux_selected,
+    villes=villes_selected,
+    lignes=lignes_selected,
+    trafic=(trafic_min, trafic_max),
+    recherche=search_station
+)
+df_filtered = df.take(filter_engine.rows(criteres))
 
-if search_station:
-    df_filtered = df_filtered[
-        df_filtered['Station'].str.contains(search_station, case=False, na=False)
-    ]
+if search_station and filter_engine.search_index.match_ids(search_station)[1]:
+    st.caption(f"Aucune station ne contient « {search_station} » : résultats approchés.")
 
 # Affichage des résultats
 st.subheader(f"Résultats : {len(df_filtered)} stations")
@@ -117,95 +114,150 @@ if len(df_filtered) > 0:
         st.metric("Trafic moyen", f"{df_filtered['Trafic'].mean():,.0f}")
     
     with col4:
-        st.metric("Trafic médian", f"{df_filtered['Trafic'].median():,.0f}")
+        # Exact sur les petites sélections, sinon fusion des esquisses de quantiles du cube
+        st.metric("Trafic médian", f"{filter_engine.quantile(criteres, 0.5):,.0f}")
     
     st.markdown("---")
     
     # Graphique dynamique
-    graph_type = st.selectbox(
-        "Type de graphique",
-        ["Top 20 stations", "Histogramme de distribution"]
-    )
+    if graphiques == 'vega':
+        # Les deux graphiques sont envoyés une fois, le changement d'onglet se fait dans le navigateur
+        onglet_top, onglet_histo = st.tabs(["Top 20 stations", "Histogramme de distribution"])
+        with onglet_top:
+            show_vega_chart('exploration_top20', criteres,
+                            lambda: top_stations_chart(top_trafic.head(20, mask=filter_engine.mask(criteres))),
+                            dataset_version(df))
+        with onglet_histo:
+            show_vega_chart('exploration_histogramme', criteres, lambda: histogram_chart(filter_engine.distribution(criteres)),
+                            dataset_version(df))
+            st.caption(LEGENDE_HISTOGRAMME)
+    else:
+        graph_type = st.selectbox(
+            "Type de graphique",
+            ["Top 20 stations", "Histogramme de distribution"]
+        )
     
-    if graph_type == "Top 20 stations":
-        df_top20 = df_filtered.nlargest(20, 'Trafic')
+        if graph_type == "Top 20 stations":
+            def draw():
+                import matplotlib.pyplot as plt
+                import matplotlib.patches as mpatches
+                # Ordre décroissant pré-calculé, parcouru jusqu'à 20 stations du masque
+                df_top20 = top_trafic.head(20, mask=filter_engine.mask(criteres))
+            
+                fig, ax = plt.subplots(figsize=(12, 10))
         
-        fig, ax = plt.subplots(figsize=(12, 10))
+                # Couleurs par réseau (couleurs RATP)
+                colors = df_top20['Réseau'].map({'Métro': COLORS_RATP['bleu'], 'RER': COLORS_RATP['vert']})
+                bars = ax.barh(df_top20['Station'], df_top20['Trafic'], color=colors, alpha=0.85, 
+                              edgecolor=COLORS_RATP['noir'], linewidth=1.2)
         
-        # Couleurs par réseau (couleurs RATP)
-        colors = df_top20['Réseau'].map({'Métro': COLORS_RATP['bleu'], 'RER': COLORS_RATP['vert']})
-        bars = ax.barh(df_top20['Station'], df_top20['Trafic'], color=colors, alpha=0.85, 
-                      edgecolor=COLORS_RATP['noir'], linewidth=1.2)
+                ax.set_xlabel('Trafic annuel', fontsize=12, fontweight='bold')
+                ax.set_ylabel('Station', fontsize=12, fontweight='bold')
+                ax.set_title('Top 20 des stations (données filtrées)', fontsize=14, fontweight='bold', 
+                            pad=20, color=COLORS_RATP['bleu'])
+                ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{int(x/1e6):.1f}M' if x >= 1e6 else f'{int(x/1e3):.0f}K'))
+                ax.grid(axis='x', alpha=0.3, linestyle='--', color=COLORS_RATP['noir'])
+                ax.invert_yaxis()
         
-        ax.set_xlabel('Trafic annuel', fontsize=12, fontweight='bold')
-        ax.set_ylabel('Station', fontsize=12, fontweight='bold')
-        ax.set_title('Top 20 des stations (données filtrées)', fontsize=14, fontweight='bold', 
-                    pad=20, color=COLORS_RATP['bleu'])
-        ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{int(x/1e6):.1f}M' if x >= 1e6 else f'{int(x/1e3):.0f}K'))
-        ax.grid(axis='x', alpha=0.3, linestyle='--', color=COLORS_RATP['noir'])
-        ax.invert_yaxis()
+                # Légende avec couleurs RATP
+                metro_patch = mpatches.Patch(color=COLORS_RATP['bleu'], label='Métro', alpha=0.85)
+                rer_patch = mpatches.Patch(color=COLORS_RATP['vert'], label='RER', alpha=0.85)
+                ax.legend(handles=[metro_patch, rer_patch], loc='lower right')
         
-        # Légende avec couleurs RATP
-        metro_patch = mpatches.Patch(color=COLORS_RATP['bleu'], label='Métro', alpha=0.85)
-        rer_patch = mpatches.Patch(color=COLORS_RATP['vert'], label='RER', alpha=0.85)
-        ax.legend(handles=[metro_patch, rer_patch], loc='lower right')
+                plt.tight_layout()
+                return fig
         
-        plt.tight_layout()
-        st.pyplot(fig)
-        plt.close()
+            show_chart('exploration_top20', criteres, draw, dataset_version(df))
     
-    else:  # Histogramme
-        fig, ax = plt.subplots(figsize=(12, 6))
+        else:  # Histogramme
+            def draw():
+                import matplotlib.pyplot as plt
+                fig, ax = plt.subplots(figsize=(12, 6))
         
-        # Créer un histogramme avec couleurs RATP
-        if 'Réseau' in df_filtered.columns and len(df_filtered['Réseau'].unique()) > 1:
-            for reseau in df_filtered['Réseau'].unique():
-                data = df_filtered[df_filtered['Réseau'] == reseau]['Trafic']
-                color = COLORS_RATP['bleu'] if reseau == 'Métro' else COLORS_RATP['vert']
-                ax.hist(data, bins=30, alpha=0.7, label=reseau, color=color, 
-                       edgecolor=COLORS_RATP['noir'], linewidth=0.8)
-            ax.legend(loc='upper right', fontsize=11)
-        else:
-            ax.hist(df_filtered['Trafic'], bins=30, alpha=0.75, color=COLORS_RATP['bleu'], 
-                   edgecolor=COLORS_RATP['noir'], linewidth=0.8)
+                # Histogrammes pré-calculés sur des classes logarithmiques fixes (comparables entre filtres)
+                distribution = filter_engine.distribution(criteres)
+                reseaux = distribution['Réseau'].unique()
+                for reseau in reseaux:
+                    data = distribution[distribution['Réseau'] == reseau]
+                    color = COLORS_RATP['bleu'] if reseau == 'Métro' or len(reseaux) == 1 else COLORS_RATP['vert']
+                    ax.bar(data['Début'], data['Stations'], width=data['Fin'] - data['Début'], align='edge',
+                           alpha=0.7 if len(reseaux) > 1 else 0.75, label=reseau, color=color,
+                           edgecolor=COLORS_RATP['noir'], linewidth=0.8)
+                if len(reseaux) > 1:
+                    ax.legend(loc='upper right', fontsize=11)
+                ax.set_xscale('log')
+                ax.yaxis.set_major_locator(plt.MaxNLocator(integer=True))
         
-        ax.set_xlabel('Trafic annuel', fontsize=12, fontweight='bold')
-        ax.set_ylabel('Nombre de stations', fontsize=12, fontweight='bold')
-        ax.set_title('Distribution du trafic (données filtrées)', fontsize=14, fontweight='bold', 
-                    pad=20, color=COLORS_RATP['bleu'])
-        ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{int(x/1e6):.1f}M' if x >= 1e6 else f'{int(x/1e3):.0f}K'))
-        ax.grid(axis='y', alpha=0.3, linestyle='--', color=COLORS_RATP['noir'])
+                ax.set_xlabel('Trafic annuel', fontsize=12, fontweight='bold')
+                ax.set_ylabel('Nombre de stations', fontsize=12, fontweight='bold')
+                ax.set_title('Distribution du trafic (données filtrées)', fontsize=14, fontweight='bold', 
+                            pad=20, color=COLORS_RATP['bleu'])
+                ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{int(x/1e6):.1f}M' if x >= 1e6 else f'{int(x/1e3):.0f}K'))
+                ax.grid(axis='y', alpha=0.3, linestyle='--', color=COLORS_RATP['noir'])
         
-        plt.tight_layout()
-        st.pyplot(fig)
-        plt.close()
+                plt.tight_layout()
+                return fig
+        
+            show_chart('exploration_histogramme', criteres, draw, dataset_version(df))
+            st.caption(LEGENDE_HISTOGRAMME)
     
     st.markdown("---")
     
-    # Tableau de données
+    # Tableau de données (paginé côté serveur : seule la page visible est envoyée au navigateur)
     st.subheader("Données filtrées")
     
     # Colonnes à afficher
     colonnes_affichage = ['Rang', 'Réseau', 'Station', 'Trafic', 'Lignes', 'Ville', 'Arrondissement pour Paris']
-    df_display = df_filtered[colonnes_affichage].copy()
+    if df['Année'].nunique() > 1:
+        colonnes_affichage.insert(0, 'Année')
     
-    # Trier par trafic
-    df_display = df_display.sort_values('Trafic', ascending=False)
+    col_tri, col_sens, col_taille = st.columns([2, 1, 1])
+    with col_tri:
+        colonne_tri = st.selectbox("Trier par", colonnes_affichage, index=colonnes_affichage.index('Trafic'))
+    with col_sens:
+        sens_tri = st.selectbox("Ordre", ["Décroissant", "Croissant"])
+    with col_taille:
+        taille_page = st.selectbox("Lignes par page", TAILLES_PAGE, index=TAILLES_PAGE.index(100))
     
-    st.dataframe(df_display, use_container_width=True, hide_index=True, height=400)
+    # Ordre de tri pré-calculé sur tout le jeu, restreint au masque des filtres (sans retrier la sélection)
+    sort_index = dataset_resource('tris', df, SortIndex)
+    ordre = sort_index.rows(filter_engine.mask(criteres), colonne_tri, ascending=sens_tri == "Croissant")
+    nb_pages = max(1, -(-len(ordre) // taille_page))
     
-    # Export CSV
-    st.markdown("---")
-    st.subheader("Export des données")
+    # Retour à la première page dès que les filtres, le tri ou la taille changent
+    numero_page = st.number_input(
+        "Page", min_value=1, max_value=nb_pages, value=1, step=1,
+        key=f"page_{hash((criteres, colonne_tri, sens_tri, taille_page))}"
+    )
+    debut = (numero_page - 1) * taille_page
+    lignes_page = ordre[debut:debut + taille_page]
     
-    csv = df_display.to_csv(index=False, sep=';').encode('utf-8')
+    df_page = df.take(lignes_page)[colonnes_affichage]
+    # Catégories réduites aux valeurs de la page : le dictionnaire complet serait sinon envoyé
+    df_page = df_page.apply(
+        lambda s: s.cat.remove_unused_categories() if isinstance(s.dtype, pd.CategoricalDtype) else s
+    )
+    st.dataframe(df_page, width='stretch', hide_index=True)
+    st.caption(f"Stations {debut + 1} à {debut + len(lignes_page)} sur {len(ordre)} (page {numero_page}/{nb_pages})")
     
+    # Export
+    st.markdown("---")
+    st.subheader("Export des données")
+
+    # Formats possibles pour la taille de la sélection (XLSX limité à une feuille)
+    format_export = st.selectbox("Format d'export", export_formats(len(ordre)))
+    fmt = EXPORT_FORMATS[format_export]
+
+    # Export complet dans l'ordre du tableau, généré par blocs seulement au clic
     st.download_button(
-        label="Télécharger les données filtrées (CSV)",
-        data=csv,
-        file_name='ratp_data_filtered.csv',
-        mime='text/csv',
+        label=f"Télécharger les données filtrées ({format_export})",
+        data=lambda: export_file(df, ordre, colonnes_affichage, format_export),
+        file_name=f"ratp_data_filtered.{fmt['extension']}",
+        mime=fmt['mime'],
     )
 
 else:
     st.warning("Aucune station ne correspond à vos critères de filtrage.")
+
+# Panneau de mesures (RATP_DEBUG=1)
+debug_panel()
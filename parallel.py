@@ -0,0 +1,110 @@
+"""
+Agregations paralleles par partition (pool de processus) avec fusion des resultats partiels
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+import streamlit as st
+
+from cube import DIMENSIONS_STATIONS, _build_cubes
+from disk_cache import pinned, store_frames
+from utils import CORRESPONDANCES_COLS, build_ligne_tables, dataset_version, explode_lignes, ligne_partials, ligne_stats, merge_ligne_partials
+
+# Desactive par defaut (1 processus) : RATP_PARALLEL_WORKERS=16 sur un serveur multi-coeurs
+PARALLEL_WORKERS = int(os.environ.get('RATP_PARALLEL_WORKERS', '1'))
+# Decoupage : 'Année', 'Réseau' ou 'hash' (repartition des noms de station)
+PARALLEL_PARTITION = os.environ.get('RATP_PARALLEL_PARTITION', 'hash')
+# En dessous, le cout d'envoi aux processus depasse le gain
+PARALLEL_MIN_ROWS = 200_000
+
+POSITION = '_position'
+# Echecs d'un processus du pool (fichier partage illisible, processus tue) : repli sur le calcul local
+WORKER_ERRORS = (OSError, ValueError, BrokenProcessPool)
+
+@st.cache_resource
+def process_pool(workers):
+    """Pool de processus partage (demarrage 'spawn', sur dans un serveur multi-thread)"""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+def use_parallel(df, workers=None):
+    """Vrai si les agregations de df doivent passer par le pool"""
+    return (workers or PARALLEL_WORKERS) > 1 and len(df) >= PARALLEL_MIN_ROWS
+
+def shared_file(df):
+    """
+    Jeu de donnees en Feather non compresse, ecrit une fois par version : les processus le relisent
+    en memory mapping (pages partagees du cache systeme) au lieu de recevoir des partitions serialisees.
+    """
+    paths = store_frames('partage', dataset_version(df), df.reset_index(drop=True))
+    if paths is None:
+        raise OSError("Cache disque indisponible pour le jeu partage")
+    return paths[0]
+
+def split(df, by=PARALLEL_PARTITION, parts=PARALLEL_WORKERS, columns=None):
+    """Partitions de df : (fichier partage, positions, colonnes) par colonne ou par repartition des noms de station"""
+    if by == 'hash':
+        # Une station (meme nom) tombe toujours dans la meme partition
+        cles = pd.factorize(df['Station'])[0] % parts
+    else:
+        cles = pd.factorize(df[by])[0]
+    if columns is not None:
+        columns = list(dict.fromkeys(c for c in columns if c in df.columns))
+    path = shared_file(df)
+    return [(path, np.flatnonzero(cles == cle), columns) for cle in np.unique(cles)]
+
+def map_partitions(fonction, partitions, workers):
+    """Applique `fonction` aux partitions dans le pool ; le fichier partage reste epingle pendant la lecture"""
+    with pinned({path for path, _, _ in partitions}):
+        return list(process_pool(workers).map(fonction, partitions))
+
+def read_partition(partition):
+    """Lignes d'une partition lues dans le fichier partage, avec leur position d'origine"""
+    path, positions, columns = partition
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    return table.take(positions).to_pandas().assign(**{POSITION: positions})
+
+def _ligne_partition(partition):
+    # Seules les positions et les lignes reviennent : le processus principal reprend les colonnes de df
+    df_lignes = explode_lignes(read_partition(partition), extra=[POSITION])
+    return df_lignes[POSITION].to_numpy(), df_lignes['Ligne'].astype('category'), ligne_partials(df_lignes)
+
+def _cube_partition(partition):
+    return _build_cubes(read_partition(partition).drop(columns=POSITION))
+
+def parallel_ligne_tables(df, workers=None, by=PARALLEL_PARTITION):
+    """Equivalent de build_ligne_tables : eclatement et agregats partiels par partition, puis fusion"""
+    workers = workers or PARALLEL_WORKERS
+    colonnes = ['Station', 'Réseau', 'Trafic', *CORRESPONDANCES_COLS, by]
+    try:
+        resultats = map_partitions(_ligne_partition, split(df, by, workers, colonnes), workers)
+    except WORKER_ERRORS:
+        return build_ligne_tables(df)
+
+    # Ordre d'origine (station puis correspondance) retabli par tri stable sur la position
+    positions = np.concatenate([pos for pos, _, _ in resultats])
+    lignes = pd.concat([ligne.astype(object) for _, ligne, _ in resultats], ignore_index=True)
+    ordre = np.argsort(positions, kind='stable')
+    positions = positions[ordre]
+
+    colonnes = {'Ligne': lignes.to_numpy()[ordre]}
+    for col in ['Station', 'Réseau', 'Trafic']:
+        colonnes[col] = df[col].take(positions).reset_index(drop=True)
+    df_lignes = pd.DataFrame(colonnes)
+
+    partials = merge_ligne_partials(partials for _, _, partials in resultats)
+    return ligne_stats(df_lignes, partials), df_lignes
+
+def parallel_cubes(df, workers=None, by=PARALLEL_PARTITION):
+    """Equivalent de _build_cubes : cubes par partition fusionnes (AggregateCube.merge)"""
+    workers = workers or PARALLEL_WORKERS
+    colonnes = ['Station', 'Réseau', 'Trafic', *CORRESPONDANCES_COLS, *DIMENSIONS_STATIONS, by]
+    try:
+        cubes = map_partitions(_cube_partition, split(df, by, workers, colonnes), workers)
+    except WORKER_ERRORS:
+        return _build_cubes(df)
+    return tuple(premier.merge(*autres) for premier, *autres in zip(*cubes))
@@ -0,0 +1,73 @@
+"""
+Esquisses de quantiles fusionnables : histogrammes a classes logarithmiques (facon DDSketch)
+"""
+import math
+
+import numpy as np
+
+# Erreur relative maximale d'un quantile estime par esquisse
+QUANTILE_RELATIVE_ERROR = 0.01
+# En dessous, les quantiles sont calcules exactement sur les valeurs
+EXACT_QUANTILE_MAX_COUNT = 10_000
+MAX_VALUE = 1e10
+
+class LogBins:
+    """
+    Classes [0, 1), [1, g), [g, g^2)... avec g = (1 + e) / (1 - e) : le representant
+    de chaque classe est a moins de e (erreur relative) de toute valeur de la classe.
+    Un histogramme sur ces classes est une esquisse : deux esquisses se fusionnent en les additionnant.
+    """
+
+    def __init__(self, relative_error=QUANTILE_RELATIVE_ERROR, maximum=MAX_VALUE):
+        if not 0 < relative_error < 1:
+            raise ValueError(f"Erreur relative hors de ]0, 1[ : {relative_error}")
+        self.relative_error = relative_error
+        self.gamma = gamma = (1 + relative_error) / (1 - relative_error)
+        nb_classes = math.ceil(math.log(maximum) / math.log(gamma))
+        self.edges = np.concatenate([[0.0], gamma ** np.arange(nb_classes + 1)])
+        # Moyenne harmonique des bornes (erreur relative e des deux cotes), 0 pour [0, 1)
+        self.representatives = np.concatenate([[0.0], 2 * self.edges[2:] / (1 + gamma)])
+
+    def __len__(self):
+        return len(self.edges) - 1
+
+    def __eq__(self, other):
+        return isinstance(other, LogBins) and self.relative_error == other.relative_error and len(self) == len(other)
+
+    def bin(self, values):
+        """Indice de classe de chaque valeur (les valeurs hors bornes vont dans les classes extremes)"""
+        valeurs = np.asarray(values, dtype='float64')
+        return np.clip(np.searchsorted(self.edges, valeurs, side='right') - 1, 0, len(self) - 1)
+
+    def histogram(self, values):
+        """Esquisse (effectifs par classe) d'un ensemble de valeurs"""
+        return np.bincount(self.bin(values), minlength=len(self))
+
+    def coarse_width(self, per_decade):
+        """Nombre de classes regroupees par classe large pour ~`per_decade` classes larges par decade"""
+        return max(1, round(math.log(10) / per_decade / math.log(self.gamma)))
+
+    def coarsen(self, counts, per_decade):
+        """
+        Esquisse regroupee en classes larges fixes (~`per_decade` par decade) : (bornes, effectifs).
+        Le regroupement est lineaire : regrouper une somme d'esquisses revient a sommer les esquisses regroupees.
+        """
+        debuts = np.arange(0, len(self), self.coarse_width(per_decade))
+        return np.append(self.edges[debuts], self.edges[-1]), np.add.reduceat(counts, debuts)
+
+    def quantile(self, counts, q):
+        """Quantile q estime depuis une esquisse (meme interpolation lineaire que pandas/numpy)"""
+        total = counts.sum()
+        if total == 0:
+            return np.nan
+        rang = q * (total - 1)
+        cumul = np.cumsum(counts)
+        bas, haut = np.searchsorted(cumul, [math.floor(rang), math.ceil(rang)], side='right')
+        v_bas, v_haut = self.representatives[bas], self.representatives[haut]
+        return v_bas + (rang - math.floor(rang)) * (v_haut - v_bas)
+
+def exact_quantile(values, q):
+    """Quantile exact (selection partielle, sans tri complet), NaN si vide"""
+    valeurs = np.asarray(values, dtype='float64')
+    valeurs = valeurs[~np.isnan(valeurs)]
+    return float(np.quantile(valeurs, q)) if len(valeurs) else np.nan
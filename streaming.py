@@ -0,0 +1,95 @@
+"""
+Ingestion par blocs des gros exports de trafic (ex. validations journalieres par station)
+"""
+import pandas as pd
+
+from utils import CORRESPONDANCES_COLS, TYPES_TEXTE, apply_schema, build_ligne_tables, join_lignes
+
+STREAMING_CHUNKSIZE = 250_000
+
+# Attributs descriptifs d'une station (identiques d'un releve a l'autre)
+ATTRIBUTS = [*CORRESPONDANCES_COLS, 'Ville', 'Arrondissement pour Paris']
+CLES = ['Année', 'Réseau', 'Station']
+
+class StationAccumulator:
+    """
+    Agregats par station alimentes bloc par bloc : la memoire est bornee par
+    la taille d'un bloc et le nombre de stations distinctes, pas par celui des releves.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.chunks = 0
+        self._stations = None
+
+    @classmethod
+    def from_stations(cls, stations):
+        """Accumulateur repris d'un tableau de stations deja agrege (ex. version precedente en cache)"""
+        accumulateur = cls()
+        accumulateur.add(stations.drop(columns=['Rang', 'Lignes'], errors='ignore'))
+        accumulateur.rows = accumulateur.chunks = 0
+        return accumulateur
+
+    def add(self, chunk):
+        """Replie un bloc de releves (schema du CSV RATP) dans les agregats"""
+        chunk = chunk.assign(Trafic=pd.to_numeric(chunk['Trafic'], errors='coerce'))
+        cles = [c for c in CLES if c in chunk.columns]
+        attributs = {a: (a, 'first') for a in ATTRIBUTS if a in chunk.columns}
+
+        partiel = chunk.groupby(cles, sort=False, dropna=False).agg(
+            Trafic=('Trafic', 'sum'), **attributs
+        )
+        if self._stations is not None:
+            partiel = pd.concat([self._stations, partiel]).groupby(level=cles, sort=False, dropna=False).agg(
+                {'Trafic': 'sum', **{a: 'first' for a in attributs}}
+            )
+
+        self._stations = partiel
+        self.rows += len(chunk)
+        self.chunks += 1
+
+    def stations(self):
+        """Tableau des stations au schema de load_data (Rang recalcule par reseau)"""
+        df = self._stations.reset_index()
+        groupes = [c for c in ['Année', 'Réseau'] if c in df.columns]
+        df['Rang'] = df.groupby(groupes, sort=False)['Trafic'].rank(method='first', ascending=False)
+        df['Lignes'] = join_lignes(df)
+
+        colonnes = ['Rang', 'Réseau', 'Station', 'Trafic', *ATTRIBUTS, 'Lignes']
+        if 'Année' in df.columns:
+            colonnes.append('Année')
+        return apply_schema(df[[c for c in colonnes if c in df.columns]])
+
+    def lignes(self):
+        """Agregats par ligne (stats_lignes, df_lignes) des releves deja lus"""
+        return build_ligne_tables(self.stations())
+
+    def villes(self):
+        """Trafic total et nombre de stations par ville"""
+        stats = self.stations().groupby('Ville', observed=True)['Trafic'].agg(
+            Trafic_total='sum', Nb_stations='count'
+        ).reset_index()
+        stats['Trafic_total'] = stats['Trafic_total'].astype('int64')
+        return stats
+
+    def memory_usage(self):
+        """Memoire occupee par les agregats (octets)"""
+        return 0 if self._stations is None else int(self._stations.memory_usage(deep=True).sum())
+
+def stream_stations(path, chunksize=STREAMING_CHUNKSIZE, offset=0, accumulateur=None):
+    """
+    Lit un export CSV `;` par blocs et retourne l'accumulateur rempli.
+    Avec `offset`, seules les lignes a partir de cet octet (debut de ligne) sont lues.
+    """
+    accumulateur = accumulateur or StationAccumulator()
+    options = {'sep': ';', 'chunksize': chunksize, 'dtype': TYPES_TEXTE}
+    if offset:
+        colonnes = pd.read_csv(path, sep=';', nrows=0).columns
+        options.update(header=None, names=colonnes)
+
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        with pd.read_csv(f, **options) as lecteur:
+            for chunk in lecteur:
+                accumulateur.add(chunk)
+    return accumulateur
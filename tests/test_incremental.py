@@ -0,0 +1,113 @@
+"""
+Mise a jour incrementale (lignes ajoutees en fin d'export, annee ajoutee) : memes tableaux qu'une reconstruction
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+import streamlit as st
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import cube
+import disk_cache
+import utils
+from benchmarks.common import synthetic_stations
+
+FICHIER = 'trafic-annuel-entrant-par-station-du-reseau-ferre-{annee}.csv'
+
+
+def vider_caches():
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+@pytest.fixture
+def donnees(tmp_path, monkeypatch):
+    """Dossier de donnees vide, cache disque et caches memoire neufs ; compte les mises a jour incrementales"""
+    monkeypatch.setattr(utils, 'DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(disk_cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    vider_caches()
+
+    appels = {'lignes': 0, 'cubes': 0}
+
+    def compter(nom, fonction):
+        def wrapper(*args):
+            appels[nom] += 1
+            return fonction(*args)
+        return wrapper
+
+    monkeypatch.setattr(utils, 'update_ligne_tables', compter('lignes', utils.update_ligne_tables))
+    monkeypatch.setattr(cube, 'update_cubes', compter('cubes', cube.update_cubes))
+    yield tmp_path, appels
+    vider_caches()
+
+
+def ecrire(dossier, annee, n, seed=0):
+    synthetic_stations(n, seed=seed).to_csv(dossier / FICHIER.format(annee=annee), sep=';', index=False)
+
+
+def ajouter(dossier, annee, n, debut):
+    """Ajoute `n` stations nouvelles en fin d'export"""
+    ajout = synthetic_stations(n, seed=1)
+    ajout['Station'] = [f'STATION {debut + i}' for i in range(n)]
+    ajout.to_csv(dossier / FICHIER.format(annee=annee), sep=';', index=False, header=False, mode='a')
+
+
+def charger(annees):
+    # Tableaux relus depuis les sources et le cache disque ; objets derives gardes en memoire (cache_resource)
+    st.cache_data.clear()
+    df = utils.load_data(annees)
+    return df, utils.prepare_ligne_data(df), cube.load_cubes(df)
+
+
+def reconstruire(dossier, annees):
+    """Reconstruction complete : cache disque vide et caches memoire vides"""
+    vider_caches()
+    disk_cache.CACHE_DIR = str(dossier / 'cache-complet')
+    return charger(annees)
+
+
+def assert_identiques(incremental, complet):
+    df, lignes, cubes = incremental
+    df_ref, lignes_ref, cubes_ref = complet
+    pd.testing.assert_frame_equal(df, df_ref)
+    for table, reference in zip(lignes, lignes_ref):
+        pd.testing.assert_frame_equal(table, reference)
+    # Tous les attributs des cubes : agregats par cellule et esquisses
+    for agregat, reference in zip(cubes, cubes_ref):
+        assert vars(agregat).keys() == vars(reference).keys()
+        for nom, valeur in vars(agregat).items():
+            if isinstance(valeur, pd.DataFrame):
+                pd.testing.assert_frame_equal(valeur, vars(reference)[nom])
+            elif isinstance(valeur, np.ndarray):
+                np.testing.assert_array_equal(valeur, vars(reference)[nom], err_msg=nom)
+            else:
+                assert valeur == vars(reference)[nom], nom
+
+
+def test_lignes_ajoutees(donnees):
+    dossier, appels = donnees
+    ecrire(dossier, 2030, 2_000)
+    charger((2030,))
+
+    ajouter(dossier, 2030, 50, 2_000)
+    incremental = charger((2030,))
+    assert appels == {'lignes': 1, 'cubes': 1}
+    assert len(incremental[0]) == 2_050
+
+    assert_identiques(incremental, reconstruire(dossier, (2030,)))
+
+
+def test_annee_ajoutee(donnees):
+    dossier, appels = donnees
+    ecrire(dossier, 2029, 2_000)
+    charger((2029,))
+
+    ecrire(dossier, 2030, 1_500, seed=2)
+    incremental = charger((2029, 2030))
+    assert appels == {'lignes': 1, 'cubes': 1}
+    assert incremental[0]['Année'].value_counts().to_dict() == {2029: 2_000, 2030: 1_500}
+
+    assert_identiques(incremental, reconstruire(dossier, (2029, 2030)))
@@ -2,11 +2,15 @@
 Fonctions utilitaires communes pour le dashboard RATP
 """
 import streamlit as st
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from PIL import Image
 import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from disk_cache import cached_frames, load_frames, source_base, source_key, store_frames
+from instrumentation import cache_miss, cache_probe, span, timed
 
 # Couleurs RATP officielles
 COLORS_RATP = {
@@ -19,19 +23,55 @@ COLORS_RATP = {
     'noir': '#1D1D1B'
 }
 
+# Exports annuels RATP : un fichier par annee dans DATA_DIR
+DATA_DIR = 'data'
+# Au-dela, les exports sont agreges par blocs (streaming.py) au lieu d'etre lus d'un coup
+STREAMING_THRESHOLD_BYTES = 256 * 1024 * 1024
+DATA_PATTERN = re.compile(r'^trafic-annuel-entrant-par-station-.*?(\d{4})\.csv$')
+
+# Colonnes contenant les lignes desservies par une station
+CORRESPONDANCES_COLS = ['Correspondance_1', 'Correspondance_2', 'Correspondance_3',
+                        'Correspondance_4', 'Correspondance_5']
+# Colonnes texte lues telles quelles (sans inference par bloc : '1' et 'A' dans une meme colonne)
+TYPES_TEXTE = {col: str for col in ['Réseau', 'Station', 'Ville', *CORRESPONDANCES_COLS]}
+
+# Schema compact du tableau des stations (les correspondances partagent une categorie commune)
+SCHEMA_STATIONS = {
+    'Rang': 'uint16',
+    'Réseau': 'category',
+    'Trafic': 'uint32',
+    'Ville': 'category',
+    'Arrondissement pour Paris': 'Int8',
+    'Lignes': 'category'
+}
+
+_matplotlib_lock = threading.Lock()
+_matplotlib_configured = False
+
 # Configuration matplotlib
 def configure_matplotlib():
-    """Configure matplotlib avec les couleurs RATP"""
-    plt.style.use('seaborn-v0_8-whitegrid')
-    custom_palette = [COLORS_RATP['bleu'], COLORS_RATP['vert'], COLORS_RATP['jaune'], 
-                      COLORS_RATP['rouge'], COLORS_RATP['metro'], COLORS_RATP['rer']]
-    sns.set_palette(custom_palette)
-    plt.rcParams['figure.figsize'] = (10, 6)
-    plt.rcParams['font.size'] = 10
-    plt.rcParams['axes.labelcolor'] = COLORS_RATP['noir']
-    plt.rcParams['text.color'] = COLORS_RATP['noir']
-    plt.rcParams['xtick.color'] = COLORS_RATP['noir']
-    plt.rcParams['ytick.color'] = COLORS_RATP['noir']
+    """Configure matplotlib avec les couleurs RATP (une seule fois par processus, rcParams globaux)"""
+    global _matplotlib_configured
+    if _matplotlib_configured:
+        return
+    with _matplotlib_lock:
+        if _matplotlib_configured:
+            return
+        # Import differe : seules les pages qui tracent des graphiques chargent matplotlib
+        import matplotlib as mpl
+        from cycler import cycler
+        mpl.style.use('seaborn-v0_8-whitegrid')
+        custom_palette = [COLORS_RATP['bleu'], COLORS_RATP['vert'], COLORS_RATP['jaune'], 
+                          COLORS_RATP['rouge'], COLORS_RATP['metro'], COLORS_RATP['rer']]
+        # Equivalent de sns.set_palette, sans importer seaborn
+        mpl.rcParams['axes.prop_cycle'] = cycler(color=[mpl.colors.to_rgb(c) for c in custom_palette])
+        mpl.rcParams['figure.figsize'] = (10, 6)
+        mpl.rcParams['font.size'] = 10
+        mpl.rcParams['axes.labelcolor'] = COLORS_RATP['noir']
+        mpl.rcParams['text.color'] = COLORS_RATP['noir']
+        mpl.rcParams['xtick.color'] = COLORS_RATP['noir']
+        mpl.rcParams['ytick.color'] = COLORS_RATP['noir']
+        _matplotlib_configured = True
 
 def display_logo():
     """Affiche le logo RATP au-dessus de la navigation"""
@@ -42,65 +82,380 @@ def display_logo():
         except:
             pass
 
-@st.cache_data
-def load_data():
-    """Charge et prepare les donnees RATP"""
-    df = pd.read_csv('data/trafic-annuel-entrant-par-station-du-reseau-ferre-2021.csv', sep=';')
+def is_streamed(size):
+    """Vrai si un export de `size` octets est lu par blocs (streaming.py)"""
+    return size > STREAMING_THRESHOLD_BYTES
+
+@timed('read_stations', 'chargement')
+def read_stations(path):
+    """Lit un export CSV RATP et derive les colonnes du dashboard"""
+    if is_streamed(os.path.getsize(path)):
+        # Export volumineux (releves par jour et par station) : lecture par blocs
+        from streaming import stream_stations
+        return stream_stations(path).stations()
+
+    df = pd.read_csv(path, sep=';', dtype=TYPES_TEXTE)
     
-    correspondances_cols = ['Correspondance_1', 'Correspondance_2', 'Correspondance_3', 
-                           'Correspondance_4', 'Correspondance_5']
+    df['Lignes'] = join_lignes(df)
     
-    def get_lignes(row):
-        lignes = []
-        for col in correspondances_cols:
-            if pd.notna(row[col]) and str(row[col]).strip() != '':
-                lignes.append(str(row[col]).strip())
-        return ', '.join(lignes) if lignes else '-'
+    return apply_schema(df)
+
+def list_datasets():
+    """Exports annuels disponibles dans DATA_DIR : {annee: chemin}"""
+    datasets = {}
+    for fichier in sorted(os.listdir(DATA_DIR)):
+        match = DATA_PATTERN.match(fichier)
+        if match:
+            datasets[int(match.group(1))] = os.path.join(DATA_DIR, fichier)
+    return datasets
+
+@timed('read_appended', 'chargement')
+def read_appended(path, previous, offset):
+    """
+    Tableau des stations de `path` a partir de celui (`previous`) de ses `offset` premiers octets :
+    seules les lignes ajoutees depuis sont lues, le resultat est identique a read_stations(path).
+    """
+    if is_streamed(os.path.getsize(path)):
+        from streaming import StationAccumulator, stream_stations
+        return stream_stations(path, offset=offset, accumulateur=StationAccumulator.from_stations(previous)).stations()
+
+    colonnes = pd.read_csv(path, sep=';', nrows=0).columns
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        ajout = pd.read_csv(f, sep=';', header=None, names=colonnes, dtype=TYPES_TEXTE)
+    ajout['Lignes'] = join_lignes(ajout)
+
+    # Categories triees et entiers les plus petits : meme schema qu'une lecture complete
+    return concat_stations([previous, apply_schema(ajout)])
+
+def load_year(year, path):
+    """
+    Partition d'une annee (via le cache disque), avec la colonne 'Année'.
+    Si le fichier a seulement recu des lignes en fin, seules celles-ci sont lues ; la partition
+    est alors retournee avec (cle, nombre de lignes) de la version precedente, qu'elle prolonge.
+    """
+    key = source_key(path)
+    name = f'stations-{year}'
+    df = load_frames(name, key)
+    base = None
+
+    if df is None:
+        precedente = source_base(path)
+        previous = load_frames(name, precedente[0]) if precedente else None
+        if previous is not None and is_streamed(precedente[1]) == is_streamed(os.path.getsize(path)):
+            df = read_appended(path, previous, precedente[1])
+            if not is_streamed(precedente[1]):
+                # Lignes ajoutees en fin de tableau (en mode bloc, les stations existantes changent)
+                base = (precedente[0], len(previous))
+        else:
+            df = read_stations(path)
+        store_frames(name, key, df)
+
+    df['Année'] = np.uint16(year)
+    return df, key, base
+
+def concat_stations(frames):
+    """Concatene des partitions en conservant des categories communes"""
+    if len(frames) == 1:
+        return frames[0]
+    
+    frames = list(frames)
+    groupes = [CORRESPONDANCES_COLS] + [
+        [col] for col in frames[0].columns
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype) and col not in CORRESPONDANCES_COLS
+    ]
+    for cols in groupes:
+        categories = set()
+        for frame in frames:
+            for col in cols:
+                categories.update(frame[col].cat.categories)
+        dtype = pd.CategoricalDtype(sorted(categories))
+        frames = [frame.astype({col: dtype for col in cols}) for frame in frames]
     
-    df['Lignes'] = df.apply(get_lignes, axis=1)
+    return pd.concat(frames, ignore_index=True)
+
+@timed('build_dataset', 'chargement')
+def build_dataset(years):
+    """Lit et assemble les partitions annuelles `years` (sans cache memoire)"""
+    datasets = list_datasets()
     
-    df['Trafic'] = pd.to_numeric(df['Trafic'], errors='coerce')
+    # Seules les annees demandees sont lues, en parallele
+    with ThreadPoolExecutor(max_workers=min(len(years), os.cpu_count() or 1)) as pool:
+        partitions = list(pool.map(lambda year: load_year(year, datasets[year]), years))
     
-    df['Arrondissement pour Paris'] = df['Arrondissement pour Paris'].apply(
-        lambda x: int(x) if pd.notna(x) and str(x).strip() != '' else ''
-    )
+    frames = [frame for frame, _, _ in partitions]
+    keys = [key for _, key, _ in partitions]
+    df = concat_stations(frames)
     
+    # Versions dont df prolonge les lignes (mise a jour incrementale des agregats) : (cle, nb de lignes)
+    bases = []
+    _, _, base = partitions[-1]
+    if base is not None:
+        bases.append(('+'.join(keys[:-1] + [base[0]]), len(df) - len(frames[-1]) + base[1]))
+    if len(keys) > 1:
+        bases.append(('+'.join(keys[:-1]), len(df) - len(frames[-1])))
+    
+    df.attrs.update(source_key='+'.join(keys), source_rows=len(df), source_bases=bases)
     return df
 
-@st.cache_data
-def prepare_ligne_data(df):
-    """Prepare les donnees agregees par ligne"""
-    rows = []
-    correspondances_cols = ['Correspondance_1', 'Correspondance_2', 'Correspondance_3', 
-                           'Correspondance_4', 'Correspondance_5']
+# Versions du jeu de donnees gardees en memoire (tableaux partages et objets derives de dataset_resource)
+SHARED_DATASETS_MAX = 8
+
+@st.cache_resource(max_entries=SHARED_DATASETS_MAX)
+def _shared_dataset(years, versions):
+    cache_miss('donnees')
+    return build_dataset(years)
+
+def load_data(years=None):
+    """
+    Charge et prepare les donnees RATP (annee la plus recente par defaut).
+    Le DataFrame est partage par toutes les sessions et pages, sans copie : il ne doit pas etre modifie
+    (les filtres et colonnes derivees travaillent sur des copies paresseuses : copy-on-write, toujours actif
+    depuis pandas 3, d'ou pandas>=3.0 dans requirements.txt).
+    """
+    datasets = list_datasets()
+    years = tuple(sorted(years)) if years else (max(datasets),)
+    # La version des sources fait partie de la cle : un export modifie est relu sans redemarrage
+    versions = tuple(source_key(datasets[year]) for year in years)
+    with span('load_data', 'chargement'), cache_probe('donnees'):
+        return _shared_dataset(years, versions)
+
+def select_years(multiple=True):
+    """Selecteur d'annee(s) dans la sidebar, affiche seulement si plusieurs exports sont disponibles"""
+    annees = sorted(list_datasets())
+    if len(annees) <= 1:
+        return tuple(annees)
     
-    for idx, row in df.iterrows():
-        for col in correspondances_cols:
-            if pd.notna(row[col]) and str(row[col]).strip() != '':
-                ligne = str(row[col]).strip()
-                
-                try:
-                    ligne = str(int(float(ligne)))
-                except (ValueError, TypeError):
-                    pass
-                
-                rows.append({
-                    'Ligne': ligne,
-                    'Station': row['Station'],
-                    'Réseau': row['Réseau'],
-                    'Trafic': row['Trafic']
-                })
+    with st.sidebar:
+        if multiple:
+            choix = st.multiselect("Année(s)", annees, default=[annees[-1]])
+            return tuple(sorted(choix)) or (annees[-1],)
+        return (st.selectbox("Année", annees, index=len(annees) - 1),)
+
+def _unsigned_dtype(serie, dtype):
+    """Plus petit entier non signe >= dtype contenant les valeurs (nullable si manquantes)"""
+    maximum = serie.max()
+    for candidat in ('uint8', 'uint16', 'uint32', 'uint64'):
+        if np.dtype(candidat).itemsize < np.dtype(dtype).itemsize:
+            continue
+        if pd.isna(maximum) or maximum <= np.iinfo(candidat).max:
+            break
+    return 'U' + candidat[1:] if serie.isna().any() else candidat
+
+def apply_schema(df):
+    """Applique SCHEMA_STATIONS : categories, entiers reduits et types nullables"""
+    df = df.copy()
     
-    df_lignes = pd.DataFrame(rows)
+    for col, dtype in SCHEMA_STATIONS.items():
+        if col not in df.columns:
+            continue
+        if dtype == 'category':
+            df[col] = df[col].astype('category')
+        else:
+            valeurs = pd.to_numeric(df[col], errors='coerce')
+            if dtype.startswith('uint'):
+                dtype = _unsigned_dtype(valeurs, dtype)
+            df[col] = valeurs.astype(dtype)
     
-    stats_lignes = df_lignes.groupby('Ligne').agg({
-        'Trafic': 'sum',
-        'Station': 'nunique',
-        'Réseau': lambda x: x.mode()[0] if len(x.mode()) > 0 else x.iloc[0]
-    }).reset_index()
+    # Correspondances : codes normalises dans une categorie commune aux 5 colonnes
+    codes, lignes_uniques = factorize_correspondances(df)
+    categories = pd.Index(sorted(set(lignes_uniques[lignes_uniques != ''])))
+    codes_categories = np.append(categories.get_indexer(lignes_uniques), -1)
+    dtype_lignes = pd.CategoricalDtype(categories)
+    for k, col in enumerate(CORRESPONDANCES_COLS):
+        df[col] = pd.Categorical.from_codes(codes_categories[codes[:, k]], dtype=dtype_lignes)
     
-    stats_lignes.columns = ['Ligne', 'Trafic_total', 'Nb_stations', 'Réseau']
+    return df
+
+def memory_per_row(df):
+    """Empreinte memoire moyenne d'une ligne du DataFrame (octets)"""
+    return df.memory_usage(deep=True).sum() / max(len(df), 1)
+
+def normalize_lignes(codes):
+    """Normalise une serie de codes de ligne ('1.0' -> '1', ' A ' -> 'A')"""
+    codes = codes.astype(str).str.strip()
+    numeriques = pd.to_numeric(codes, errors='coerce')
+    entiers = numeriques.notna() & np.isfinite(numeriques)
+    normalises = codes.to_numpy(dtype=object)
+    normalises[entiers.to_numpy()] = numeriques[entiers].astype('int64').astype(str).to_numpy()
+    return pd.Series(normalises, index=codes.index, name=codes.name)
+
+def factorize_correspondances(df):
+    """Codes des correspondances (matrice n x 5, -1 si absente) et libelles normalises"""
+    # Les codes distincts sont peu nombreux : on normalise les valeurs uniques puis on redistribue
+    codes, uniques = pd.factorize(df[CORRESPONDANCES_COLS].to_numpy(dtype=object).ravel())
+    lignes_uniques = normalize_lignes(pd.Series(uniques, dtype=object)).to_numpy()
+    valides = np.append(lignes_uniques != '', False)  # code -1 = valeur manquante
+    codes[~valides[codes]] = -1
+    return codes.reshape(len(df), len(CORRESPONDANCES_COLS)), lignes_uniques
+
+def join_lignes(df):
+    """Colonne 'Lignes' : correspondances separees par ', ' ('-' si aucune)"""
+    codes, lignes_uniques = factorize_correspondances(df)
+    base = len(lignes_uniques) + 1
+    if base ** codes.shape[1] < 2 ** 63:
+        # Combinaison de codes encodee en un entier par station, puis factorisee par hachage
+        poids = base ** np.arange(codes.shape[1], dtype='int64')
+        inverse, cles = pd.factorize((codes + 1) @ poids)
+        combinaisons = (cles[:, None] // poids) % base - 1
+    else:
+        combinaisons, inverse = np.unique(codes, axis=0, return_inverse=True)
+    libelles = np.array([
+        ', '.join(lignes_uniques[c] for c in combinaison if c >= 0) or '-'
+        for combinaison in combinaisons
+    ], dtype=object)
+    return pd.Series(libelles[inverse.ravel()], index=df.index)
+
+def explode_lignes(df, extra=()):
+    """Table station x ligne : une ligne par correspondance renseignee (+ colonnes `extra`)"""
+    codes, lignes_uniques = factorize_correspondances(df)
+    codes = codes.ravel()
+    presents = codes >= 0
+    positions = np.repeat(np.arange(len(df)), len(CORRESPONDANCES_COLS))[presents]
+
+    colonnes = {'Ligne': lignes_uniques[codes[presents]]}
+    for col in ['Station', 'Réseau', 'Trafic', *extra]:
+        colonnes[col] = df[col].take(positions).reset_index(drop=True)
+    return pd.DataFrame(colonnes)
+
+def ligne_partials(df_lignes):
+    """
+    Agregats partiels fusionnables par ligne : trafic par ligne, effectifs (ligne, reseau)
+    et paires (ligne, station) distinctes. Voir merge_ligne_partials.
+    """
+    # Codes entiers calcules une fois (plus rapide que de regrouper trois fois sur les libelles)
+    codes_lignes, lignes = pd.factorize(df_lignes['Ligne'], sort=True)
+    codes_stations, stations = pd.factorize(df_lignes['Station'])
+    lignes = pd.Index(lignes, name='Ligne')
+
+    sommes = df_lignes['Trafic'].groupby(codes_lignes).sum().astype('int64')
+    sommes.index = lignes[sommes.index]
+    comptes = df_lignes.groupby([lignes[codes_lignes], df_lignes['Réseau']], observed=True).size()
+    doublons = pd.Series(codes_lignes.astype('int64') * (len(stations) + 1) + codes_stations).duplicated().to_numpy()
+    paires = df_lignes.loc[~doublons, ['Ligne', 'Station']]
+    return sommes, comptes, paires
+
+def merge_ligne_partials(partials):
+    """Fusionne des agregats partiels (ligne_partials de sous-tableaux quelconques)"""
+    partials = list(partials)
+    if len(partials) == 1:
+        return partials[0]
+    sommes, comptes, paires = zip(*partials)
+    return (
+        pd.concat(sommes).groupby(level=0).sum(),
+        pd.concat(comptes).groupby(level=[0, 1], observed=True).sum(),
+        pd.concat(paires, ignore_index=True).drop_duplicates()
+    )
+
+def ligne_stats(df_lignes, partials=None):
+    """Statistiques par ligne (stats_lignes) a partir de la table station x ligne (ou de ses agregats partiels)"""
+    sommes, comptes, paires = partials if partials is not None else ligne_partials(df_lignes)
+
+    stats_lignes = pd.DataFrame({
+        'Trafic_total': sommes,
+        'Nb_stations': paires.groupby('Ligne', observed=True).size()
+    })
+    stats_lignes.index.name = 'Ligne'
+
+    # Mode du reseau par ligne : effectif maximal, puis ordre alphabetique (comme Series.mode)
+    comptes = comptes.reset_index(name='n')
+    comptes = comptes.sort_values(['Ligne', 'n', 'Réseau'], ascending=[True, False, True])
+    mode_reseau = comptes.drop_duplicates('Ligne').set_index('Ligne')['Réseau']
+    stats_lignes['Réseau'] = mode_reseau.reindex(stats_lignes.index)
+
+    stats_lignes = stats_lignes.reset_index()
+    stats_lignes['Trafic_total'] = stats_lignes['Trafic_total'].astype('int64')
     stats_lignes['Trafic_moyen_station'] = stats_lignes['Trafic_total'] / stats_lignes['Nb_stations']
     stats_lignes['Part_trafic_pct'] = (stats_lignes['Trafic_total'] / stats_lignes['Trafic_total'].sum()) * 100
-    
-    return stats_lignes, df_lignes
+
+    return stats_lignes
+
+@timed('build_ligne_tables', 'agregation')
+def build_ligne_tables(df):
+    """Agrege le trafic par ligne (version vectorisee, sans cache)"""
+    df_lignes = explode_lignes(df)
+    return ligne_stats(df_lignes), df_lignes
+
+@timed('update_ligne_tables', 'agregation')
+def update_ligne_tables(previous, df, base_rows):
+    """
+    Tables par ligne de df a partir de celles (`previous`) de ses `base_rows` premieres lignes :
+    seules les stations ajoutees sont eclatees par ligne. Identique a build_ligne_tables(df).
+    """
+    _, df_lignes = previous
+    ajout = explode_lignes(df.iloc[base_rows:])
+    df_lignes = pd.concat([df_lignes.astype(ajout.dtypes), ajout], ignore_index=True)
+    return ligne_stats(df_lignes), df_lignes
+
+def dataset_version(df):
+    """Identifiant de version du jeu de donnees (cle de source posee par load_data)"""
+    key = df.attrs.get('source_key')
+    if key is None or df.attrs.get('source_rows') != len(df):
+        key = str(pd.util.hash_pandas_object(df, index=False).sum())
+    return key
+
+@st.cache_resource
+def _built_resources():
+    """
+    Objets construits par dataset_resource pour les SHARED_DATASETS_MAX dernieres versions des sources,
+    bases des mises a jour incrementales : {cle de source: {nom: objet}}
+    """
+    return OrderedDict()
+
+@st.cache_resource(max_entries=32)
+def _dataset_resource(name, source_key, _df, _build, _update=None):
+    cache_miss(f'ressource:{name}')
+    resources = _built_resources()
+    resource = None
+    if _update is not None:
+        # Mise a jour incrementale depuis une version dont _df prolonge les lignes
+        for base_key, base_rows in _df.attrs.get('source_bases', ()):
+            previous = resources.get(base_key, {}).get(name)
+            if previous is not None:
+                resource = _update(previous, _df, base_rows)
+                # Version remplacee : son objet n'est plus garde pour de futures mises a jour
+                del resources[base_key][name]
+                if not resources[base_key]:
+                    del resources[base_key]
+                break
+    if resource is None:
+        resource = _build(_df)
+
+    resources.setdefault(source_key, {})[name] = resource
+    resources.move_to_end(source_key)
+    while len(resources) > SHARED_DATASETS_MAX:
+        resources.popitem(last=False)
+    return resource
+
+def dataset_resource(name, df, build, update=None):
+    """
+    Objet derive du jeu de donnees (index, cube...), construit une fois par version de la source.
+    update(precedent, df, nb_lignes) le derive de celui d'une version anterieure dont df prolonge les lignes.
+    """
+    key = df.attrs.get('source_key')
+    with span(f'ressource:{name}', 'agregation'):
+        if key is None or df.attrs.get('source_rows') != len(df):
+            return build(df)
+        with cache_probe(f'ressource:{name}'):
+            return _dataset_resource(name, key, df, build, update)
+
+def _ligne_tables(df):
+    """Tables par ligne via le cache disque, mises a jour depuis une version anterieure si possible"""
+    def build():
+        for base_key, base_rows in df.attrs.get('source_bases', ()):
+            previous = load_frames('lignes', base_key, count=2)
+            if previous is not None:
+                return update_ligne_tables(previous, df, base_rows)
+        from parallel import parallel_ligne_tables, use_parallel
+        return parallel_ligne_tables(df) if use_parallel(df) else build_ligne_tables(df)
+
+    return cached_frames('lignes', df.attrs['source_key'], build, count=2)
+
+@timed('prepare_ligne_data', 'agregation')
+def prepare_ligne_data(df):
+    """Prepare les donnees agregees par ligne (tables partagees entre sessions, a ne pas modifier)"""
+    # Cache seulement pour le tableau complet issu de load_data (pas pour un sous-ensemble)
+    key = df.attrs.get('source_key')
+    if key is None or df.attrs.get('source_rows') != len(df):
+        return build_ligne_tables(df)
+    return dataset_resource('tables_lignes', df, _ligne_tables)
@@ -0,0 +1,210 @@
+"""
+Graphiques Vega-Lite (Altair) rendus par le navigateur : les donnees agregees sont envoyees une fois,
+le filtre par reseau, le top N, le tri et les infobulles sont appliques cote client
+"""
+import numpy as np
+import pandas as pd
+
+from utils import COLORS_RATP
+
+# Memes couleurs que les graphiques matplotlib
+COULEURS_RESEAUX = {'Métro': COLORS_RATP['bleu'], 'RER': COLORS_RATP['vert']}
+COULEUR_AUTRES = '#95A5A6'
+# Axes en millions / milliers comme les graphiques matplotlib, infobulles en valeurs entieres
+LABELS_TRAFIC = "datum.value >= 1e6 ? format(datum.value / 1e6, '.1f') + 'M' : format(datum.value / 1e3, '.0f') + 'K'"
+FORMAT_TRAFIC = ',.0f'
+
+def _eclaircir(couleur, part=0.85):
+    """Couleur melangee avec du blanc (fin des degrades, comme sns.light_palette)"""
+    rgb = np.array([int(couleur[i:i + 2], 16) for i in (1, 3, 5)])
+    return '#' + ''.join(f'{int(round(c)):02X}' for c in rgb + (255 - rgb) * part)
+
+def _titre(texte):
+    """Titre au style des graphiques matplotlib ; `texte` peut etre une expression (valeur d'un parametre)"""
+    import altair as alt  # ~300 ms, charge seulement a la construction d'un graphique
+    return alt.TitleParams(texte, fontSize=14, fontWeight='bold', color=COLORS_RATP['bleu'])
+
+def _echelle(couleurs):
+    import altair as alt
+    return alt.Scale(domain=list(couleurs), range=list(couleurs.values()))
+
+def _degrade(couleur):
+    """Echelle continue de `couleur` (premiers rangs) vers sa version claire"""
+    import altair as alt
+    return alt.Scale(range=[couleur, _eclaircir(couleur)], zero=False)
+
+def _reseau_param(df, valeur='Tous'):
+    """Liste deroulante 'Réseau' sous le graphique, filtre applique par le navigateur"""
+    import altair as alt
+    options = ['Tous'] + sorted(df['Réseau'].dropna().unique().tolist())
+    return alt.param(name='reseau', value=valeur if valeur in options else 'Tous',
+                     bind=alt.binding_select(options=options, name='Réseau '))
+
+def _filtre_reseau(param):
+    return f"{param.name} == 'Tous' || datum['Réseau'] == {param.name}"
+
+def _parts(stats, colonne, couleurs, titre):
+    """Camembert des parts de trafic par `colonne`, pourcentages sur les secteurs"""
+    import altair as alt
+    base = alt.Chart(stats[[colonne, 'Trafic_total']]).transform_joinaggregate(
+        Total='sum(Trafic_total)'
+    ).transform_calculate(Part='datum.Trafic_total / datum.Total').encode(
+        theta=alt.Theta('Trafic_total:Q', stack=True),
+        order=alt.Order('Trafic_total:Q', sort='descending')
+    )
+    secteurs = base.mark_arc(outerRadius=150, stroke='white', strokeWidth=3).encode(
+        color=alt.Color(f'{colonne}:N', scale=_echelle(couleurs), title=colonne),
+        tooltip=[alt.Tooltip(f'{colonne}:N'), alt.Tooltip('Trafic_total:Q', title='Trafic', format=FORMAT_TRAFIC),
+                 alt.Tooltip('Part:Q', format='.1%')]
+    )
+    textes = base.mark_text(radius=100, fontSize=13, fontWeight='bold', color='white').encode(
+        text=alt.Text('Part:Q', format='.1%')
+    )
+    return (secteurs + textes).properties(title=_titre(titre), height=400)
+
+def comparison_chart(categories, valeurs, couleurs, titre):
+    """Barres de comparaison (station, moyenne, mediane) avec valeurs affichees"""
+    import altair as alt
+    data = pd.DataFrame({'Catégorie': categories, 'Trafic': valeurs, 'Couleur': couleurs})
+    base = alt.Chart(data).encode(
+        x=alt.X('Catégorie:N', sort=None, title=None, axis=alt.Axis(labelAngle=0)),
+        y=alt.Y('Trafic:Q', title='Trafic annuel', axis=alt.Axis(format=FORMAT_TRAFIC))
+    )
+    barres = base.mark_bar(opacity=0.85, stroke=COLORS_RATP['noir'], strokeWidth=1.5).encode(
+        color=alt.Color('Couleur:N', scale=None),
+        tooltip=[alt.Tooltip('Catégorie:N'), alt.Tooltip('Trafic:Q', format=FORMAT_TRAFIC)]
+    )
+    etiquettes = base.mark_text(dy=-8, fontSize=11, fontWeight='bold', color=COLORS_RATP['noir']).encode(
+        text=alt.Text('Trafic:Q', format=FORMAT_TRAFIC)
+    )
+    return (barres + etiquettes).properties(title=_titre(titre), height=400)
+
+def lines_bar_chart(stats_lignes, mesure, titre_axe, couleurs, reseau='Tous', top=15):
+    """Top `top` des lignes par trafic total (reseau choisi dans le graphique), hauteur = `mesure`"""
+    import altair as alt
+    param = _reseau_param(stats_lignes, reseau)
+    return alt.Chart(stats_lignes).mark_bar(
+        opacity=0.85, stroke=COLORS_RATP['noir'], strokeWidth=1.2
+    ).encode(
+        x=alt.X('Ligne:N', sort=alt.EncodingSortField('Trafic_total', order='descending'),
+                axis=alt.Axis(labelAngle=-45)),
+        y=alt.Y(f'{mesure}:Q', title=titre_axe, axis=alt.Axis(labelExpr=LABELS_TRAFIC)),
+        color=alt.Color('Réseau:N', scale=_echelle(couleurs), legend=alt.Legend(orient='top-right')),
+        tooltip=[alt.Tooltip('Ligne:N'), alt.Tooltip('Réseau:N'),
+                 alt.Tooltip('Trafic_total:Q', title='Trafic total', format=FORMAT_TRAFIC),
+                 alt.Tooltip('Nb_stations:Q', title='Nb stations'),
+                 alt.Tooltip('Trafic_moyen_station:Q', title='Trafic moyen/station', format=FORMAT_TRAFIC)]
+    ).add_params(param).transform_filter(
+        _filtre_reseau(param)
+    ).transform_window(
+        rang='row_number()', sort=[alt.SortField('Trafic_total', order='descending')]
+    ).transform_filter(
+        alt.datum.rang <= top
+    ).properties(
+        title=_titre(alt.expr(f"'Top {top} des lignes - {titre_axe} (' + {param.name} + ')'")), height=400
+    )
+
+def lines_pie_chart(stats_lignes, reseau='Tous', top=10):
+    """Part du trafic des `top` premieres lignes du reseau choisi, le reste regroupe dans 'Autres'"""
+    import altair as alt
+    param = _reseau_param(stats_lignes, reseau)
+    couleurs = {**COULEURS_RESEAUX, 'Mixte': COULEUR_AUTRES}
+    base = alt.Chart(stats_lignes[['Ligne', 'Réseau', 'Trafic_total']]).transform_filter(
+        _filtre_reseau(param)
+    ).transform_window(
+        rang='row_number()', sort=[alt.SortField('Trafic_total', order='descending')]
+    ).transform_calculate(
+        Groupe=f"datum.rang <= {top} ? datum.Ligne : 'Autres'",
+        Couleur=f"datum.rang <= {top} ? datum['Réseau'] : 'Mixte'"
+    ).transform_aggregate(
+        Trafic='sum(Trafic_total)', rang='min(rang)', groupby=['Groupe', 'Couleur']
+    ).transform_joinaggregate(
+        Total='sum(Trafic)'
+    ).transform_calculate(Part='datum.Trafic / datum.Total').encode(
+        theta=alt.Theta('Trafic:Q', stack=True),
+        order=alt.Order('rang:Q')
+    )
+    secteurs = base.mark_arc(outerRadius=160, stroke='white', strokeWidth=2).encode(
+        color=alt.Color('Couleur:N', scale=_echelle(couleurs), title='Réseau'),
+        tooltip=[alt.Tooltip('Groupe:N', title='Ligne'), alt.Tooltip('Trafic:Q', format=FORMAT_TRAFIC),
+                 alt.Tooltip('Part:Q', format='.1%')]
+    )
+    textes = base.mark_text(radius=180, fontSize=10, fontWeight='bold', color=COLORS_RATP['noir']).encode(
+        text='Groupe:N'
+    )
+    return alt.layer(secteurs, textes).add_params(param).properties(
+        title=_titre(f'Part du trafic total par ligne (Top {top})'), height=450
+    )
+
+def arrondissements_chart(arr_stats):
+    """Trafic par arrondissement, degrade de bleu dans l'ordre des arrondissements"""
+    import altair as alt
+    return alt.Chart(arr_stats).mark_bar(opacity=0.85, stroke=COLORS_RATP['noir'], strokeWidth=1.2).encode(
+        x=alt.X('Arrondissement:O', axis=alt.Axis(labelAngle=-45)),
+        y=alt.Y('Trafic_total:Q', title='Trafic total', axis=alt.Axis(labelExpr=LABELS_TRAFIC)),
+        color=alt.Color('Arrondissement:Q', legend=None, scale=_degrade(COLORS_RATP['bleu'])),
+        tooltip=[alt.Tooltip('Arrondissement:O'), alt.Tooltip('Trafic_total:Q', title='Trafic total', format=FORMAT_TRAFIC)]
+    ).properties(title=_titre('Trafic total par arrondissement de Paris'), height=400)
+
+def cities_chart(ville_stats, top=20, maximum=50):
+    """Top N des villes par trafic, N choisi par un curseur sous le graphique"""
+    import altair as alt
+    maximum = max(1, min(maximum, len(ville_stats)))
+    param = alt.param(name='top', value=min(top, maximum),
+                      bind=alt.binding_range(min=min(10, maximum), max=maximum, step=1, name='Nombre de villes '))
+    return alt.Chart(ville_stats[['Ville', 'Trafic_total']]).mark_bar(
+        opacity=0.85, stroke=COLORS_RATP['noir'], strokeWidth=1.2
+    ).encode(
+        x=alt.X('Trafic_total:Q', title='Trafic total', axis=alt.Axis(labelExpr=LABELS_TRAFIC)),
+        y=alt.Y('Ville:N', sort='-x'),
+        color=alt.Color('rang:Q', legend=None, scale=_degrade(COLORS_RATP['vert'])),
+        tooltip=[alt.Tooltip('Ville:N'), alt.Tooltip('rang:Q', title='Rang'),
+                 alt.Tooltip('Trafic_total:Q', title='Trafic total', format=FORMAT_TRAFIC)]
+    ).add_params(param).transform_window(
+        rang='row_number()', sort=[alt.SortField('Trafic_total', order='descending')]
+    ).transform_filter(
+        alt.datum.rang <= param
+    ).properties(
+        title=_titre(alt.expr(f"'Top ' + {param.name} + ' des villes par trafic'")), height=alt.Step(20)
+    )
+
+def reseaux_pie_chart(reseau_stats):
+    return _parts(reseau_stats, 'Réseau', COULEURS_RESEAUX, 'Répartition du trafic par réseau')
+
+def zones_pie_chart(zone_stats):
+    couleurs = {'Paris': COLORS_RATP['jaune'], 'Banlieue': COLORS_RATP['rouge']}
+    return _parts(zone_stats, 'Zone', couleurs, 'Répartition du trafic Paris vs Banlieue')
+
+def top_stations_chart(df_top):
+    """Barres horizontales des stations les plus frequentees, infobulles detaillees"""
+    import altair as alt
+    colonnes = [col for col in ['Station', 'Réseau', 'Trafic', 'Ville', 'Lignes'] if col in df_top.columns]
+    return alt.Chart(df_top[colonnes]).mark_bar(
+        opacity=0.85, stroke=COLORS_RATP['noir'], strokeWidth=1.2
+    ).encode(
+        x=alt.X('Trafic:Q', title='Trafic annuel', axis=alt.Axis(labelExpr=LABELS_TRAFIC)),
+        y=alt.Y('Station:N', sort='-x', title='Station'),
+        color=alt.Color('Réseau:N', scale=_echelle(COULEURS_RESEAUX), legend=alt.Legend(orient='bottom-right')),
+        tooltip=[alt.Tooltip(col, format=FORMAT_TRAFIC) if col == 'Trafic' else alt.Tooltip(col)
+                 for col in colonnes]
+    ).properties(title=_titre(f'Top {len(df_top)} des stations (données filtrées)'), height=alt.Step(22))
+
+def histogram_chart(effectifs):
+    """Distribution du trafic par reseau (histogrammes superposes) sur les classes logarithmiques fixes"""
+    import altair as alt
+    # Graduations 1-2-5 par decade dans l'etendue des classes
+    graduations = [m * 10.0 ** k for k in range(9) for m in (1, 2, 5)
+                   if len(effectifs) and effectifs['Début'].min() <= m * 10.0 ** k <= effectifs['Fin'].max()]
+    return alt.Chart(effectifs).mark_bar(
+        opacity=0.7, stroke=COLORS_RATP['noir'], strokeWidth=0.8, orient='vertical'
+    ).encode(
+        x=alt.X('Début:Q', title='Trafic annuel', axis=alt.Axis(labelExpr=LABELS_TRAFIC, values=graduations),
+                scale=alt.Scale(type='log', nice=False)),
+        x2='Fin:Q',
+        y=alt.Y('Stations:Q', stack=None, title='Nombre de stations'),
+        # Barres les plus basses dessinees par-dessus
+        order=alt.Order('Stations:Q', sort='descending'),
+        color=alt.Color('Réseau:N', scale=_echelle(COULEURS_RESEAUX), legend=alt.Legend(orient='top-right')),
+        tooltip=[alt.Tooltip('Réseau:N'), alt.Tooltip('Début:Q', format=FORMAT_TRAFIC),
+                 alt.Tooltip('Fin:Q', format=FORMAT_TRAFIC), alt.Tooltip('Stations:Q')]
+    ).properties(title=_titre('Distribution du trafic (données filtrées)'), height=400)